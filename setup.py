@@ -18,6 +18,10 @@ setup(
     author='Jim Kennedy',
     author_email='jim8786453@gmail.com',
     description='Helps manage the synchronisation of data',
+    extras_require={
+        # sync.client.aio makes HTTP requests with aiohttp.
+        'aio': ['aiohttp'],
+    },
     install_requires=reqs,
     name='sync',
     packages=['sync'],
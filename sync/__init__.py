@@ -2,16 +2,18 @@
 """Import everything that defines the top level API.
 
 """
-from sync.constants import Backend, Method, State, Text, Type
+from sync.constants import (Backend, IdFormat, Method, Operator, Stage,
+                            State, Text, Type)
 
 from sync.core import (close, current_storage, generate_id, init,
-                       Base, Change, Message, Network, Node, Record,
-                       Remote)
+                       Base, Change, Latency, Message, Network, Node,
+                       Record, Remote)
 
 
 """Define the API.
 
 """
 __all__ = ["close", "current_storage", "generate_id", "init",
-           "Backend", "Base", "Change", "Message", "Method",
-           "Network", "Node", "Record", "Remote", "State", "Text", "Type"]
+           "Backend", "Base", "Change", "IdFormat", "Latency", "Message",
+           "Method", "Network", "Node", "Operator", "Record", "Remote",
+           "Stage", "State", "Text", "Type"]
@@ -0,0 +1,354 @@
+"""Measure the throughput and latency of the core message cycle.
+
+Each storage backend is benchmarked in turn against a new network:
+
+send
+    Node.send a create message, including propagating it to every
+    other node.
+propagate
+    tasks.message_propagate, the fan-out part of send.
+fetch
+    Node.fetch the next pending message for a receiving node.
+acknowledge
+    Node.acknowledge a fetched message.
+node_sync
+    tasks.node_sync, resending every record to a node. Each sample is
+    one full sync.
+
+Run from the command line, writing the results as JSON:
+
+    python -m sync.benchmark --backend MockStorage --messages 1000 \\
+        --output results.json
+
+The time taken to import sync, the HTTP server and what a task worker
+needs is measured in fresh interpreters with --imports:
+
+    python -m sync.benchmark --imports --repeat 10
+
+Postgres uses POSTGRES_CONNECTION unless --postgres-url is given. If
+neither can be reached and testing.postgresql is installed, a temporary
+server is started. Mongo uses mongomock when it is installed and
+--mongo-url is not given.
+
+"""
+import argparse
+import datetime
+import json
+import platform
+import subprocess
+import sys
+import time
+
+import sync
+
+from sync import logs, settings, storage, tasks, Backend, Method
+from sync.metrics import percentile
+
+
+def summarise(durations, items=None):
+    """Summarise the durations of an operation.
+
+    :param durations: Seconds taken by each sample.
+    :type durations: list
+    :param items: The number of items processed across all samples,
+        defaults to one per sample.
+    :type items: int
+    :returns: Counts, throughput per second and latency percentiles in
+        milliseconds.
+    :rtype: dict
+
+    """
+    values = sorted(durations)
+    total = sum(values)
+    if items is None:
+        items = len(values)
+
+    def ms(value):
+        return None if value is None else round(value * 1000, 3)
+
+    return {
+        'count': len(values),
+        'items': items,
+        'total': round(total, 6),
+        'throughput': round(items / total, 3) if total else None,
+        'mean': ms(total / len(values)) if values else None,
+        'p50': ms(percentile(values, 50)),
+        'p90': ms(percentile(values, 90)),
+        'p99': ms(percentile(values, 99)),
+        'max': ms(values[-1]) if values else None
+    }
+
+
+class Timer(object):
+    """Collect the duration of repeated operations by name."""
+
+    def __init__(self):
+        self.durations = {}
+
+    def time(self, name, fun, *args, **kwargs):
+        start = time.time()
+        try:
+            return fun(*args, **kwargs)
+        finally:
+            self.add(name, time.time() - start)
+
+    def add(self, name, duration):
+        self.durations.setdefault(name, []).append(duration)
+
+    def wrap(self, name, fun):
+        def wrapper(*args, **kwargs):
+            return self.time(name, fun, *args, **kwargs)
+        return wrapper
+
+
+def make_payload(index, payload_size):
+    """A record payload of roughly payload_size bytes.
+
+    :param index: Makes each payload distinct.
+    :type index: int
+    :param payload_size: Approximate size in bytes when serialised.
+    :type payload_size: int
+
+    """
+    return {
+        'index': index,
+        'data': 'x' * max(payload_size - 25, 0)
+    }
+
+
+def create_storage(backend, postgres_url=None, mongo_url=None):
+    """Create an empty network using a storage backend.
+
+    :param backend: The name of a storage class.
+    :type backend: sync.constants.Backend
+    :returns: A connected storage object.
+    :rtype: sync.storage.Storage
+
+    """
+    if backend == Backend.Postgres and postgres_url is not None:
+        settings.POSTGRES_CONNECTION = postgres_url
+    if backend == Backend.Mongo:
+        if mongo_url is not None:
+            settings.MONGO_CONNECTION = mongo_url
+        elif storage.mongo.test_mongo_client is None:
+            try:
+                import mongomock
+                storage.mongo.test_mongo_client = mongomock.MongoClient()
+            except ImportError:
+                pass
+
+    settings.STORAGE_CLASS = backend
+    storage_class = storage.get_storage_class(backend)
+    result = storage_class(sync.generate_id())
+    result.connect(create_db=True)
+    return result
+
+
+def run(backend, messages=100, nodes=3, payload_size=256, syncs=1,
+        postgres_url=None, mongo_url=None):
+    """Benchmark a storage backend.
+
+    :param backend: The name of a storage class.
+    :type backend: sync.constants.Backend
+    :param messages: Number of messages sent.
+    :type messages: int
+    :param nodes: Number of nodes, one sends and the rest receive.
+    :type nodes: int
+    :param payload_size: Approximate size of each payload in bytes.
+    :type payload_size: int
+    :param syncs: Number of times node_sync is run.
+    :type syncs: int
+    :returns: A summary of each operation.
+    :rtype: dict
+
+    """
+    assert nodes >= 2
+
+    tasks_inline = settings.TASKS_INLINE
+    storage_class = settings.STORAGE_CLASS
+    message_propagate = tasks.message_propagate
+    store = create_storage(backend, postgres_url, mongo_url)
+    timer = Timer()
+    try:
+        settings.TASKS_INLINE = True
+        tasks.message_propagate = timer.wrap('propagate', message_propagate)
+        sync.init(store)
+        sync.Network.init('benchmark', {}, fetch_before_send=False)
+
+        sender = sync.Node.create('sender', create=True, update=True)
+        receivers = [sync.Node.create('receiver {0}'.format(i), read=True)
+                     for i in range(nodes - 1)]
+
+        for i in range(messages):
+            timer.time('send', sender.send, Method.Create,
+                       make_payload(i, payload_size))
+
+        for receiver in receivers:
+            while True:
+                message = timer.time('fetch', receiver.fetch)
+                if message is None:
+                    break
+                timer.time('acknowledge', receiver.acknowledge, message.id)
+
+        for _ in range(syncs):
+            timer.time('node_sync', tasks.node_sync, store.id,
+                       receivers[0].id)
+    finally:
+        tasks.message_propagate = message_propagate
+        settings.TASKS_INLINE = tasks_inline
+        settings.STORAGE_CLASS = storage_class
+        store.drop()
+        sync.close()
+
+    result = {}
+    for name, durations in timer.durations.items():
+        items = None
+        if name == 'node_sync':
+            items = len(durations) * messages
+        result[name] = summarise(durations, items)
+    return result
+
+
+def run_all(backends=None, **kwargs):
+    """Benchmark several storage backends.
+
+    Keyword arguments are passed to run.
+
+    :param backends: Names of storage classes, defaults to all.
+    :type backends: list
+    :returns: The parameters, environment and results of each backend.
+    :rtype: dict
+
+    """
+    if backends is None:
+        backends = Backend.All
+    results = {}
+    for backend in backends:
+        results[backend] = run(backend, **kwargs)
+    parameters = dict((k, v) for k, v in kwargs.items()
+                      if not k.endswith('_url'))
+    return {
+        'timestamp': datetime.datetime.utcnow().isoformat(),
+        'python': platform.python_version(),
+        'parameters': parameters,
+        'results': results
+    }
+
+
+#: Statements timed by import_times. A task worker imports the tasks
+#: and the configured storage backend.
+IMPORT_TARGETS = {
+    'sync': 'import sync',
+    'sync.http.server': 'import sync.http.server',
+    'task worker': 'import sync.tasks; sync.storage.get_storage_class()'
+}
+
+
+def import_times(repeat=5, targets=None):
+    """Time cold imports, each in a new Python process.
+
+    :param repeat: Number of processes started for each target.
+    :type repeat: int
+    :param targets: Statements to time keyed by name, defaults to
+        IMPORT_TARGETS.
+    :type targets: dict
+    :returns: A summary of each target.
+    :rtype: dict
+
+    """
+    if targets is None:
+        targets = IMPORT_TARGETS
+    code = ('import time\n'
+            'start = time.time()\n'
+            '{0}\n'
+            'print(time.time() - start)\n')
+    result = {}
+    for name, statement in targets.items():
+        durations = []
+        for _ in range(repeat):
+            output = subprocess.check_output(
+                [sys.executable, '-c', code.format(statement)])
+            durations.append(float(output.decode('utf-8').split()[-1]))
+        result[name] = summarise(durations)
+    return result
+
+
+def _temporary_postgres():
+    """Start a throwaway Postgres server if the configured one can not be
+    reached.
+
+    """
+    import sqlalchemy
+    try:
+        engine = sqlalchemy.create_engine(settings.POSTGRES_CONNECTION +
+                                          'postgres')
+        engine.connect().close()
+        return None
+    except sqlalchemy.exc.OperationalError:
+        pass
+    try:
+        import testing.postgresql
+    except ImportError:
+        return None
+    server = testing.postgresql.Postgresql()
+    settings.POSTGRES_CONNECTION = server.url()
+    return server
+
+
+def main(argv=None):
+    logs.configure()
+    parser = argparse.ArgumentParser(
+        description='Benchmark the sync message cycle.')
+    parser.add_argument('--backend', action='append', choices=Backend.All,
+                        help='Storage backend, may be repeated. '
+                        'Defaults to all.')
+    parser.add_argument('--messages', type=int, default=100)
+    parser.add_argument('--nodes', type=int, default=3)
+    parser.add_argument('--payload-size', type=int, default=256)
+    parser.add_argument('--syncs', type=int, default=1)
+    parser.add_argument('--imports', action='store_true',
+                        help='Time importing sync instead.')
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='Processes started per import target.')
+    parser.add_argument('--postgres-url')
+    parser.add_argument('--mongo-url')
+    parser.add_argument('--output', help='File to write JSON results to, '
+                        'defaults to stdout.')
+    args = parser.parse_args(argv)
+
+    if args.imports:
+        results = {
+            'timestamp': datetime.datetime.utcnow().isoformat(),
+            'python': platform.python_version(),
+            'imports': import_times(args.repeat)
+        }
+        _write(results, args.output)
+        return
+
+    backends = args.backend or Backend.All
+    server = None
+    if Backend.Postgres in backends and args.postgres_url is None:
+        server = _temporary_postgres()
+    try:
+        results = run_all(backends, messages=args.messages,
+                          nodes=args.nodes, payload_size=args.payload_size,
+                          syncs=args.syncs, postgres_url=args.postgres_url,
+                          mongo_url=args.mongo_url)
+    finally:
+        if server is not None:
+            server.stop()
+
+    _write(results, args.output)
+
+
+def _write(results, path=None):
+    output = json.dumps(results, indent=2, sort_keys=True)
+    if path:
+        with open(path, 'w') as f:
+            f.write(output)
+    else:
+        sys.stdout.write(output + '\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,342 @@
+"""Import a node's full extract of its records.
+
+A node holding all of its records, such as a nightly CSV file, imports
+the whole extract rather than working out what changed itself. Each row
+is identified by the node's remote_id, the rest of the row is the
+record's head. Rows are compared with the records the node's remotes
+identify, settings.BULK_BATCH_SIZE rows at a time, and only the messages
+needed are sent:
+
+Create
+    Rows with a remote_id the node has no record for.
+Update
+    Rows whose head differs from the record's, patching the fields that
+    differ.
+Delete
+    Records the node has a remote_id for that are missing from the
+    extract, unless deletes are turned off or any row was invalid.
+
+Between batches only the remote ids seen are kept, in a temporary
+SQLite database on disk, so memory use doesn't grow with the extract.
+
+CSV cells are parsed as JSON where they are valid JSON, otherwise kept
+as strings. Empty cells, and null values, are left out of the head.
+
+"""
+import csv
+import json
+import sqlite3
+
+import jsonschema
+import six
+
+import sync
+
+from sync import exceptions, logs, settings, Method, Text
+from sync.core import content_hash, diff_patch, merge_patch
+
+
+# Setup a module level logger.
+logger = logs.get_logger(__name__)
+
+
+# The field of each row holding the node's id for the record.
+KEY = 'remote_id'
+
+
+class Format(object):
+    """Extract formats, named by the content type they are sent as."""
+
+    CSV = 'text/csv'
+    NDJSON = 'application/x-ndjson'
+
+    All = [CSV, NDJSON]
+
+
+def _text(value):
+    if isinstance(value, bytes):
+        return value.decode('utf-8')
+    return six.text_type(value)
+
+
+def _lines(stream, chunk_size=65536):
+    """Read a binary or text stream a line at a time, as the native
+    strings the csv module reads. The stream is read in chunks, not
+    every WSGI server's input stream implements readline.
+
+    """
+    def native(line):
+        return line if six.PY2 else line.decode('utf-8')
+
+    pending = b''
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        if isinstance(chunk, six.text_type):
+            chunk = chunk.encode('utf-8')
+        lines = (pending + chunk).split(b'\n')
+        pending = lines.pop()
+        for line in lines:
+            yield native(line + b'\n')
+    if pending:
+        yield native(pending)
+
+
+def read_csv(stream):
+    """Read the rows of a CSV extract, its first line naming the fields.
+
+    :param stream: A file like object.
+    :returns: A dict for each row, or None for rows that are invalid.
+    :rtype: generator
+
+    """
+    reader = csv.reader(_lines(stream))
+    header = next(reader, None)
+    if header is None:
+        return
+    header = [_text(name) for name in header]
+    number = 0
+    for cells in reader:
+        if not cells:
+            continue
+        number += 1
+        if len(cells) != len(header):
+            logger.warning(Text.ImportRowInvalid.format(
+                number, 'expected {0} cells'.format(len(header))))
+            yield None
+            continue
+        row = {}
+        for name, cell in zip(header, cells):
+            cell = _text(cell)
+            if not cell:
+                continue
+            if name != KEY:
+                try:
+                    cell = json.loads(cell)
+                except ValueError:
+                    pass
+            row[name] = cell
+        yield row
+
+
+def read_ndjson(stream):
+    """Read the rows of an extract holding a JSON object per line.
+
+    :param stream: A file like object.
+    :returns: A dict for each row, or None for rows that are invalid.
+    :rtype: generator
+
+    """
+    number = 0
+    for line in _lines(stream):
+        if not line.strip():
+            continue
+        number += 1
+        try:
+            row = json.loads(line)
+        except ValueError:
+            row = None
+        if not isinstance(row, dict):
+            logger.warning(Text.ImportRowInvalid.format(
+                number, 'expected a JSON object'))
+            row = None
+        yield row
+
+
+def read(stream, format_):
+    """Read the rows of an extract.
+
+    :param stream: A file like object.
+    :param format_: The format of the extract.
+    :type format_: sync.bulk.Format
+    :rtype: generator
+    :raises: sync.exceptions.InvalidOperationError
+
+    """
+    if format_ == Format.CSV:
+        return read_csv(stream)
+    if format_ == Format.NDJSON:
+        return read_ndjson(stream)
+    raise exceptions.InvalidOperationError(
+        Text.ImportFormatUnknown.format(format_))
+
+
+class _RemoteIds(object):
+    """The remote ids seen in an extract, and the records to delete, kept
+    in a temporary SQLite database.
+
+    """
+
+    # SQLite limits the number of parameters in a statement.
+    chunk_size = 500
+
+    def __init__(self):
+        # An empty name opens a private database in a temporary file,
+        # removed when the connection is closed.
+        self.connection = sqlite3.connect('')
+        self.connection.execute(
+            'CREATE TABLE seen (remote_id TEXT PRIMARY KEY)')
+        self.connection.execute('CREATE TABLE deletes (record_id TEXT)')
+
+    def close(self):
+        self.connection.close()
+
+    def add(self, remote_ids):
+        self.connection.executemany(
+            'INSERT OR IGNORE INTO seen VALUES (?)',
+            [(remote_id,) for remote_id in remote_ids])
+
+    def unseen(self, remote_ids):
+        seen = set()
+        for i in range(0, len(remote_ids), self.chunk_size):
+            chunk = remote_ids[i:i + self.chunk_size]
+            rows = self.connection.execute(
+                'SELECT remote_id FROM seen WHERE remote_id IN ({0})'.format(
+                    ', '.join('?' * len(chunk))), chunk)
+            seen.update(row[0] for row in rows)
+        return [r for r in remote_ids if r not in seen]
+
+    def delete(self, record_ids):
+        self.connection.executemany(
+            'INSERT INTO deletes VALUES (?)',
+            [(record_id,) for record_id in record_ids])
+
+    def deletes(self):
+        return (row[0] for row in self.connection.execute(
+            'SELECT record_id FROM deletes'))
+
+
+# The count in an import's result each method sent adds to.
+_COUNTS = {
+    Method.Create: 'created',
+    Method.Update: 'updated',
+    Method.Delete: 'deleted'
+}
+
+
+def _send(node, result, method, payload=None, record_id=None,
+          remote_id=None):
+    # Each message is sent in its own transaction, as with a batch of
+    # messages, so one invalid row does not prevent the others.
+    try:
+        node.send(method, payload, record_id, remote_id)
+    except (jsonschema.exceptions.ValidationError,
+            exceptions.SyncError):
+        result['failed'] += 1
+        return
+    result[_COUNTS[method]] += 1
+
+
+def _import_batch(node, batch, remote_ids, result):
+    """Send the messages the rows of a batch need."""
+    storage = sync.current_storage()
+    remote_ids.add(remote_id for remote_id, _ in batch)
+    remotes = dict(
+        (_text(r.remote_id), r) for r in storage.get_node_remotes(
+            node.id, [remote_id for remote_id, _ in batch]))
+    records = dict(
+        (r.id, r) for r in storage.get_records_by_id(
+            [r.record_id for r in remotes.values()]))
+
+    for remote_id, head in batch:
+        remote = remotes.get(remote_id)
+        record = records.get(remote.record_id) if remote else None
+        if record is None:
+            _send(node, result, Method.Create, head, remote_id=remote_id)
+            continue
+        existing = record.head or {}
+        if content_hash(head) == (record.hash or content_hash(existing)):
+            result['unchanged'] += 1
+            continue
+        _send(node, result, Method.Update, diff_patch(existing, head),
+              record.id)
+
+
+def _delete_missing(node, remote_ids, result):
+    """Delete the records the node has a remote id for that weren't
+    seen.
+
+    """
+    storage = sync.current_storage()
+    # Deletes are only sent once all the node's remotes have been read,
+    # so the remotes being read do not change underneath.
+    for batch in storage.get_all_node_remotes(node.id):
+        missing = dict(
+            (_text(r.remote_id), r.record_id) for r in batch)
+        unseen = remote_ids.unseen(list(missing))
+        if not unseen:
+            continue
+        records = storage.get_records_by_id(
+            [missing[r] for r in unseen])
+        remote_ids.delete(r.id for r in records if not r.deleted)
+    for record_id in remote_ids.deletes():
+        _send(node, result, Method.Delete, record_id=record_id)
+
+
+def import_extract(node, rows, delete=True, batch_size=None):
+    """Bring the records a node has in line with a full extract of them.
+
+    :param node: The node the extract belongs to.
+    :type node: sync.Node
+    :param rows: A dict per row, with the remote_id of the record and
+        its head, or None for rows that couldn't be read. As returned
+        by read.
+    :type rows: iterable
+    :param delete: Delete records the node has that are missing from
+        the extract.
+    :type delete: bool
+    :param batch_size: Rows compared with stored records at a time,
+        defaults to settings.BULK_BATCH_SIZE.
+    :type batch_size: int
+    :returns: The number of records created, updated, deleted and
+        unchanged, and of rows that were invalid or failed.
+    :rtype: dict
+
+    """
+    if batch_size is None:
+        batch_size = settings.BULK_BATCH_SIZE
+    result = {
+        'created': 0,
+        'updated': 0,
+        'deleted': 0,
+        'unchanged': 0,
+        'invalid': 0,
+        'failed': 0
+    }
+    remote_ids = _RemoteIds()
+    try:
+        batch = []
+        for number, row in enumerate(rows, 1):
+            if row is not None:
+                row = dict(row)
+                remote_id = row.pop(KEY, None)
+                if isinstance(remote_id, (six.string_types, int)) and \
+                   not isinstance(remote_id, bool) and remote_id != '':
+                    # Null values are dropped as they are when patching.
+                    batch.append((_text(remote_id), merge_patch({}, row)))
+                else:
+                    logger.warning(Text.ImportRowInvalid.format(
+                        number, 'expected a {0}'.format(KEY)))
+                    row = None
+            if row is None:
+                result['invalid'] += 1
+            if len(batch) >= batch_size:
+                _import_batch(node, batch, remote_ids, result)
+                batch = []
+        if batch:
+            _import_batch(node, batch, remote_ids, result)
+
+        if delete and result['invalid']:
+            logger.warning(Text.ImportDeletesSkipped.format(
+                result['invalid']))
+        elif delete:
+            _delete_missing(node, remote_ids, result)
+    finally:
+        remote_ids.close()
+
+    logger.info('Import for node %s created %d, updated %d, deleted %d, '
+                'unchanged %d, invalid %d, failed %d', node.id,
+                result['created'], result['updated'], result['deleted'],
+                result['unchanged'], result['invalid'], result['failed'])
+    return result
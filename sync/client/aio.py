@@ -0,0 +1,166 @@
+"""An asyncio version of sync.client.Client.
+
+Requires Python 3.5 or later. Requests are made with aiohttp, installed
+with the aio extra (pip install sync[aio]), unless another transport is
+given, such as WSGITransport which calls a WSGI application like
+sync.http.server.api in the current process.
+
+"""
+import asyncio
+
+from concurrent.futures import ThreadPoolExecutor
+
+from sync.client import wsgi
+from sync.client.client import _RETRY_STATUSES, Client
+
+
+# Methods that are safe to repeat when a request fails.
+_IDEMPOTENT_METHODS = frozenset(['DELETE', 'GET', 'HEAD', 'OPTIONS', 'PUT',
+                                 'TRACE'])
+
+
+class Response(object):
+    """The parts of an HTTP response used by the client."""
+
+    def __init__(self, status_code, text, headers=None):
+        self.status_code = status_code
+        self.text = text
+        self.headers = headers or {}
+
+
+class AiohttpTransport(object):
+    """Make requests with an aiohttp session.
+
+    The session is created on first use, so within the running event
+    loop, and keeps up to pool_size connections open for reuse.
+
+    """
+
+    def __init__(self, pool_size=10):
+        try:
+            import aiohttp
+        except ImportError:
+            raise ImportError('aiohttp, the aio extra, is required to make '
+                              'HTTP requests with sync.client.aio.AsyncClient')
+        self._aiohttp = aiohttp
+        self.pool_size = pool_size
+        self._session = None
+
+    async def request(self, method, url, data=None, headers=None):
+        if self._session is None:
+            connector = self._aiohttp.TCPConnector(limit=self.pool_size)
+            self._session = self._aiohttp.ClientSession(connector=connector)
+        async with self._session.request(method, url, data=data,
+                                         headers=headers) as response:
+            text = await response.text()
+            return Response(response.status, text, dict(response.headers))
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+
+class WSGITransport(object):
+    """Send requests to a WSGI application in the current process.
+
+    Requests are handled one at a time on a separate thread because
+    the application blocks and, like sync.http.server.api, may rely on
+    global state.
+
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self._executor = ThreadPoolExecutor(1)
+
+    async def request(self, method, url, data=None, headers=None):
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(self._executor, self._request,
+                                          method, url, data, headers)
+
+    def _request(self, method, url, data, headers):
+        status_code, headers, body = wsgi.call(self.app, method, url, data,
+                                               headers)
+        return Response(status_code, body.decode('utf-8'), headers)
+
+    async def close(self):
+        self._executor.shutdown()
+
+
+class AsyncClient(Client):
+    """Asyncio client for the sync admin and messaging APIs.
+
+    Every method of sync.client.Client is available and returns a
+    coroutine. At most concurrency requests are in progress at once,
+    others wait for a free slot. Idempotent requests that fail to
+    connect or receive a 502, 503 or 504 response are retried with an
+    exponential backoff.
+
+    Use as an async context manager, or await close, so connections are
+    released.
+
+    """
+
+    def __init__(self, base_url, network_id=None, node_id=None,
+                 pool_size=10, retries=3, backoff_factor=0.1,
+                 compression_minimum_size=None, compression_level=None,
+                 concurrency=None, transport=None):
+        """Initialise the client.
+
+        :param concurrency: The most requests in progress at once.
+            Defaults to pool_size.
+        :type concurrency: int
+        :param transport: Makes the HTTP requests. Defaults to an
+            AiohttpTransport.
+        :type transport: sync.client.aio.AiohttpTransport
+
+        """
+        self._transport = transport
+        super(AsyncClient, self).__init__(
+            base_url, network_id, node_id, pool_size, retries,
+            backoff_factor, compression_minimum_size, compression_level)
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        self.concurrency = concurrency or pool_size
+        # Created within the running event loop.
+        self._semaphore = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        await self.close()
+
+    async def close(self):
+        await self.session.close()
+
+    def _create_session(self, pool_size, retries, backoff_factor):
+        if self._transport is not None:
+            return self._transport
+        return AiohttpTransport(pool_size)
+
+    async def _call(self, method, path, data=None, class_=None, node=False,
+                    content_type=None):
+        url, data, headers = self._prepare(path, data, node, content_type)
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+
+        retry = method in _IDEMPOTENT_METHODS
+        attempt = 0
+        while True:
+            try:
+                async with self._semaphore:
+                    response = await self.session.request(method, url, data,
+                                                          headers)
+            except OSError:
+                if not retry or attempt >= self.retries:
+                    raise
+            else:
+                if not retry or attempt >= self.retries or \
+                   response.status_code not in _RETRY_STATUSES:
+                    break
+            await asyncio.sleep(self.backoff_factor * (2 ** attempt))
+            attempt += 1
+
+        return self._handle_response(response, class_)
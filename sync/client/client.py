@@ -0,0 +1,409 @@
+import json
+import requests
+import six
+
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from sync import bulk, compression, settings
+
+try:
+    from urlparse import urljoin
+    from urllib import urlencode
+except ImportError:
+    from urllib.parse import urljoin, urlencode
+
+
+_HEADER_NETWORK_ID = 'X-Sync-Network-Id'
+_HEADER_NODE_ID = 'X-Sync-Node-Id'
+
+# Responses that are retried as the server may only be briefly
+# unavailable.
+_RETRY_STATUSES = (502, 503, 504)
+
+
+class ClientError(Exception):
+
+    def __init__(self, message, response):
+        super(Exception, self).__init__(message)
+        self.response = response
+
+
+class ClientObject(object):
+    pass
+
+
+class Network(ClientObject):
+    pass
+
+
+class Node(ClientObject):
+    pass
+
+
+class Message(ClientObject):
+    pass
+
+
+class Client(object):
+    """HTTP client for the sync admin and messaging APIs.
+
+    Requests are made through a pooled session so connections are kept
+    alive between calls. Idempotent requests and connection failures
+    are retried with an exponential backoff.
+
+    The messaging methods act on behalf of a single node so require a
+    network_id and node_id, these are sent with every request as the
+    X-Sync-Network-Id and X-Sync-Node-Id headers.
+
+    """
+
+    def __init__(self, base_url, network_id=None, node_id=None,
+                 pool_size=10, retries=3, backoff_factor=0.1,
+                 compression_minimum_size=None, compression_level=None):
+        if compression_minimum_size is None:
+            compression_minimum_size = settings.COMPRESSION_MINIMUM_SIZE
+        if compression_level is None:
+            compression_level = settings.COMPRESSION_LEVEL
+        self.base_url = base_url
+        self.network_id = network_id
+        self.node_id = node_id
+        self.pool_size = pool_size
+        self.compression_minimum_size = compression_minimum_size
+        self.compression_level = compression_level
+
+        self.session = self._create_session(pool_size, retries,
+                                            backoff_factor)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self.session.close()
+
+    def _create_session(self, pool_size, retries, backoff_factor):
+        retry = Retry(total=retries, backoff_factor=backoff_factor,
+                      status_forcelist=_RETRY_STATUSES,
+                      raise_on_status=False)
+        adapter = HTTPAdapter(pool_connections=pool_size,
+                              pool_maxsize=pool_size, max_retries=retry)
+        session = requests.Session()
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        return session
+
+    def _prepare(self, path, data=None, node=False, content_type=None):
+        # Responses are decompressed by the HTTP library which already
+        # sends an Accept-Encoding header, so only request bodies need
+        # compressing here. Bodies given a content type are sent as
+        # they are.
+        headers = {}
+        if node:
+            if self.network_id is None or self.node_id is None:
+                raise ClientError('network_id and node_id are required',
+                                  None)
+            headers[_HEADER_NETWORK_ID] = self.network_id
+            headers[_HEADER_NODE_ID] = self.node_id
+        if content_type is not None:
+            headers['Content-Type'] = content_type
+        elif data is not None:
+            data = json.dumps(data)
+            if isinstance(data, six.text_type):
+                data = data.encode('utf-8')
+            if len(data) >= self.compression_minimum_size:
+                data = compression.compress(data, compression.Encoding.Gzip,
+                                            self.compression_level)
+                headers['Content-Encoding'] = compression.Encoding.Gzip
+        url = urljoin(self.base_url, path)
+        return url, data, headers
+
+    def _call(self, method, path, data=None, class_=None, node=False,
+              content_type=None):
+        url, data, headers = self._prepare(path, data, node, content_type)
+        response = self.session.request(method, url, data=data,
+                                        headers=headers)
+        return self._handle_response(response, class_)
+
+    def _check_response(self, response):
+        if response.status_code in (200, 201, 204):
+            return
+
+        raise ClientError('Error %s' % response.status_code, response)
+
+    def _inflate_object(self, data, class_):
+        obj = class_()
+        for key, value in six.iteritems(data):
+            setattr(obj, key, value)
+        return obj
+
+    def _handle_response(self, response, class_):
+        self._check_response(response)
+        if response.status_code == 204 or not response.text:
+            return None
+        data = json.loads(response.text)
+        if class_ is None:
+            return data
+        if isinstance(data, list):
+            result = []
+            for item in data:
+                obj = self._inflate_object(item, class_)
+                result.append(obj)
+            return result
+        else:
+            obj = self._inflate_object(data, class_)
+            return obj
+
+    def create_network(self, name, schema, fetch_before_send=False,
+                       coalesce=False, indexes=None, id_format=None):
+        path = '/admin/networks'
+        data = {
+            'name': name,
+            'schema': schema,
+            'fetch_before_send': fetch_before_send,
+            'coalesce': coalesce
+        }
+        if indexes is not None:
+            data['indexes'] = indexes
+        if id_format is not None:
+            data['id_format'] = id_format
+        return self._call('POST', path, data, Network)
+
+    def get_network(self, network_id):
+        path = '/admin/networks/' + network_id
+        return self._call('GET', path, class_=Network)
+
+    def update_network(self, network_id, name=None, schema=None,
+                       fetch_before_send=None, coalesce=None, indexes=None,
+                       id_format=None):
+        path = '/admin/networks/' + network_id
+        data = {}
+        if name is not None:
+            data['name'] = name
+        if schema is not None:
+            data['schema'] = schema
+        if fetch_before_send is not None:
+            data['fetch_before_send'] = fetch_before_send
+        if coalesce is not None:
+            data['coalesce'] = coalesce
+        if indexes is not None:
+            data['indexes'] = indexes
+        if id_format is not None:
+            data['id_format'] = id_format
+        return self._call('PATCH', path, data, Network)
+
+    def create_node(self, network_id, name, create=True, read=True,
+                    update=True, delete=True):
+        path = '/admin/networks/{0}/nodes'.format(network_id)
+        data = {
+            'name': name,
+            'create': create,
+            'read': read,
+            'update': update,
+            'delete': delete
+        }
+        return self._call('POST', path, data, Node)
+
+    def update_node(self, network_id, node_id, name=None,
+                    create=None, read=None, update=None, delete=None):
+        path = '/admin/networks/{0}/nodes/{1}'.format(network_id, node_id)
+        data = {}
+        if name is not None:
+            data['name'] = name
+        if create is not None:
+            data['create'] = create
+        if read is not None:
+            data['read'] = read
+        if update is not None:
+            data['update'] = update
+        if delete is not None:
+            data['delete'] = delete
+        return self._call('PATCH', path, data, Node)
+
+    def get_nodes(self, network_id):
+        path = '/admin/networks/{0}/nodes'.format(network_id)
+        return self._call('GET', path, class_=Node)
+
+    def get_node(self, network_id, node_id):
+        path = '/admin/networks/{0}/nodes/{1}'.format(network_id, node_id)
+        return self._call('GET', path, class_=Node)
+
+    def sync_node(self, network_id, node_id):
+        path = '/admin/networks/{0}/nodes/{1}/sync'.format(network_id,
+                                                           node_id)
+        return self._call('POST', path)
+
+    def send(self, method, payload=None, record_id=None, remote_id=None):
+        """Send a message from the client's node.
+
+        :param method: Create, update or delete.
+        :type method: sync.constants.Method
+        :param payload: Data required when creating or updating the record.
+        :type payload: dict
+        :param record_id: The record id when updating or deleting a record.
+        :type record_id: str
+        :param remote_id: A node specific identifier to associate with a
+            record.
+        :type remote_id: str
+        :returns: The sent message.
+        :rtype: sync.client.Message
+
+        """
+        data = {
+            'method': method
+        }
+        if payload is not None:
+            data['payload'] = payload
+        if record_id is not None:
+            data['record_id'] = record_id
+        if remote_id is not None:
+            data['remote_id'] = remote_id
+        return self._call('POST', '/messages', data, Message, node=True)
+
+    def send_batch(self, messages):
+        """Send several messages from the client's node in one request.
+
+        Messages are sent in the order given.
+
+        :param messages: One dict per message with a method and optional
+            payload, record_id and remote_id, as accepted by send.
+        :type messages: list
+        :returns: The sent messages, in the same order. A message that
+            could not be sent has only an error attribute.
+        :rtype: list
+
+        """
+        return self._call('POST', '/messages/batch', messages, Message,
+                          node=True)
+
+    def fetch(self):
+        """Fetch the next pending message for the client's node.
+
+        :returns: The message, now processing, or None if there are no
+            pending messages.
+        :rtype: sync.client.Message
+
+        """
+        return self._call('POST', '/messages/next', class_=Message,
+                          node=True)
+
+    def has_pending(self):
+        """The number of pending messages for the client's node.
+
+        :returns: The count of pending messages.
+        :rtype: integer
+
+        """
+        return self._call('GET', '/messages/pending', node=True)
+
+    def find_records(self, filter_=None, limit=None, cursor=None):
+        """Find records by the values of head fields the network
+        indexes.
+
+        :param filter_: Maps head fields to a value the field must
+            equal, or a dict mapping sync.constants.Operator values to
+            the value to compare the field with.
+        :type filter_: dict
+        :param limit: The most records to return.
+        :type limit: int
+        :param cursor: The cursor returned with the previous page.
+        :type cursor: str
+        :returns: A dict of the records and the cursor of the next
+            page, which is None after the last.
+        :rtype: dict
+
+        """
+        params = []
+        for field, condition in sorted(six.iteritems(filter_ or {})):
+            if not isinstance(condition, dict):
+                condition = {'eq': condition}
+            for operator, value in sorted(six.iteritems(condition)):
+                params.append(('{0}.{1}'.format(field, operator),
+                               json.dumps(value)))
+        if limit is not None:
+            params.append(('limit', limit))
+        if cursor is not None:
+            params.append(('cursor', cursor))
+        path = '/records'
+        if params:
+            path += '?' + urlencode(params)
+        return self._call('GET', path, node=True)
+
+    def import_records(self, extract, format_=bulk.Format.CSV,
+                       delete=True):
+        """Import a full extract of the node's records, sending only the
+        messages needed to bring the records in line with it. See
+        sync.bulk.
+
+        :param extract: The extract, as bytes or a file like object
+            which is streamed.
+        :param format_: The format of the extract.
+        :type format_: sync.bulk.Format
+        :param delete: Delete records missing from the extract.
+        :type delete: bool
+        :returns: The number of records created, updated, deleted and
+            unchanged, and of rows that were invalid or failed.
+        :rtype: dict
+
+        """
+        path = '/records/import'
+        if not delete:
+            path += '?' + urlencode({'delete': 'false'})
+        return self._call('POST', path, extract, node=True,
+                          content_type=format_)
+
+    def acknowledge(self, message_id, remote_id=None):
+        """Acknowledge a fetched message.
+
+        :param message_id: Id of the message to acknowledge.
+        :type message_id: str
+        :param remote_id: A node specific identifier to associate with a
+            record.
+        :type remote_id: str
+        :returns: The acknowledged message.
+        :rtype: sync.client.Message
+
+        """
+        data = {
+            'success': True
+        }
+        if remote_id is not None:
+            data['remote_id'] = remote_id
+        return self._call('PATCH', '/messages/' + message_id, data,
+                          Message, node=True)
+
+    def fail(self, message_id, reason=None):
+        """Fail a fetched message.
+
+        :param message_id: Id of the message to fail.
+        :type message_id: str
+        :param reason: Description of why processing a message has failed.
+        :type reason: str
+        :returns: The failed message.
+        :rtype: sync.client.Message
+
+        """
+        data = {
+            'success': False
+        }
+        if reason is not None:
+            data['reason'] = reason
+        return self._call('PATCH', '/messages/' + message_id, data,
+                          Message, node=True)
+
+    def acknowledge_batch(self, results):
+        """Acknowledge or fail several fetched messages in one request.
+
+        :param results: One dict per message with an id and a success
+            value, plus an optional remote_id when successful or reason
+            when not.
+        :type results: list
+        :returns: One object per message with its id and either the new
+            state or an error describing why it could not be updated.
+        :rtype: list
+
+        """
+        return self._call('PATCH', '/messages/batch', results, Message,
+                          node=True)
@@ -0,0 +1,291 @@
+import threading
+import time
+
+from six.moves import queue
+
+from sync import logs
+
+
+logger = logs.get_logger(__name__)
+
+
+# Placed on a queue to tell the thread reading it to finish.
+_STOP = object()
+
+
+class Consumer(object):
+    """Fetch, process and acknowledge a node's messages concurrently.
+
+    A fetch thread keeps a bounded local queue of messages topped up,
+    backing off exponentially while the node has nothing pending. Worker
+    threads pass each message to a handler and the results are
+    acknowledged in batches once enough have built up or enough time has
+    passed.
+
+    Messages for the same record are always handled by the same worker
+    so they are processed in the order they were fetched.
+
+    The handler is called with a sync.client.Message. Its return value is
+    used as the remote_id when acknowledging the message, if it raises
+    the message is failed using the exception text as the reason.
+
+    """
+
+    def __init__(self, client, handler, workers=4, prefetch=None,
+                 ack_batch_size=50, ack_interval=1.0, idle_backoff=0.1,
+                 max_backoff=5.0):
+        """Initialise the consumer.
+
+        :param client: A client with a network_id and node_id.
+        :type client: sync.client.Client
+        :param handler: Called with each message.
+        :type handler: function
+        :param workers: Number of threads calling the handler.
+        :type workers: int
+        :param prefetch: Maximum number of fetched messages waiting to be
+            handled. Defaults to ten per worker.
+        :type prefetch: int
+        :param ack_batch_size: Acknowledge once this many messages have
+            been handled.
+        :type ack_batch_size: int
+        :param ack_interval: Acknowledge once the oldest unacknowledged
+            message has waited this many seconds.
+        :type ack_interval: float
+        :param idle_backoff: Seconds to wait after finding no pending
+            messages, doubled each time the node is still idle.
+        :type idle_backoff: float
+        :param max_backoff: The longest wait between fetches in seconds.
+        :type max_backoff: float
+
+        """
+        if prefetch is None:
+            prefetch = workers * 10
+        self.client = client
+        self.handler = handler
+        self.workers = workers
+        self.prefetch = prefetch
+        self.ack_batch_size = ack_batch_size
+        self.ack_interval = ack_interval
+        self.idle_backoff = idle_backoff
+        self.max_backoff = max_backoff
+
+        size = max(1, prefetch // workers)
+        self._queues = [queue.Queue(size) for _ in range(workers)]
+        self._results = queue.Queue()
+        self._stopping = threading.Event()
+        self._idle = threading.Event()
+        self._lock = threading.Lock()
+        self._threads = []
+        self._started = None
+        self._stopped = None
+        self._counters = {
+            'fetched': 0,
+            'succeeded': 0,
+            'failed': 0,
+            'acknowledged': 0,
+            'ack_batches': 0,
+            'fetch_errors': 0,
+            'ack_errors': 0,
+            'in_flight': 0,
+            'handler_time': 0.0,
+            'handler_time_max': 0.0,
+            'latency': 0.0,
+            'latency_max': 0.0
+        }
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def _increment(self, **values):
+        with self._lock:
+            for key, value in values.items():
+                self._counters[key] += value
+
+    def _record_time(self, key, value):
+        self._counters[key] += value
+        self._counters[key + '_max'] = max(self._counters[key + '_max'],
+                                           value)
+
+    def _fetch_loop(self):
+        backoff = self.idle_backoff
+        while not self._stopping.is_set():
+            try:
+                message = self.client.fetch()
+            except Exception:
+                logger.error('Consumer fetch failed', exc_info=True)
+                self._increment(fetch_errors=1)
+                message = None
+
+            if message is None:
+                self._idle.set()
+                self._stopping.wait(backoff)
+                backoff = min(backoff * 2, self.max_backoff)
+                continue
+
+            self._idle.clear()
+            backoff = self.idle_backoff
+            self._increment(fetched=1, in_flight=1)
+            index = hash(message.record_id) % self.workers
+            self._queues[index].put((message, time.time()))
+
+    def _work_loop(self, messages):
+        while True:
+            item = messages.get()
+            if item is _STOP:
+                return
+
+            message, fetched = item
+            started = time.time()
+            try:
+                remote_id = self.handler(message)
+                result = {'id': message.id, 'success': True}
+                if remote_id is not None:
+                    result['remote_id'] = remote_id
+            except Exception as ex:
+                logger.error('Consumer handler failed', exc_info=True)
+                result = {'id': message.id, 'success': False,
+                          'reason': str(ex)}
+            finished = time.time()
+
+            with self._lock:
+                if result['success']:
+                    self._counters['succeeded'] += 1
+                else:
+                    self._counters['failed'] += 1
+                self._record_time('handler_time', finished - started)
+                self._record_time('latency', finished - fetched)
+
+            self._results.put(result)
+
+    def _ack_loop(self):
+        batch = []
+        deadline = None
+        while True:
+            timeout = None
+            if batch:
+                timeout = max(0, deadline - time.time())
+            try:
+                item = self._results.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+
+            if item is _STOP:
+                self._flush(batch)
+                return
+
+            if item is not None:
+                if not batch:
+                    deadline = time.time() + self.ack_interval
+                batch.append(item)
+
+            if len(batch) >= self.ack_batch_size or \
+               (batch and time.time() >= deadline):
+                self._flush(batch)
+                batch = []
+
+    def _flush(self, batch):
+        if not batch:
+            return
+        errors = 0
+        try:
+            results = self.client.acknowledge_batch(batch)
+            errors = len([r for r in results if hasattr(r, 'error')])
+        except Exception:
+            logger.error('Consumer acknowledge failed', exc_info=True)
+            errors = len(batch)
+        self._increment(acknowledged=len(batch) - errors, ack_errors=errors,
+                        ack_batches=1, in_flight=-len(batch))
+
+    def start(self):
+        """Start fetching and handling messages in background threads."""
+        assert not self._threads
+
+        self._started = time.time()
+        self._stopped = None
+        self._stopping.clear()
+        self._idle.clear()
+
+        targets = [(self._ack_loop, ())]
+        targets += [(self._work_loop, (q,)) for q in self._queues]
+        targets += [(self._fetch_loop, ())]
+        for target, args in targets:
+            thread = threading.Thread(target=target, args=args)
+            thread.daemon = True
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        """Stop fetching messages.
+
+        Messages that have already been fetched are handled and
+        acknowledged before this returns.
+
+        """
+        if not self._threads:
+            return
+
+        ack, workers, fetch = (self._threads[0], self._threads[1:-1],
+                               self._threads[-1])
+        self._stopping.set()
+        fetch.join()
+        for messages in self._queues:
+            messages.put(_STOP)
+        for thread in workers:
+            thread.join()
+        self._results.put(_STOP)
+        ack.join()
+
+        self._threads = []
+        self._stopped = time.time()
+
+    def wait_idle(self, timeout=None, interval=0.01):
+        """Block until the node has no pending messages and every fetched
+        message has been acknowledged.
+
+        :param timeout: Maximum number of seconds to wait, None waits
+            forever.
+        :type timeout: float
+        :param interval: Seconds between checks.
+        :type interval: float
+        :returns: True if the consumer became idle before the timeout.
+        :rtype: bool
+
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        while True:
+            with self._lock:
+                in_flight = self._counters['in_flight']
+            if self._idle.is_set() and in_flight == 0:
+                return True
+            if deadline is not None and time.time() >= deadline:
+                return False
+            time.sleep(interval)
+
+    def stats(self):
+        """Counters describing the consumer's throughput and latency.
+
+        Latency is the time from a message being fetched to its handler
+        returning, so includes time spent waiting in the local queue.
+        Times are in seconds.
+
+        :returns: The counters.
+        :rtype: dict
+
+        """
+        with self._lock:
+            result = dict(self._counters)
+
+        handled = result['succeeded'] + result['failed']
+        end = self._stopped or time.time()
+        elapsed = end - self._started if self._started else 0.0
+        result['handled'] = handled
+        result['elapsed'] = elapsed
+        result['throughput'] = handled / elapsed if elapsed else 0.0
+        result['handler_time_mean'] = \
+            result['handler_time'] / handled if handled else 0.0
+        result['latency_mean'] = result['latency'] / handled if handled else 0.0
+        return result
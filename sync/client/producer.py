@@ -0,0 +1,225 @@
+import threading
+import time
+
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+
+from sync import logs
+from sync.client.client import ClientError
+
+
+logger = logs.get_logger(__name__)
+
+
+# Responses from a server without the batch endpoint.
+_BATCH_UNSUPPORTED = (404, 405)
+
+
+class Producer(object):
+    """Buffer messages sent from a node and send them in batches.
+
+    Each call to send returns a concurrent.futures.Future that resolves
+    to the sent sync.client.Message or raises a sync.client.ClientError.
+
+    The buffer is flushed once it holds batch_size messages or the
+    oldest message has waited linger seconds. Batches are sent to the
+    server's batch endpoint. If the server does not have one, the
+    messages are sent with parallel requests instead. In that case,
+    messages sharing a record_id or remote_id are sent one after another
+    so they arrive in order.
+
+    """
+
+    def __init__(self, client, batch_size=100, linger=0.05, workers=None,
+                 max_buffered=None):
+        """Initialise the producer.
+
+        :param client: A client with a network_id and node_id.
+        :type client: sync.client.Client
+        :param batch_size: Flush once this many messages are buffered.
+        :type batch_size: int
+        :param linger: Flush once the oldest buffered message has waited
+            this many seconds.
+        :type linger: float
+        :param workers: Number of parallel requests used when the server
+            has no batch endpoint. Defaults to the client's pool size.
+        :type workers: int
+        :param max_buffered: send blocks while this many messages are
+            waiting to be flushed. Defaults to ten batches.
+        :type max_buffered: int
+
+        """
+        if workers is None:
+            workers = client.pool_size
+        if max_buffered is None:
+            max_buffered = batch_size * 10
+        self.client = client
+        self.batch_size = batch_size
+        self.linger = linger
+        self.workers = workers
+        self.max_buffered = max_buffered
+        #: batch_supported (bool): Whether the server has the batch
+        #: endpoint, None until the first flush.
+        self.batch_supported = None
+
+        self._buffer = []
+        self._deadline = None
+        self._flushing = 0
+        self._closed = False
+        self._condition = threading.Condition()
+        self._executor = None
+        self._thread = threading.Thread(target=self._flush_loop)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def send(self, method, payload=None, record_id=None, remote_id=None):
+        """Buffer a message to be sent from the client's node.
+
+        :param method: Create, update or delete.
+        :type method: sync.constants.Method
+        :param payload: Data required when creating or updating the record.
+        :type payload: dict
+        :param record_id: The record id when updating or deleting a record.
+        :type record_id: str
+        :param remote_id: A node specific identifier to associate with a
+            record.
+        :type remote_id: str
+        :returns: A future resolving to the sent message.
+        :rtype: concurrent.futures.Future
+
+        """
+        data = {
+            'method': method
+        }
+        if payload is not None:
+            data['payload'] = payload
+        if record_id is not None:
+            data['record_id'] = record_id
+        if remote_id is not None:
+            data['remote_id'] = remote_id
+
+        future = Future()
+        with self._condition:
+            if self._closed:
+                raise ClientError('Producer is closed', None)
+            while len(self._buffer) >= self.max_buffered:
+                self._condition.wait()
+            if not self._buffer:
+                self._deadline = time.time() + self.linger
+            self._buffer.append((data, future))
+            self._condition.notify_all()
+        return future
+
+    def flush(self):
+        """Send every buffered message and wait for the results."""
+        with self._condition:
+            self._deadline = time.time()
+            self._condition.notify_all()
+            while self._buffer or self._flushing:
+                self._condition.wait()
+
+    def close(self):
+        """Flush the buffer and stop the producer."""
+        with self._condition:
+            if self._closed:
+                return
+            self._closed = True
+            self._condition.notify_all()
+        self._thread.join()
+        if self._executor is not None:
+            self._executor.shutdown()
+
+    def _flush_loop(self):
+        while True:
+            with self._condition:
+                while True:
+                    if self._buffer and (
+                            self._closed or
+                            len(self._buffer) >= self.batch_size or
+                            time.time() >= self._deadline):
+                        break
+                    if self._closed:
+                        return
+                    timeout = None
+                    if self._buffer:
+                        timeout = max(0, self._deadline - time.time())
+                    self._condition.wait(timeout)
+                batch = self._buffer[:self.batch_size]
+                del self._buffer[:self.batch_size]
+                if self._buffer:
+                    # What is left has already waited for this batch.
+                    self._deadline = time.time()
+                self._flushing += 1
+                self._condition.notify_all()
+
+            try:
+                batch = [(d, f) for d, f in batch
+                         if f.set_running_or_notify_cancel()]
+                if batch:
+                    self._send(batch)
+            except Exception as ex:
+                logger.error('Producer flush failed', exc_info=True)
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(ex)
+            finally:
+                with self._condition:
+                    self._flushing -= 1
+                    self._condition.notify_all()
+
+    def _send(self, batch):
+        if self.batch_supported is not False:
+            try:
+                results = self.client.send_batch([d for d, _ in batch])
+                self.batch_supported = True
+            except ClientError as ex:
+                if self.batch_supported or ex.response is None or \
+                   ex.response.status_code not in _BATCH_UNSUPPORTED:
+                    raise
+                self.batch_supported = False
+            else:
+                for (_, future), result in zip(batch, results):
+                    error = getattr(result, 'error', None)
+                    if error is not None:
+                        future.set_exception(ClientError(error, None))
+                    else:
+                        future.set_result(result)
+                return
+
+        self._send_parallel(batch)
+
+    def _send_parallel(self, batch):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(self.workers)
+
+        # Group messages for the same record, keeping their order.
+        groups = {}
+        order = []
+        for index, item in enumerate(batch):
+            data = item[0]
+            key = data.get('record_id') or data.get('remote_id') or index
+            if key not in groups:
+                groups[key] = []
+                order.append(key)
+            groups[key].append(item)
+
+        tasks = [self._executor.submit(self._send_group, groups[key])
+                 for key in order]
+        wait(tasks)
+
+    def _send_group(self, group):
+        for data, future in group:
+            try:
+                message = self.client.send(data['method'],
+                                           data.get('payload'),
+                                           data.get('record_id'),
+                                           data.get('remote_id'))
+            except Exception as ex:
+                future.set_exception(ex)
+            else:
+                future.set_result(message)
@@ -0,0 +1,135 @@
+import asyncio
+import json
+import pytest
+
+from sync import Backend, settings
+from sync.client import ClientError
+from sync.client.aio import AsyncClient, Response, WSGITransport
+from sync.http import server
+
+
+BASE_URL = 'http://sync.test/'
+SCHEMA = {
+    'type': 'object',
+    'properties': {
+        'name': {
+            'type': 'string'
+        }
+    },
+    'required': ['name']
+}
+
+
+def run(coroutine):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+
+class MockTransport(object):
+    """Counts concurrent requests and replays response status codes."""
+
+    def __init__(self, statuses=None):
+        self.statuses = list(statuses or [])
+        self.active = 0
+        self.max_active = 0
+        self.calls = 0
+
+    async def request(self, method, url, data=None, headers=None):
+        self.calls += 1
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        await asyncio.sleep(0.01)
+        self.active -= 1
+        status_code = self.statuses.pop(0) if self.statuses else 200
+        return Response(status_code, json.dumps({'id': str(self.calls)}))
+
+    async def close(self):
+        pass
+
+
+@pytest.fixture(autouse=True)
+def storage(monkeypatch):
+    monkeypatch.setattr(settings, 'STORAGE_CLASS', Backend.Mock)
+
+
+def test_aio_client():
+    async def scenario():
+        transport = WSGITransport(server.api)
+        admin = AsyncClient(BASE_URL, transport=transport)
+        network = await admin.create_network('test', SCHEMA, True)
+        node_1, node_2 = await asyncio.gather(
+            admin.create_node(network.id, 'node 1'),
+            admin.create_node(network.id, 'node 2'))
+        nodes = await admin.get_nodes(network.id)
+        assert len(nodes) == 2
+
+        client_1 = AsyncClient(BASE_URL, network.id, node_1.id,
+                               transport=transport)
+        client_2 = AsyncClient(BASE_URL, network.id, node_2.id,
+                               transport=transport)
+        sent = await asyncio.gather(*[
+            client_1.send('create', {'name': str(i)}, remote_id=str(i))
+            for i in range(5)])
+        assert all(m.state == 'acknowledged' for m in sent)
+        assert await client_2.has_pending() == 5
+
+        fetched = await asyncio.gather(*[client_2.fetch()
+                                         for _ in range(5)])
+        assert await client_2.fetch() is None
+        assert sorted(m.payload['name'] for m in fetched) == \
+            [str(i) for i in range(5)]
+
+        results = await client_2.acknowledge_batch(
+            [{'id': m.id, 'success': True} for m in fetched])
+        assert all(r.state == 'acknowledged' for r in results)
+
+        # A node added later is sent the existing records.
+        node_3 = await admin.create_node(network.id, 'node 3')
+        assert await admin.sync_node(network.id, node_3.id) is None
+        client_3 = AsyncClient(BASE_URL, network.id, node_3.id,
+                               transport=transport)
+        assert await client_3.has_pending() == 5
+
+        with pytest.raises(ClientError) as excinfo:
+            await client_1.send('create', {})
+        assert excinfo.value.response.status_code == 400
+
+        await admin.close()
+
+    run(scenario())
+
+
+def test_aio_client_concurrency():
+    async def scenario():
+        transport = MockTransport()
+        async with AsyncClient(BASE_URL, concurrency=2,
+                               transport=transport) as client:
+            await asyncio.gather(*[client.get_network(str(i))
+                                   for i in range(10)])
+        assert transport.calls == 10
+        assert transport.max_active == 2
+
+    run(scenario())
+
+
+def test_aio_client_retry():
+    async def scenario():
+        transport = MockTransport([503, 200])
+        client = AsyncClient(BASE_URL, 'network', 'node', backoff_factor=0,
+                             transport=transport)
+        network = await client.get_network('1')
+        assert network.id == '2'
+        assert transport.calls == 2
+
+        # Fetching changes a message's state so is not retried.
+        transport = MockTransport([503, 200])
+        client = AsyncClient(BASE_URL, 'network', 'node', backoff_factor=0,
+                             transport=transport)
+        with pytest.raises(ClientError):
+            await client.fetch()
+        assert transport.calls == 1
+
+    run(scenario())
@@ -3,8 +3,24 @@ import json
 import jsonschema
 import pytest
 
-from sync import schema
-from sync.client import Client, ClientError
+from sync import bulk, compression, schema, settings
+from sync.client import Client, ClientError, Message, Network
+
+
+NETWORK_ID = '32ca9377-5ef6-400b-b39b-d9fcdaa51d0d'
+NODE_ID = '619120e2-b8e5-40a9-9fab-93a9524dc8c0'
+MESSAGE = {
+    'origin_id': None,
+    'remote_id': None,
+    'id': 'a5b5b5d1-3c56-4b7e-8d0e-1d6c1d7f5e6a',
+    'parent_id': '1f6b27b8-7c3e-4d7a-9a56-2c0e0d6f5d4b',
+    'state': 'processing',
+    'destination_id': NODE_ID,
+    'record_id': 'c0b0b6e6-52e8-4a47-8b5a-9d1a3c6e1f2b',
+    'payload': {'foo': 'bar'},
+    'method': 'create',
+    'timestamp': '2017-01-01T00:00:00'
+}
 
 
 class TestClient():
@@ -12,6 +28,7 @@ class TestClient():
     @pytest.fixture(autouse=True)
     def client(self):
         self.client = Client('http://sync.test/')
+        self.node_client = Client('http://sync.test/', NETWORK_ID, NODE_ID)
 
     @httpretty.activate
     def test_client_create_network(self):
@@ -23,7 +40,7 @@ class TestClient():
         }
         jsonschema.validators.Draft4Validator(
             schema.network_get).validate(mock_response)
-        url = 'http://sync.test/networks'
+        url = 'http://sync.test/admin/networks'
         httpretty.register_uri(httpretty.POST, url,
                                body=json.dumps(mock_response),
                                content_type='application/json',
@@ -34,7 +51,7 @@ class TestClient():
 
     @httpretty.activate
     def test_client_create_network_error(self):
-        url = 'http://sync.test/networks'
+        url = 'http://sync.test/admin/networks'
         httpretty.register_uri(httpretty.POST, url,
                                body=json.dumps({}),
                                content_type='application/json',
@@ -53,7 +70,7 @@ class TestClient():
         jsonschema.validators.Draft4Validator(
             schema.network_get).validate(mock_response)
         network_id = mock_response['id']
-        url = 'http://sync.test/networks/' + network_id
+        url = 'http://sync.test/admin/networks/' + network_id
         httpretty.register_uri(httpretty.GET, url,
                                body=json.dumps(mock_response),
                                content_type='application/json',
@@ -73,7 +90,7 @@ class TestClient():
         jsonschema.validators.Draft4Validator(
             schema.network_get).validate(mock_response)
         network_id = mock_response['id']
-        url = 'http://sync.test/networks/' + network_id
+        url = 'http://sync.test/admin/networks/' + network_id
         httpretty.register_uri(httpretty.PATCH, url,
                                body=json.dumps(mock_response),
                                content_type='application/json',
@@ -96,7 +113,7 @@ class TestClient():
         jsonschema.validators.Draft4Validator(
             schema.node_get).validate(mock_response)
         network_id = '32ca9377-5ef6-400b-b39b-d9fcdaa51d0d'
-        url = 'http://sync.test/networks/{0}/nodes'.format(network_id)
+        url = 'http://sync.test/admin/networks/{0}/nodes'.format(network_id)
         httpretty.register_uri(httpretty.POST, url,
                                body=json.dumps(mock_response),
                                content_type='application/json',
@@ -119,7 +136,7 @@ class TestClient():
             schema.node_get).validate(mock_response)
         network_id = '32ca9377-5ef6-400b-b39b-d9fcdaa51d0d'
         node_id = mock_response['id']
-        url_template = 'http://sync.test/networks/{0}/nodes/{1}'
+        url_template = 'http://sync.test/admin/networks/{0}/nodes/{1}'
         url = url_template.format(network_id, node_id)
         httpretty.register_uri(httpretty.PATCH, url,
                                body=json.dumps(mock_response),
@@ -155,7 +172,7 @@ class TestClient():
         jsonschema.validators.Draft4Validator(
             schema.nodes_get).validate(mock_response)
         network_id = '32ca9377-5ef6-400b-b39b-d9fcdaa51d0d'
-        url_template = 'http://sync.test/networks/{0}/nodes'
+        url_template = 'http://sync.test/admin/networks/{0}/nodes'
         url = url_template.format(network_id)
         httpretty.register_uri(httpretty.GET, url,
                                body=json.dumps(mock_response),
@@ -178,7 +195,7 @@ class TestClient():
             schema.node_get).validate(mock_response)
         network_id = '32ca9377-5ef6-400b-b39b-d9fcdaa51d0d'
         node_id = mock_response['id']
-        url_template = 'http://sync.test/networks/{0}/nodes/{1}'
+        url_template = 'http://sync.test/admin/networks/{0}/nodes/{1}'
         url = url_template.format(network_id, node_id)
         httpretty.register_uri(httpretty.GET, url,
                                body=json.dumps(mock_response),
@@ -193,7 +210,7 @@ class TestClient():
         mock_response = None
         network_id = '32ca9377-5ef6-400b-b39b-d9fcdaa51d0d'
         node_id = '619120e2-b8e5-40a9-9fab-93a9524dc8c0'
-        url_template = 'http://sync.test/networks/{0}/nodes/{1}/sync'
+        url_template = 'http://sync.test/admin/networks/{0}/nodes/{1}/sync'
         url = url_template.format(network_id, node_id)
         httpretty.register_uri(httpretty.POST, url,
                                body=json.dumps(mock_response),
@@ -201,3 +218,189 @@ class TestClient():
                                status=200)
         self.client.sync_node(network_id, node_id)
         assert True
+
+    @httpretty.activate
+    def test_client_compress_request(self):
+        mock_response = {
+            'name': 'test',
+            'id': '32ca9377-5ef6-400b-b39b-d9fcdaa51d0d',
+            'fetch_before_send': True,
+            'schema': {'description': 'test' * 500}
+        }
+        url = 'http://sync.test/admin/networks'
+        httpretty.register_uri(httpretty.POST, url,
+                               body=json.dumps(mock_response),
+                               content_type='application/json',
+                               status=201)
+        self.client.create_network('test', mock_response['schema'], True)
+        request = httpretty.last_request()
+        assert request.headers['Content-Encoding'] == 'gzip'
+        data = json.loads(compression.decompress(request.body).decode('utf-8'))
+        assert data['schema'] == mock_response['schema']
+
+        # Small bodies are sent uncompressed.
+        self.client.create_network('test', {}, True)
+        request = httpretty.last_request()
+        assert 'Content-Encoding' not in request.headers
+
+        # Defaults come from settings.
+        assert self.client.compression_minimum_size == \
+            settings.COMPRESSION_MINIMUM_SIZE
+        assert self.client.compression_level == settings.COMPRESSION_LEVEL
+
+    @httpretty.activate
+    def test_client_result_classes(self):
+        mock_response = {
+            'name': 'test',
+            'id': NETWORK_ID,
+            'fetch_before_send': True,
+            'schema': {}
+        }
+        url = 'http://sync.test/admin/networks/' + NETWORK_ID
+        httpretty.register_uri(httpretty.GET, url,
+                               body=json.dumps(mock_response),
+                               content_type='application/json',
+                               status=200)
+        first = self.client.get_network(NETWORK_ID)
+        second = self.client.get_network(NETWORK_ID)
+        assert type(first) is Network
+        assert type(first) is type(second)
+
+    @httpretty.activate
+    def test_client_retry(self):
+        mock_response = {
+            'name': 'test',
+            'id': NETWORK_ID,
+            'fetch_before_send': True,
+            'schema': {}
+        }
+        url = 'http://sync.test/admin/networks/' + NETWORK_ID
+        httpretty.register_uri(httpretty.GET, url, responses=[
+            httpretty.Response(body='', status=503),
+            httpretty.Response(body=json.dumps(mock_response), status=200)
+        ])
+        client = Client('http://sync.test/', backoff_factor=0)
+        network = client.get_network(NETWORK_ID)
+        assert network.id == NETWORK_ID
+
+    def test_client_messaging_requires_ids(self):
+        with pytest.raises(ClientError):
+            self.client.fetch()
+
+    @httpretty.activate
+    def test_client_send(self):
+        jsonschema.validators.Draft4Validator(
+            schema.message_get).validate(MESSAGE)
+        url = 'http://sync.test/messages'
+        httpretty.register_uri(httpretty.POST, url,
+                               body=json.dumps(MESSAGE),
+                               content_type='application/json',
+                               status=201)
+        message = self.node_client.send('create', {'foo': 'bar'},
+                                        remote_id='1')
+        assert type(message) is Message
+        assert message.id == MESSAGE['id']
+        request = httpretty.last_request()
+        assert request.headers['X-Sync-Network-Id'] == NETWORK_ID
+        assert request.headers['X-Sync-Node-Id'] == NODE_ID
+        data = json.loads(request.body.decode('utf-8'))
+        jsonschema.validators.Draft4Validator(
+            schema.message_create).validate(data)
+        assert data['remote_id'] == '1'
+        assert 'record_id' not in data
+
+    @httpretty.activate
+    def test_client_fetch(self):
+        url = 'http://sync.test/messages/next'
+        httpretty.register_uri(httpretty.POST, url, responses=[
+            httpretty.Response(body=json.dumps(MESSAGE), status=200),
+            httpretty.Response(body='', status=204)
+        ])
+        message = self.node_client.fetch()
+        assert message.id == MESSAGE['id']
+        assert self.node_client.fetch() is None
+
+    @httpretty.activate
+    def test_client_fetch_not_retried(self):
+        # Fetching changes a message's state so must not be repeated.
+        url = 'http://sync.test/messages/next'
+        httpretty.register_uri(httpretty.POST, url, responses=[
+            httpretty.Response(body='', status=503),
+            httpretty.Response(body=json.dumps(MESSAGE), status=200)
+        ])
+        client = Client('http://sync.test/', NETWORK_ID, NODE_ID,
+                        backoff_factor=0)
+        with pytest.raises(ClientError) as excinfo:
+            client.fetch()
+        assert excinfo.value.response.status_code == 503
+        assert len(httpretty.HTTPretty.latest_requests) == 1
+
+    @httpretty.activate
+    def test_client_has_pending(self):
+        url = 'http://sync.test/messages/pending'
+        httpretty.register_uri(httpretty.GET, url, body=json.dumps(5),
+                               content_type='application/json',
+                               status=200)
+        assert self.node_client.has_pending() == 5
+
+    @httpretty.activate
+    def test_client_find_records(self):
+        url = 'http://sync.test/records'
+        body = {'records': [], 'cursor': None}
+        httpretty.register_uri(httpretty.GET, url, body=json.dumps(body),
+                               content_type='application/json',
+                               status=200)
+        result = self.node_client.find_records(
+            {'reference': 'a', 'age': {'gte': 18}}, limit=10,
+            cursor=MESSAGE['id'])
+        assert result == body
+        assert httpretty.last_request().querystring == {
+            'reference.eq': ['"a"'],
+            'age.gte': ['18'],
+            'limit': ['10'],
+            'cursor': [MESSAGE['id']]
+        }
+
+    @httpretty.activate
+    def test_client_import_records(self):
+        url = 'http://sync.test/records/import'
+        body = {'created': 1, 'updated': 0, 'deleted': 0, 'unchanged': 0,
+                'invalid': 0, 'failed': 0}
+        httpretty.register_uri(httpretty.POST, url, body=json.dumps(body),
+                               content_type='application/json',
+                               status=200)
+        extract = b'remote_id,name\na,b\n'
+        assert self.node_client.import_records(extract) == body
+        request = httpretty.last_request()
+        assert request.body == extract
+        assert request.headers['Content-Type'] == bulk.Format.CSV
+        assert request.querystring == {}
+
+        self.node_client.import_records(extract, bulk.Format.NDJSON,
+                                        delete=False)
+        request = httpretty.last_request()
+        assert request.headers['Content-Type'] == bulk.Format.NDJSON
+        assert request.querystring == {'delete': ['false']}
+
+    @httpretty.activate
+    def test_client_acknowledge_and_fail(self):
+        url = 'http://sync.test/messages/' + MESSAGE['id']
+        httpretty.register_uri(httpretty.PATCH, url,
+                               body=json.dumps(MESSAGE),
+                               content_type='application/json',
+                               status=200)
+        self.node_client.acknowledge(MESSAGE['id'], 'abc')
+        data = json.loads(httpretty.last_request().body.decode('utf-8'))
+        jsonschema.validators.Draft4Validator(
+            schema.message_update).validate(data)
+        assert data == {'success': True, 'remote_id': 'abc'}
+
+        self.node_client.fail(MESSAGE['id'], 'reason')
+        data = json.loads(httpretty.last_request().body.decode('utf-8'))
+        jsonschema.validators.Draft4Validator(
+            schema.message_update).validate(data)
+        assert data == {'success': False, 'reason': 'reason'}
+
+    def test_client_context_manager(self):
+        with Client('http://sync.test/') as client:
+            assert client.session is not None
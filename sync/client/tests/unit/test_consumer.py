@@ -0,0 +1,108 @@
+import threading
+
+from sync.client import ClientError, Consumer, Message
+
+
+class MockClient(object):
+    """Serves a fixed list of messages and records acknowledgements."""
+
+    def __init__(self, count, records=1):
+        self.lock = threading.Lock()
+        self.pending = []
+        for i in range(count):
+            message = Message()
+            message.id = str(i)
+            message.record_id = str(i % records)
+            self.pending.append(message)
+        self.batches = []
+        self.fetches = 0
+
+    def fetch(self):
+        with self.lock:
+            self.fetches += 1
+            if not self.pending:
+                return None
+            return self.pending.pop(0)
+
+    def acknowledge_batch(self, results):
+        with self.lock:
+            self.batches.append(results)
+        return [Message() for _ in results]
+
+
+def test_consumer():
+    client = MockClient(100, records=10)
+    handled = []
+
+    def handler(message):
+        handled.append(message.id)
+        if int(message.id) % 10 == 0:
+            raise ValueError('bad')
+        return 'remote-' + message.id
+
+    consumer = Consumer(client, handler, workers=4, ack_batch_size=20)
+    with consumer:
+        assert consumer.wait_idle(timeout=10)
+
+    stats = consumer.stats()
+    assert stats['fetched'] == 100
+    assert stats['succeeded'] == 90
+    assert stats['failed'] == 10
+    assert stats['acknowledged'] == 100
+    assert stats['in_flight'] == 0
+    assert stats['throughput'] > 0
+    assert stats['latency_max'] >= stats['latency_mean']
+
+    results = [r for batch in client.batches for r in batch]
+    assert len(results) == 100
+    assert all(len(batch) <= 20 for batch in client.batches)
+    failed = [r for r in results if not r['success']]
+    assert len(failed) == 10
+    assert failed[0]['reason'] == 'bad'
+    succeeded = [r for r in results if r['success']]
+    assert all(r['remote_id'] == 'remote-' + r['id'] for r in succeeded)
+
+    # Messages for the same record are handled in the order fetched.
+    for record in range(10):
+        ids = [int(i) for i in handled if int(i) % 10 == record]
+        assert ids == sorted(ids)
+
+
+def test_consumer_ack_interval():
+    client = MockClient(3)
+    consumer = Consumer(client, lambda m: None, workers=1,
+                        ack_batch_size=100, ack_interval=0.05)
+    consumer.start()
+    try:
+        assert consumer.wait_idle(timeout=5)
+        # Flushed by time, not size, and before stopping.
+        assert sum(len(b) for b in client.batches) == 3
+    finally:
+        consumer.stop()
+
+
+def test_consumer_backoff():
+    client = MockClient(0)
+    consumer = Consumer(client, lambda m: None, idle_backoff=0.01,
+                        max_backoff=0.04)
+    with consumer:
+        assert consumer.wait_idle(timeout=5)
+        threading.Event().wait(0.2)
+    # Without backing off this would have polled thousands of times.
+    assert 2 <= client.fetches < 15
+    assert consumer.stats()['handled'] == 0
+
+
+def test_consumer_errors():
+    client = MockClient(5)
+
+    def acknowledge_batch(results):
+        raise ClientError('Error 500', None)
+
+    client.acknowledge_batch = acknowledge_batch
+    consumer = Consumer(client, lambda m: None, workers=2)
+    with consumer:
+        assert consumer.wait_idle(timeout=5)
+    stats = consumer.stats()
+    assert stats['ack_errors'] == 5
+    assert stats['acknowledged'] == 0
@@ -0,0 +1,117 @@
+import pytest
+import threading
+
+from sync.client import ClientError, Message, Producer
+
+
+class MockResponse(object):
+
+    def __init__(self, status_code):
+        self.status_code = status_code
+
+
+class MockClient(object):
+    """Records the messages sent, with or without the batch endpoint."""
+
+    def __init__(self, batch_supported=True):
+        self.pool_size = 4
+        self.batch_supported = batch_supported
+        self.lock = threading.Lock()
+        self.batches = []
+        self.sent = []
+
+    def _message(self, data):
+        message = Message()
+        if data.get('method') == 'invalid':
+            message.error = 'Invalid method'
+            return message
+        message.method = data['method']
+        message.record_id = data.get('record_id')
+        return message
+
+    def send_batch(self, messages):
+        if not self.batch_supported:
+            raise ClientError('Error 405', MockResponse(405))
+        with self.lock:
+            self.batches.append(messages)
+        return [self._message(m) for m in messages]
+
+    def send(self, method, payload=None, record_id=None, remote_id=None):
+        data = {'method': method, 'payload': payload, 'record_id': record_id}
+        message = self._message(data)
+        if hasattr(message, 'error'):
+            raise ClientError(message.error, None)
+        with self.lock:
+            self.sent.append(data)
+        return message
+
+
+def test_producer_batches():
+    client = MockClient()
+    with Producer(client, batch_size=10, linger=10) as producer:
+        futures = [producer.send('create', {'i': i}) for i in range(25)]
+        futures.append(producer.send('invalid'))
+    assert producer.batch_supported
+    assert [len(b) for b in client.batches] == [10, 10, 6]
+    assert all(f.result().method == 'create' for f in futures[:-1])
+    with pytest.raises(ClientError):
+        futures[-1].result()
+
+
+def test_producer_linger():
+    client = MockClient()
+    producer = Producer(client, batch_size=100, linger=0.01)
+    try:
+        future = producer.send('create', {})
+        assert future.result(timeout=5).method == 'create'
+        assert len(client.batches) == 1
+    finally:
+        producer.close()
+
+
+def test_producer_flush():
+    client = MockClient()
+    producer = Producer(client, batch_size=100, linger=10)
+    futures = [producer.send('create', {}) for _ in range(3)]
+    producer.flush()
+    assert all(f.done() for f in futures)
+    producer.close()
+    with pytest.raises(ClientError):
+        producer.send('create', {})
+
+
+def test_producer_parallel():
+    client = MockClient(batch_supported=False)
+    with Producer(client, batch_size=50, linger=10) as producer:
+        futures = []
+        for i in range(100):
+            futures.append(producer.send('update', {'i': i},
+                                         record_id=str(i % 5)))
+        futures.append(producer.send('invalid'))
+    assert producer.batch_supported is False
+    assert client.batches == []
+    assert len(client.sent) == 100
+    assert all(f.result().method == 'update' for f in futures[:-1])
+    with pytest.raises(ClientError):
+        futures[-1].result()
+
+    # Messages for each record are sent in order.
+    for record_id in [str(i) for i in range(5)]:
+        sent = [m['payload']['i'] for m in client.sent
+                if m['record_id'] == record_id]
+        assert len(sent) == 20
+        assert sent == sorted(sent)
+
+
+def test_producer_errors():
+    client = MockClient()
+
+    def send_batch(messages):
+        raise ClientError('Error 503', MockResponse(503))
+
+    client.send_batch = send_batch
+    with Producer(client, batch_size=2, linger=10) as producer:
+        futures = [producer.send('create', {}) for _ in range(2)]
+    for future in futures:
+        with pytest.raises(ClientError):
+            future.result()
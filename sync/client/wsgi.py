@@ -0,0 +1,93 @@
+"""Send client requests to a WSGI application in the current process.
+
+Useful for tests, tools and benchmarks that want to exercise the whole
+HTTP API, such as sync.http.server.api, without running a server:
+
+    client = Client('http://sync.test/')
+    client.session.mount('http://sync.test/', WSGIAdapter(server.api))
+
+"""
+import threading
+
+from falcon import testing
+from requests.adapters import BaseAdapter
+from requests.models import Response
+from requests.structures import CaseInsensitiveDict
+
+from sync import compression
+
+try:
+    from urlparse import urlsplit
+except ImportError:
+    from urllib.parse import urlsplit
+
+
+def call(app, method, url, data=None, headers=None):
+    """Call a WSGI application.
+
+    Compressed response bodies are decompressed, as an HTTP library
+    would.
+
+    :param app: The WSGI application.
+    :type app: function
+    :param method: HTTP method.
+    :type method: str
+    :param url: The full URL, only the path and query string are used.
+    :type url: str
+    :param data: The request body.
+    :type data: bytes
+    :param headers: Request headers.
+    :type headers: dict
+    :returns: The status code, headers and body of the response.
+    :rtype: tuple
+
+    """
+    parts = urlsplit(url)
+    environ = testing.create_environ(path=parts.path,
+                                     query_string=parts.query,
+                                     headers=headers, body=data or b'',
+                                     method=method)
+    start_response = testing.StartResponseMock()
+    body = b''.join(app(environ, start_response))
+    headers = dict(start_response.headers)
+    encoding = headers.get('content-encoding')
+    if encoding in compression.Encoding.All:
+        body = compression.decompress(body, encoding)
+        del headers['content-encoding']
+    status_code = int(start_response.status.split(' ', 1)[0])
+    return status_code, headers, body
+
+
+class WSGIAdapter(BaseAdapter):
+    """A requests transport adapter that calls a WSGI application.
+
+    Requests are handled one at a time because the application may rely
+    on global state, as sync.http.server.api does.
+
+    """
+
+    def __init__(self, app):
+        super(WSGIAdapter, self).__init__()
+        self.app = app
+        self._lock = threading.Lock()
+
+    def send(self, request, **kwargs):
+        body = request.body
+        if body is not None and not isinstance(body, bytes):
+            body = body.encode('utf-8')
+        with self._lock:
+            status_code, headers, content = call(
+                self.app, request.method, request.url, body,
+                dict(request.headers))
+
+        response = Response()
+        response.status_code = status_code
+        response.headers = CaseInsensitiveDict(headers)
+        response.encoding = 'utf-8'
+        response.url = request.url
+        response.request = request
+        response._content = content
+        return response
+
+    def close(self):
+        pass
@@ -0,0 +1,143 @@
+import json
+import zlib
+
+from sync import exceptions
+
+
+class Encoding(object):
+    """Content encodings that can be compressed and decompressed.
+
+    """
+
+    Gzip = 'gzip'
+    Deflate = 'deflate'
+    Identity = 'identity'
+
+    All = [Gzip, Deflate]
+
+
+# zlib window sizes. Adding 16 writes or reads a gzip header and
+# trailer, a negative value reads a raw deflate stream.
+_WBITS = {
+    Encoding.Gzip: 16 + zlib.MAX_WBITS,
+    Encoding.Deflate: zlib.MAX_WBITS,
+}
+
+
+def compress(data, encoding=Encoding.Gzip, level=6):
+    """Compress bytes using a content encoding.
+
+    :param data: The bytes to compress.
+    :type data: bytes
+    :param encoding: Gzip or deflate.
+    :type encoding: sync.compression.Encoding
+    :param level: zlib compression level from 1 (fastest) to 9 (smallest).
+    :type level: int
+    :returns: The compressed bytes.
+    :rtype: bytes
+
+    """
+    compressor = zlib.compressobj(level, zlib.DEFLATED, _WBITS[encoding])
+    return compressor.compress(data) + compressor.flush()
+
+
+def decompress(data, encoding=Encoding.Gzip, maximum_size=None):
+    """Decompress bytes using a content encoding.
+
+    Deflate is ambiguous in practice as some clients send a raw deflate
+    stream rather than the zlib format, so both are accepted.
+
+    A small compressed body can expand to a very large one, so when a
+    maximum size is given decompression stops as soon as it is passed
+    rather than holding the whole output in memory.
+
+    :param data: The bytes to decompress.
+    :type data: bytes
+    :param encoding: Gzip or deflate.
+    :type encoding: sync.compression.Encoding
+    :param maximum_size: The largest number of decompressed bytes
+        allowed, or None for no limit.
+    :type maximum_size: int
+    :returns: The decompressed bytes.
+    :rtype: bytes
+    :raises: zlib.error, sync.exceptions.SizeExceededError
+
+    """
+    try:
+        return _decompress(data, _WBITS[encoding], maximum_size)
+    except zlib.error:
+        if encoding != Encoding.Deflate:
+            raise
+        return _decompress(data, -zlib.MAX_WBITS, maximum_size)
+
+
+def _decompress(data, wbits, maximum_size):
+    if maximum_size is None:
+        return zlib.decompress(data, wbits)
+
+    # Ask for one byte more than allowed so an oversized stream can be
+    # told apart from one that is exactly the maximum size.
+    decompressor = zlib.decompressobj(wbits)
+    result = decompressor.decompress(data, maximum_size + 1)
+    if len(result) > maximum_size:
+        raise exceptions.SizeExceededError(
+            'Decompressed data is larger than {0} bytes'.format(
+                maximum_size))
+
+    # Python 2 decompress objects can not report a truncated stream, as
+    # the output is now known to be small it is checked in one pass.
+    eof = getattr(decompressor, 'eof', None)
+    if eof is None:
+        return zlib.decompress(data, wbits)
+    if not eof:
+        raise zlib.error('Incomplete compressed data')
+    return result
+
+
+def decompress_json(data):
+    """Decompress a JSON value stored compressed in the zlib format.
+
+    :param data: The compressed bytes.
+    :type data: bytes
+    :returns: The value.
+    :rtype: dict
+
+    """
+    return json.loads(decompress(bytes(data), Encoding.Deflate)
+                      .decode('utf-8'))
+
+
+def accepted_encoding(header):
+    """Choose a supported encoding from an Accept-Encoding header.
+
+    Gzip is preferred over deflate when both are acceptable. Encodings
+    with a quality value of zero are refused.
+
+    :param header: The value of an Accept-Encoding header.
+    :type header: str
+    :returns: The chosen encoding or None if neither is accepted.
+    :rtype: str
+
+    """
+    if not header:
+        return None
+
+    qualities = {}
+    for item in header.split(','):
+        parts = item.strip().split(';')
+        name = parts[0].strip().lower()
+        quality = 1.0
+        for param in parts[1:]:
+            key, _, value = param.strip().partition('=')
+            if key.strip() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[name] = quality
+
+    wildcard = qualities.get('*', 0.0)
+    for encoding in Encoding.All:
+        if qualities.get(encoding, wildcard) > 0:
+            return encoding
+    return None
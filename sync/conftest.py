@@ -1,8 +1,14 @@
 import pytest
+import sys
 import testing.postgresql
 
 import sync
 
+# The asyncio client uses syntax older versions of Python can not parse.
+collect_ignore = []
+if sys.version_info < (3, 5):
+    collect_ignore.append('client/tests/unit/test_aio.py')
+
 postgresql = testing.postgresql.Postgresql(
     postgres_args='-h 127.0.0.1 -F -c logging_collector=off -c max_connections=100'  # noqa
 )
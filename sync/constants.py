@@ -24,6 +24,7 @@ class Type(object):
     Change = 'Change'
     Error = 'Error'
     Remote = 'Remote'
+    Latency = 'Latency'
 
 
 class Method(object):
@@ -48,6 +49,40 @@ class State(object):
     Processing = 'processing'
     Acknowledged = 'acknowledged'
     Failed = 'failed'
+    #: Replaced by a later message for the same record and
+    #: destination, on networks that coalesce messages.
+    Superseded = 'superseded'
+
+    #: States a message doesn't leave, messages in them may be archived.
+    Final = [Acknowledged, Failed, Superseded]
+
+
+class Operator(object):
+    """Comparisons records may be found by, on a head field.
+
+    """
+
+    Equal = 'eq'
+    GreaterThan = 'gt'
+    GreaterThanOrEqual = 'gte'
+    LessThan = 'lt'
+    LessThanOrEqual = 'lte'
+
+    All = [Equal, GreaterThan, GreaterThanOrEqual, LessThan, LessThanOrEqual]
+
+
+class IdFormat(object):
+    """Formats of the ids generated for new objects.
+
+    """
+
+    #: Random ids.
+    UUID4 = 'uuid4'
+    #: Ids starting with the time they were generated, in milliseconds,
+    #: so new ids sort after older ones.
+    UUID7 = 'uuid7'
+
+    All = [UUID4, UUID7]
 
 
 class Text(object):
@@ -72,3 +107,45 @@ class Text(object):
     InvalidUUID = 'Invalid UUID: {0}'
     MessageProcessingFailed = 'Message processing failed'
     MessageSendFailed = 'Message send failed'
+    MessageUpdateFailed = 'Message could not be updated'
+    MessageSuperseded = 'Superseded by a Delete message'
+    RecordFieldNotIndexed = 'Head field is not indexed by the network: {0}'
+    IndexFieldInvalid = 'Head field can not be indexed, only up to 40 word characters not starting with a digit are allowed: {0}'  # noqa
+    RecordFilterInvalid = 'Invalid filter on head field: {0}'
+    RecordUnchanged = 'Record unchanged by the update, not propagated'
+    ImportFormatUnknown = 'Unknown import format: {0}'
+    ImportRowInvalid = 'Import row {0} is invalid: {1}'
+    ImportDeletesSkipped = 'Records missing from the import were not deleted as {0} rows were invalid'  # noqa
+    SnapshotNetworkExists = 'Can not restore into an existing network: {0}'
+    SnapshotLineInvalid = 'Snapshot line {0} is invalid: {1}'
+
+
+class Stage(object):
+    """Names of the stages timed by sync.instrument.
+
+    These names are a stable contract for hooks and the metrics built on
+    them: a stage may be added but an existing name is not changed or
+    removed.
+
+    """
+
+    MessageSend = 'message.send'
+    MessageInflate = 'message.inflate'
+    MessageValidate = 'message.validate'
+    MessageExecute = 'message.execute'
+    MessagePropagate = 'message.propagate'
+    MessageFetch = 'message.fetch'
+    MessageAcknowledge = 'message.acknowledge'
+    MessageFail = 'message.fail'
+    RecordValidate = 'record.validate'
+    TaskNodeSync = 'task.node_sync'
+    TaskMessagePropagate = 'task.message_propagate'
+    TaskRetention = 'task.retention'
+    #: Each public storage method, e.g. storage.get_message or
+    #: storage.commit.
+    Storage = 'storage.{0}'
+
+    All = [MessageSend, MessageInflate, MessageValidate, MessageExecute,
+           MessagePropagate, MessageFetch, MessageAcknowledge, MessageFail,
+           RecordValidate, TaskNodeSync, TaskMessagePropagate,
+           TaskRetention]
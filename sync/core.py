@@ -1,11 +1,17 @@
 import copy
 import datetime
-import jsonschema
+import hashlib
+import json
+import random
 import six
+import threading
+import time
 import uuid
 
 
-from sync import exceptions, logs, tasks, Method, State, Text, Type
+from sync import (compression, exceptions, instrument, logs, metrics,
+                  settings, tasks, IdFormat, Method, Operator, Stage, State,
+                  Text, Type)
 
 
 # The global storage object.
@@ -44,28 +50,67 @@ def close():
     s = None
 
 
-def generate_id():
+# The millisecond and counter of the last UUID7 generated by this
+# process, guarded by a lock as ids are generated by request threads.
+_uuid7_last = [0, 0]
+_uuid7_lock = threading.Lock()
+_uuid7_random = random.SystemRandom()
+
+
+def _uuid7():
+    """Generate a UUID7: a 48 bit Unix time in milliseconds, a 12 bit
+    counter and 62 random bits.
+
+    Ids generated in the same millisecond count up from a random start,
+    so a process generates ids in order even if the clock steps back.
+
+    """
+    with _uuid7_lock:
+        millis = int(time.time() * 1000)
+        last, counter = _uuid7_last
+        if millis <= last:
+            millis = last
+            counter += 1
+            if counter > 0xfff:
+                millis += 1
+                counter = _uuid7_random.getrandbits(11)
+        else:
+            # Starting in the lower half leaves room to count up.
+            counter = _uuid7_random.getrandbits(11)
+        _uuid7_last[:] = [millis, counter]
+    value = (millis << 80) | (0x7 << 76) | (counter << 64) | \
+        (0x2 << 62) | _uuid7_random.getrandbits(62)
+    return uuid.UUID(int=value)
+
+
+def generate_id(format_=IdFormat.UUID4):
     """Generate a globally unique identifier.
 
+    :param format_: The format of the id.
+    :type format_: sync.constants.IdFormat
     :returns: str - A unique identifier.
     :rtype: str.
 
     """
-    id_ = uuid.uuid4()
+    if format_ == IdFormat.UUID7:
+        id_ = _uuid7()
+    else:
+        id_ = uuid.uuid4()
     return str(id_)
 
 
 def validate_id(id_string):
-    """Validate that a UUID string is in fact a valid uuid4.
+    """Validate that a UUID string is in fact a valid uuid4 or uuid7.
 
     :param uuid_string: A potential UUID
     :type uuid_string: string
     """
     try:
-        val = uuid.UUID(id_string, version=4)
+        val = uuid.UUID(id_string)
     except ValueError:
         return False
-    return str(val) == id_string
+    return str(val) == id_string and val.variant == uuid.RFC_4122 and \
+        val.version in (4, 7)
 
 
 def merge_patch(target, patch):
@@ -94,13 +139,87 @@ def merge_patch(target, patch):
         return patch
 
 
+def combine_patches(first, second):
+    """Combine two merge patches into one.
+
+    Applying the result has the same effect as applying first then
+    second. That isn't possible when second patches a field of first
+    that is not a dict, because a merge patch can not replace a value
+    with a dict, then None is returned.
+
+    :param first: The patch applied first.
+    :type first: dict
+    :param second: The patch applied second.
+    :type second: dict
+    :returns: The combined patch or None.
+    :rtype: dict
+
+    """
+    result = dict(first)
+    for name, value in six.iteritems(second):
+        if isinstance(value, dict) and name in first:
+            if not isinstance(first[name], dict):
+                return None
+            value = combine_patches(first[name], value)
+            if value is None:
+                return None
+        result[name] = value
+    return result
+
+
+def diff_patch(source, target):
+    """Create the merge patch that turns one dict into another.
+
+    Fields of source missing from target are patched with None, so
+    target should not itself hold None values.
+
+    :param source: The dict the patch applies to.
+    :type source: dict
+    :param target: The dict applying the patch results in.
+    :type target: dict
+    :returns: The patch, empty if the dicts are equal.
+    :rtype: dict
+
+    """
+    patch = {}
+    for name in source:
+        if name not in target:
+            patch[name] = None
+    for name, value in six.iteritems(target):
+        current = source.get(name)
+        if isinstance(value, dict) and isinstance(current, dict):
+            value = diff_patch(current, value)
+            if value:
+                patch[name] = value
+        elif name not in source or value != current:
+            patch[name] = value
+    return patch
+
+
+def content_hash(value):
+    """Hash a JSON value, so equal values hash the same whatever the
+    order of their keys.
+
+    :param value: The value to hash.
+    :type value: dict
+    :returns: The SHA-256 hex digest of the value's JSON, with sorted
+        keys, or None if the value is None.
+    :rtype: str
+
+    """
+    if value is None:
+        return None
+    data = json.dumps(value, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(data.encode('utf-8')).hexdigest()
+
+
 def generate_datetime():
     """Get the current datetime with reduced precision of the microsecond
     component as not all storage backends support Python's precision.
 
     """
     now = datetime.datetime.utcnow()
-    microsecond = int(str(now.microsecond)[0:3] + '000')
+    microsecond = now.microsecond // 1000 * 1000
     return now.replace(microsecond=microsecond)
 
 
@@ -110,11 +229,39 @@ class Base(object):
     Provides generic equality methods for objects of this class
     (__eq__ and __ne__) as well as helper utilities.
 
+    Storage backends may leave large properties compressed in
+    self._compressed, each is decompressed when first accessed.
+
     """
 
+    def __getattr__(self, name):
+        # Only called for attributes not found normally.
+        compressed = self.__dict__.get('_compressed')
+        if compressed and name in compressed:
+            value = compression.decompress_json(compressed.pop(name))
+            if not compressed:
+                del self.__dict__['_compressed']
+            setattr(self, name, value)
+            return value
+        raise AttributeError(name)
+
+    def _public(self):
+        # Private attributes hold inflated relations and storage
+        # details, which don't affect equality.
+        return dict((k, v) for k, v in six.iteritems(self.__dict__)
+                    if not k.startswith('_'))
+
+    def _decompress(self):
+        """Decompress every property still compressed."""
+        for name in list(self.__dict__.get('_compressed') or ()):
+            getattr(self, name)
+
     def __eq__(self, other):
-        return (isinstance(other, self.__class__)
-                and self.__dict__ == other.__dict__)
+        if not isinstance(other, self.__class__):
+            return False
+        self._decompress()
+        other._decompress()
+        return self._public() == other._public()
 
     def __ne__(self, other):
         return not self.__eq__(other)
@@ -130,6 +277,7 @@ class Base(object):
         :rtype: dict
 
         """
+        self._decompress()
         result = copy.deepcopy(self.__dict__)
         if not with_id:
             del result['id']
@@ -158,12 +306,26 @@ class Network(Base):
         #: fetch_before_send (bool): Determines whether nodes must
         # fetch all pending messages before they may send a message.
         self.fetch_before_send = True
+        #: coalesce (bool): Determines whether an Update is merged into
+        # a pending message for the same record and destination, and a
+        # Delete supersedes them, rather than queueing another message.
+        self.coalesce = False
+        #: indexes (list): Top level head fields that records can be
+        # found by, the storage backend indexes each.
+        self.indexes = []
+        #: id_format (sync.constants.IdFormat): The format of the ids
+        # generated for new objects, UUID7 ids keep inserts in order.
+        self.id_format = IdFormat.UUID4
 
     def save(self):
         """Save the object using the global sync.Storage object."""
         s.start_transaction()
-        s.save_network(self)
-        s.commit()
+        try:
+            s.save_network(self)
+            s.commit()
+        except Exception:
+            s.rollback()
+            raise
 
     @staticmethod
     def get():
@@ -171,7 +333,8 @@ class Network(Base):
         return s.get_network()
 
     @staticmethod
-    def init(name, schema, fetch_before_send=True):
+    def init(name, schema, fetch_before_send=True, coalesce=False,
+             indexes=None, id_format=IdFormat.UUID4):
         """Upserts the network.
 
         :param name: Friendly name for the sync network.
@@ -182,6 +345,15 @@ class Network(Base):
         :param fetch_before_send: Determines whether nodes must fetch
             all pending messages before they may send a message.
         :type fetch_before_send: bool
+        :param coalesce: Determines whether pending messages for the
+            same record and destination are coalesced.
+        :type coalesce: bool
+        :param indexes: Top level head fields that records can be found
+            by.
+        :type indexes: list
+        :param id_format: The format of the ids generated for new
+            objects.
+        :type id_format: sync.constants.IdFormat
         :returns: Instantiated network object.
         :rtype: sync.Network
 
@@ -192,9 +364,30 @@ class Network(Base):
         network.name = name
         network.schema = schema
         network.fetch_before_send = fetch_before_send
+        network.coalesce = coalesce
+        network.indexes = indexes or []
+        network.id_format = id_format
         network.save()
         return network
 
+    def retention(self, age=None):
+        """Archive, or purge, old messages in a final state in a
+        separate process.
+
+        :param age: Messages older than this many seconds are moved,
+            defaults to settings.RETENTION_AGE.
+        :type age: int
+        :returns: Messages sent before this time are moved.
+        :rtype: datetime.datetime
+
+        """
+        if age is None:
+            age = settings.RETENTION_AGE
+        before = generate_datetime() - datetime.timedelta(seconds=age)
+        args = (s.id, before)
+        tasks.run(tasks.retention, args)
+        return before
+
 
 class Node(Base):
     """Nodes are external networks that want to sync data.
@@ -273,9 +466,11 @@ class Node(Base):
         if method == Method.Create and record_id is not None:
             raise exceptions.InvalidOperationError(Text.NodeSendCreateInvalid)
 
-        return Message.send(self.id, method, payload,
-                            parent_id=None, destination_id=None,
-                            record_id=record_id, remote_id=remote_id)
+        message = Message.send(self.id, method, payload,
+                               parent_id=None, destination_id=None,
+                               record_id=record_id, remote_id=remote_id)
+        metrics.message_event(s.id, self.id, metrics.Event.Sent)
+        return message
 
     def fetch(self):
         """Fetch the next available, pending message object for the current
@@ -285,7 +480,10 @@ class Node(Base):
         :rtype: sync.Message
 
         """
-        return Message.fetch(self.id)
+        message = Message.fetch(self.id)
+        if message is not None:
+            metrics.message_event(s.id, self.id, metrics.Event.Fetched)
+        return message
 
     def has_pending(self):
         """The number of pending messages for the node.
@@ -314,6 +512,7 @@ class Node(Base):
         """
         message = self._get_message(message_id)
         message.acknowledge(remote_id)
+        metrics.message_event(s.id, self.id, metrics.Event.Acknowledged)
         return message
 
     def fail(self, message_id, reason=""):
@@ -332,6 +531,7 @@ class Node(Base):
         """
         message = self._get_message(message_id)
         message.fail(reason)
+        metrics.message_event(s.id, self.id, metrics.Event.Failed)
         return message
 
     def sync(self):
@@ -442,6 +642,10 @@ class Message(Base):
         self.record_id = None
         #: state (sync.constants.State): Current message state.
         self.state = State.Pending
+        #: record_hash (str): The record's hash once the message is
+        #: applied, acknowledging a message sent to a node records the
+        #: node has this version.
+        self.record_hash = None
 
         # Cache commonly required objects.
         self._network = None
@@ -451,11 +655,67 @@ class Message(Base):
         self._remote = None
         self._record = None
 
+    def _coalesce(self):
+        """Merge an Update into the newest message pending for the same
+        record and destination, or supersede the pending messages with
+        a Delete.
+
+        :returns: The pending message the update was merged into, or
+            None when this message must be saved.
+        :rtype: sync.Message
+
+        """
+        if self.destination_id is None or self.record_id is None or \
+           not self._network.coalesce:
+            return None
+
+        pending = s.get_pending_messages(self.destination_id,
+                                         self.record_id,
+                                         with_for_update=True)
+
+        if self.method == Method.Delete:
+            for message in pending:
+                if message.method in (Method.Create, Method.Update):
+                    message.update(State.Superseded, Text.MessageSuperseded)
+            return None
+
+        if self.method != Method.Update or not pending:
+            return None
+
+        message = pending[-1]
+        if message.method == Method.Create:
+            payload = merge_patch(copy.deepcopy(message.payload),
+                                  self.payload)
+        elif message.method == Method.Update:
+            payload = combine_patches(message.payload, self.payload)
+        else:
+            payload = None
+        if payload is None:
+            return None
+
+        message.payload = payload
+        message.record_hash = self.record_hash
+        message.save()
+        return message
+
+    @instrument.timed(Stage.MessageExecute)
     def _execute(self):
-        """Apply the message to the record store."""
+        """Apply the message to the record store.
+
+        :returns: False if the message is an Update that left the
+            record's head unchanged, so the record wasn't saved.
+        :rtype: bool
+
+        """
         if self._record is None:
             self._record = Record()
 
+        stored_hash = None
+        if self.method == Method.Update:
+            # Records saved before hashes were stored are hashed here.
+            stored_hash = self._record.hash or \
+                content_hash(self._record.head)
+
         existing = self._record.head if self._record.head is not None else {}
 
         if self.method == Method.Delete:
@@ -464,17 +724,26 @@ class Message(Base):
         else:
             self._record.head = merge_patch(existing, self.payload)
 
-        self._record.validate()
-        self._record.save()
+        changed = self.method != Method.Update or \
+            content_hash(self._record.head) != stored_hash
+        if changed:
+            self._record.validate()
+            if self.method == Method.Update:
+                self._record.patch(self.payload)
+            else:
+                self._record.save()
 
         self.record_id = self._record.id
+        self.record_hash = self._record.hash
 
         if self.remote_id is not None:
             Remote.create(self.origin_id, self.record_id,
                           self.remote_id)
 
         self.save()
+        return changed
 
+    @instrument.timed(Stage.MessageInflate)
     def _inflate(self):
         """Fetch objects related to this message."""
         self._network = s.get_network()
@@ -488,6 +757,7 @@ class Message(Base):
         if self._record is None and self._remote is not None:
             self._record = s.get_record(self._remote.record_id)
 
+    @instrument.timed(Stage.MessagePropagate)
     def _propagate(self):
         """Forward the message to all other nodes that have the read
         permission.
@@ -496,6 +766,7 @@ class Message(Base):
         args = (s.id, self)
         tasks.run(tasks.message_propagate, args=args)
 
+    @instrument.timed(Stage.MessageValidate)
     def _validate(self):
         """Validate that the message is in a state that can be processed."""
         # Parent message can be found.
@@ -552,6 +823,8 @@ class Message(Base):
         :type value: sync.constants.State
         :param note: Text description of the change.
         :type note: str
+        :returns: The new change object.
+        :rtype: sync.Change
 
         """
         assert self.id is not None
@@ -562,6 +835,11 @@ class Message(Base):
                 self.state, value)
             raise exceptions.InvalidOperationError(text)
 
+        if value == State.Superseded and self.state != State.Pending:
+            text = Text.MessageStateInvalid.format(
+                self.state, value)
+            raise exceptions.InvalidOperationError(text)
+
         self.state = value
 
         change = Change()
@@ -571,7 +849,9 @@ class Message(Base):
 
         change.save()
         self.save()
+        return change
 
+    @instrument.timed(Stage.MessageAcknowledge)
     def acknowledge(self, remote_id=None):
         """Acknowledge the message.
 
@@ -590,16 +870,23 @@ class Message(Base):
         assert self.state == State.Processing
 
         s.start_transaction()
-        self.update(State.Acknowledged)
+        change = self.update(State.Acknowledged)
+        if self.parent_id is not None and self.destination_id is not None:
+            Latency.record(self, change.timestamp)
         if self.destination_id is not None and remote_id is not None \
            and self.remote_id != remote_id:
             assert self.record_id is not None
             Remote.create(self.destination_id, self.record_id,
-                          remote_id)
+                          remote_id, self.record_hash)
             self.remote_id = remote_id
+        elif self.destination_id is not None and \
+                self.record_hash is not None:
+            Remote.delivered(self.destination_id, self.record_id,
+                             self.record_hash)
 
         s.commit()
 
+    @instrument.timed(Stage.MessageFail)
     def fail(self, reason=""):
         """Fail the message.
 
@@ -638,8 +925,63 @@ class Message(Base):
         return s.get_message(message_id)
 
     @staticmethod
+    def archive(before, limit, purge=False):
+        """Move a batch of messages in a final state, and their changes,
+        to the archive using the global sync.Storage object.
+
+        Messages are moved oldest first. A message is kept while
+        messages it is the parent of remain, it is moved with a later
+        batch.
+
+        :param before: Only messages sent before this time are moved.
+        :type before: datetime.datetime
+        :param limit: The most messages to move.
+        :type limit: int
+        :param purge: Delete the messages rather than archiving them.
+        :type purge: bool
+        :returns: The number of messages moved.
+        :rtype: int
+
+        """
+        try:
+            s.start_transaction()
+            count = s.archive_messages(before, limit, purge)
+            s.commit()
+            return count
+        except Exception:
+            s.rollback()
+
+            raise
+
+    @staticmethod
+    def purge_payloads(before, limit):
+        """Delete a batch of stored payloads no message refers to any
+        more using the global sync.Storage object.
+
+        :param before: Only payloads last saved before this time are
+            deleted.
+        :type before: datetime.datetime
+        :param limit: The most payloads to delete.
+        :type limit: int
+        :returns: The number of payloads deleted.
+        :rtype: int
+
+        """
+        try:
+            s.start_transaction()
+            count = s.purge_payloads(before, limit)
+            s.commit()
+            return count
+        except Exception:
+            s.rollback()
+
+            raise
+
+    @staticmethod
+    @instrument.timed(Stage.MessageSend)
     def send(origin_id, method, payload=None, parent_id=None,
-             destination_id=None, record_id=None, remote_id=None):
+             destination_id=None, record_id=None, remote_id=None,
+             record_hash=None):
         """Send a message.
 
         :param origin_id: The origin node id.
@@ -657,7 +999,11 @@ class Message(Base):
         :param remote_id: A node specific identifier to associate with
             a record.
         :type remote_id: str
-        :returns: The sent message object
+        :param record_hash: The hash of the record the message sends a
+            node.
+        :type record_hash: str
+        :returns: The sent message object, or the pending message it
+            was merged into on networks that coalesce messages.
         :rtype: sync.Message
 
         """
@@ -670,12 +1016,15 @@ class Message(Base):
         message.payload = payload
         message.record_id = record_id
         message.remote_id = remote_id
+        message.record_hash = record_hash
 
         try:
             s.start_transaction()
             message._inflate()
             message._validate()
-            message.save()
+            coalesced = message._coalesce()
+            if coalesced is None:
+                message.save()
             s.commit()
         except Exception:
             s.rollback()
@@ -683,6 +1032,9 @@ class Message(Base):
 
             raise
 
+        if coalesced is not None:
+            return coalesced
+
         if destination_id is not None:
             return message
 
@@ -692,9 +1044,11 @@ class Message(Base):
 
         try:
             s.start_transaction()
-            message._execute()
-            message._propagate()
-            message.update(State.Acknowledged)
+            if message._execute():
+                message._propagate()
+                message.update(State.Acknowledged)
+            else:
+                message.update(State.Acknowledged, Text.RecordUnchanged)
             s.commit()
         except Exception:
             s.rollback()
@@ -708,6 +1062,7 @@ class Message(Base):
         return message
 
     @staticmethod
+    @instrument.timed(Stage.MessageFetch)
     def fetch(destination_id):
         """Fetch next pending message.
 
@@ -727,6 +1082,7 @@ class Message(Base):
             message = s.get_message(destination_id=destination_id,
                                     with_for_update=True)
             if message is None:
+                s.commit()
                 return None
             message.update(State.Processing)
             s.commit()
@@ -759,6 +1115,93 @@ class Change(Base):
         s.save_change(self)
 
 
+class Latency(Base):
+    """How long a propagated message took to reach its destination,
+    recorded when the destination acknowledges it.
+
+    Intervals are in seconds. fan_out is from the parent message being
+    sent to this message being created, fetch is from creation to the
+    destination fetching it and acknowledge is from being fetched to
+    being acknowledged.
+
+    """
+
+    def __init__(self):
+        #: id (str): Unique identifier.
+        self.id = None
+        #: message_id (str): The acknowledged message.
+        self.message_id = None
+        #: parent_id (str): The message sent by the origin node.
+        self.parent_id = None
+        #: destination_id (str): The node that acknowledged the message.
+        self.destination_id = None
+        #: timestamp (datetime.datetime): When the message was
+        #: acknowledged.
+        self.timestamp = None
+        #: fan_out (float): Parent sent until message created.
+        self.fan_out = None
+        #: fetch (float): Message created until fetched.
+        self.fetch = None
+        #: acknowledge (float): Message fetched until acknowledged.
+        self.acknowledge = None
+        #: total (float): Parent sent until message acknowledged.
+        self.total = None
+
+    def save(self):
+        """Save the object using the global sync.Storage object."""
+        s.save_latency(self)
+
+    @staticmethod
+    def record(message, acknowledged):
+        """Record the latency of a propagated message from its lineage.
+
+        :param message: A message with a parent, being acknowledged.
+        :type message: sync.Message
+        :param acknowledged: When the message was acknowledged.
+        :type acknowledged: datetime.datetime
+        :returns: The saved latency object, None if the parent or fetch
+            can not be found.
+        :rtype: sync.Latency
+
+        """
+        parent = s.get_message(message.parent_id)
+        fetched = None
+        for change in s.get_changes(message.id):
+            if change.state == State.Processing and \
+               (fetched is None or change.timestamp > fetched):
+                fetched = change.timestamp
+        if parent is None or fetched is None:
+            return None
+
+        def seconds(start, end):
+            return max((end - start).total_seconds(), 0.0)
+
+        latency = Latency()
+        latency.message_id = message.id
+        latency.parent_id = message.parent_id
+        latency.destination_id = message.destination_id
+        latency.timestamp = acknowledged
+        latency.fan_out = seconds(parent.timestamp, message.timestamp)
+        latency.fetch = seconds(message.timestamp, fetched)
+        latency.acknowledge = seconds(fetched, acknowledged)
+        latency.total = seconds(parent.timestamp, acknowledged)
+        latency.save()
+        return latency
+
+    @staticmethod
+    def get(since=None):
+        """Fetch latencies using the global sync.Storage object.
+
+        :param since: The earliest acknowledgement time, all latencies
+            when None.
+        :type since: datetime.datetime
+        :returns: An array of latencies.
+        :rtype: array
+
+        """
+        return s.get_latencies(since)
+
+
 class Record(Base):
     """A record of data to be synced."""
 
@@ -772,9 +1215,13 @@ class Record(Base):
         self.deleted = False
         #: head (dict): The current state of the record.
         self.head = None
+        #: hash (str): The content_hash of head when the record was
+        #: saved, compare hashes to find whether heads differ.
+        self.hash = None
         #: remotes (list): Cache of sync.Remote objects for this record.
         self._remotes = []
 
+    @instrument.timed(Stage.RecordValidate)
     def validate(self):
         """Validate the record head against the current JSON schema.
 
@@ -785,6 +1232,10 @@ class Record(Base):
         if self.deleted and self.head is None:
             return True
 
+        # Imported here as it is slow to load and only needed once a
+        # record is written.
+        import jsonschema
+
         network = s.get_network()
         jsonschema.validators.Draft4Validator(
             network.schema).validate(self.head)
@@ -794,8 +1245,21 @@ class Record(Base):
     def save(self):
         """Save the object using the global sync.Storage object."""
         self.last_updated = generate_datetime()
+        self.hash = content_hash(self.head)
         s.save_record(self)
 
+    def patch(self, patch):
+        """Save the object after a merge patch has been applied to its
+        head, letting the storage write only the patch.
+
+        :param patch: The merge patch applied to the head.
+        :type patch: dict
+
+        """
+        self.last_updated = generate_datetime()
+        self.hash = content_hash(self.head)
+        s.patch_record(self, patch)
+
     def remote(self, node_id):
         """If one exists, fetch the nodes remote object for this record.
 
@@ -820,6 +1284,53 @@ class Record(Base):
         """
         return s.get_record(record_id)
 
+    @staticmethod
+    def find(filter_=None, limit=100, cursor=None):
+        """Find records, that are not deleted, by the values of top
+        level head fields the network indexes.
+
+        Records are ordered by id, pass the cursor returned with a page
+        to fetch the next.
+
+        :param filter_: Maps head fields to a value the field must
+            equal, or a dict mapping sync.constants.Operator values to
+            the value to compare the field with. Ranges only match
+            values of the same JSON type.
+        :type filter_: dict
+        :param limit: The most records to return.
+        :type limit: int
+        :param cursor: The cursor returned with the previous page.
+        :type cursor: str
+        :returns: The records and the cursor of the next page, or None
+            if this is the last.
+        :rtype: tuple
+        :raises: sync.exceptions.InvalidOperationError
+
+        """
+        indexes = s.get_network().indexes or []
+        filters = []
+        for field, condition in sorted(six.iteritems(filter_ or {})):
+            if field not in indexes:
+                text = Text.RecordFieldNotIndexed.format(field)
+                raise exceptions.InvalidOperationError(text)
+            if not isinstance(condition, dict):
+                condition = {Operator.Equal: condition}
+            for operator, value in sorted(six.iteritems(condition)):
+                if operator not in Operator.All or \
+                   not isinstance(value, (bool, float, six.integer_types,
+                                          six.string_types)):
+                    text = Text.RecordFilterInvalid.format(field)
+                    raise exceptions.InvalidOperationError(text)
+                filters.append((field, operator, value))
+
+        if cursor is not None and not validate_id(cursor):
+            text = Text.InvalidUUID.format(cursor)
+            raise exceptions.InvalidOperationError(text)
+
+        records = s.find_records(filters, limit, cursor)
+        cursor = records[-1].id if len(records) == limit else None
+        return records, cursor
+
     @staticmethod
     def get_all():
         """Fetch all records in batches.
@@ -839,6 +1350,9 @@ class Remote(Base):
     storing the sync networks record ids. Instead it can opt to provide
     it's own unique id for each record.
 
+    A remote also holds the version of the record the node last
+    acknowledged, whether or not the node provided an id.
+
     """
 
     def __init__(self):
@@ -848,8 +1362,12 @@ class Remote(Base):
         self.node_id = None
         #: record_id (str): The id of the record.
         self.record_id = None
-        #: remote_id (str): The unique id provided by the node.
+        #: remote_id (str): The unique id provided by the node, None if
+        #: it hasn't provided one.
         self.remote_id = None
+        #: hash (str): The hash of the record version the node last
+        #: acknowledged.
+        self.hash = None
 
     def save(self):
         """Save the object using the global sync.Storage object."""
@@ -869,12 +1387,14 @@ class Remote(Base):
         return s.get_remote(node_id, remote_id, record_id)
 
     @staticmethod
-    def create(node_id, record_id, remote_id):
+    def create(node_id, record_id, remote_id, record_hash=None):
         """Create a remote.
 
         :param node_id: The id of the node.
         :param record_id: The id of the record.
         :param remote_id: The unique id provided by the node.
+        :param record_hash: The hash of the record version the node
+            acknowledged, if any.
         :returns: A remote object
         :rtype: sync.Remote
 
@@ -885,14 +1405,44 @@ class Remote(Base):
             if existing.record_id != record_id:
                 message = Text.RemoteInUse.format(remote_id)
                 raise exceptions.InvalidOperationError(message)
+            if record_hash is not None and existing.hash != record_hash:
+                existing.hash = record_hash
+                existing.save()
             return existing
 
-        remote = Remote()
-        remote.node_id = node_id
-        remote.record_id = record_id
+        # Reuse a remote only noting the version delivered to the node.
+        remote = s.get_remote(node_id, record_id=record_id)
+        if remote is None or remote.remote_id is not None:
+            remote = Remote()
+            remote.node_id = node_id
+            remote.record_id = record_id
         remote.remote_id = remote_id
+        if record_hash is not None:
+            remote.hash = record_hash
         remote.save()
 
         s.update_messages(node_id, record_id, remote_id)
 
         return remote
+
+    @staticmethod
+    def delivered(node_id, record_id, record_hash):
+        """Note the version of a record a node acknowledged, so syncing
+        the node can skip the record until it changes.
+
+        :param node_id: The id of the node.
+        :param record_id: The id of the record.
+        :param record_hash: The record's hash when it was sent.
+        :returns: A remote object
+        :rtype: sync.Remote
+
+        """
+        remote = s.get_remote(node_id, record_id=record_id)
+        if remote is None:
+            remote = Remote()
+            remote.node_id = node_id
+            remote.record_id = record_id
+        if remote.hash != record_hash:
+            remote.hash = record_hash
+            remote.save()
+        return remote
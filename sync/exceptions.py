@@ -43,3 +43,8 @@ class NotFoundError(SyncError):
 class InvalidJsonError(SyncError):
     """JSON is not valid."""
     pass
+
+
+class SizeExceededError(SyncError):
+    """Data is larger than the maximum size allowed."""
+    pass
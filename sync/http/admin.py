@@ -1,10 +1,11 @@
+import datetime
 import json
 import jsonschema
 import falcon
 
 import sync
 
-from sync import schema
+from sync import bulk, metrics, schema, snapshot
 from sync.http import utils
 from sync.storage import init_storage
 
@@ -13,6 +14,25 @@ def init(network_id):
     init_storage(network_id, create_db=False)
 
 
+class Metrics:
+
+    def on_get(self, req, resp):
+        network_ids = metrics.networks()
+        network_ids.update(req.get_param_as_list('network_id') or [])
+        pending = {}
+        for network_id in network_ids:
+            if not sync.core.validate_id(network_id):
+                continue
+            try:
+                init(network_id)
+            except sync.exceptions.DatabaseNotFoundError:
+                continue
+            pending[network_id] = \
+                sync.current_storage().get_pending_summary()
+        resp.content_type = metrics.CONTENT_TYPE
+        resp.body = metrics.render(pending)
+
+
 class NetworkList:
 
     def on_post(self, req, resp):
@@ -50,6 +70,60 @@ class Network:
         resp.body = json.dumps(network, default=utils.json_serial)
 
 
+class NetworkLag:
+
+    def on_get(self, req, resp, network_id):
+        init(network_id)
+        window = req.get_param_as_int('window', min=1) or 3600
+        since = datetime.datetime.utcnow() - \
+            datetime.timedelta(seconds=window)
+        result = {
+            'window': window,
+            'destinations': metrics.propagation_lag(
+                sync.Latency.get(since))
+        }
+        jsonschema.validators.Draft4Validator(
+            schema.network_lag_get).validate(result)
+        resp.body = json.dumps(result, default=utils.json_serial)
+
+
+class NetworkRetention:
+
+    def on_post(self, req, resp, network_id):
+        init(network_id)
+        age = req.get_param_as_int('age', min=1)
+        before = sync.Network.get().retention(age)
+        result = {
+            'before': before.isoformat(),
+            'purge': sync.settings.RETENTION_PURGE
+        }
+        jsonschema.validators.Draft4Validator(
+            schema.network_retention_post).validate(result)
+        resp.body = json.dumps(result)
+        resp.status = falcon.HTTP_202
+
+
+class NetworkExport:
+
+    def on_get(self, req, resp, network_id):
+        init(network_id)
+        lines = snapshot.export(sync.current_storage(),
+                                req.get_param_as_bool('nodes') or False,
+                                req.get_param_as_bool('schema') or False)
+        resp.content_type = bulk.Format.NDJSON
+        # Streamed without a Content-Length, so sent chunked, as the
+        # records are read.
+        resp.stream = (line.encode('utf-8') for line in lines)
+
+
+class RecordList:
+
+    def on_get(self, req, resp, network_id):
+        init(network_id)
+        result = utils.find_records(req)
+        resp.body = json.dumps(result, default=utils.json_serial)
+
+
 class NodeList:
 
     def on_get(self, req, resp, network_id):
@@ -4,7 +4,7 @@ import falcon
 
 import sync
 
-from sync import schema
+from sync import bulk, schema, Method, Text
 from sync.http import utils
 from sync.storage import init_storage
 
@@ -31,7 +31,7 @@ class MessageList:
 
     def on_post(self, req, resp, node):
         json_data = req.stream.read()
-        data = utils.inflate(json_data, utils.PostData,
+        data = utils.inflate(json_data, utils.PostData(),
                              schema.message_create)
         method = data.method
         payload = data.payload
@@ -69,13 +69,60 @@ class MessageNext:
         resp.body = json.dumps(message, default=utils.json_serial)
 
 
+@falcon.before(handle_headers)
+class MessageBatch:
+
+    def on_post(self, req, resp, node):
+        json_data = req.stream.read()
+        messages = utils.load(json_data, schema.message_batch_create)
+        result = []
+        for data in messages:
+            # Messages are sent in order, each in its own transaction,
+            # so one invalid message does not prevent the others.
+            try:
+                message = node.send(data['method'], data.get('payload'),
+                                    data.get('record_id'),
+                                    data.get('remote_id'))
+                result.append(message.as_dict(with_id=True))
+            except (jsonschema.exceptions.ValidationError,
+                    sync.exceptions.SyncError) as ex:
+                error = str(ex) or Text.MessageSendFailed
+                result.append({'error': error})
+        jsonschema.validators.Draft4Validator(
+            schema.message_batch_create_get).validate(result)
+        resp.status = falcon.HTTP_201
+        resp.body = json.dumps(result, default=utils.json_serial)
+
+    def on_patch(self, req, resp, node):
+        json_data = req.stream.read()
+        updates = utils.load(json_data, schema.message_batch_update)
+        result = []
+        for update in updates:
+            # Each message is updated in its own transaction so one
+            # failure is reported without undoing the others.
+            try:
+                if update['success']:
+                    message = node.acknowledge(update['id'],
+                                               update.get('remote_id'))
+                else:
+                    message = node.fail(update['id'], update.get('reason'))
+                result.append({'id': message.id, 'state': message.state})
+            except (AssertionError, sync.exceptions.SyncError) as ex:
+                error = str(ex) or Text.MessageUpdateFailed
+                result.append({'id': update['id'], 'error': error})
+        jsonschema.validators.Draft4Validator(
+            schema.message_batch_get).validate(result)
+        resp.body = json.dumps(result, default=utils.json_serial)
+
+
 @falcon.before(handle_headers)
 class Message:
 
     def on_patch(self, req, resp, message_id, node):
         utils.obj_or_404(node)
         json_data = req.stream.read()
-        data = utils.inflate(json_data, utils.PostData, schema.message_update)
+        data = utils.inflate(json_data, utils.PostData(),
+                             schema.message_update)
         if data.success:
             remote_id = getattr(data, 'remote_id', None)
             message = node.acknowledge(message_id, remote_id)
@@ -86,3 +133,33 @@ class Message:
         jsonschema.validators.Draft4Validator(
             schema.message_get).validate(message)
         resp.body = json.dumps(message, default=utils.json_serial)
+
+
+@falcon.before(handle_headers)
+class RecordList:
+
+    def on_get(self, req, resp, node):
+        if not node.check(Method.Read):
+            text = Text.NodeMissingPermission.format(Method.Read)
+            raise sync.exceptions.InvalidOperationError(text)
+        result = utils.find_records(req)
+        resp.body = json.dumps(result, default=utils.json_serial)
+
+
+@falcon.before(handle_headers)
+class RecordImport:
+
+    def on_post(self, req, resp, node):
+        format_ = (req.content_type or '').split(';')[0].strip().lower()
+        if format_ not in bulk.Format.All:
+            raise falcon.HTTPUnsupportedMediaType(
+                Text.ImportFormatUnknown.format(format_))
+        delete = req.get_param_as_bool('delete')
+        if delete is None:
+            delete = True
+        # The body is read a line at a time rather than all at once.
+        rows = bulk.read(req.stream, format_)
+        result = bulk.import_extract(node, rows, delete)
+        jsonschema.validators.Draft4Validator(
+            schema.records_import_get).validate(result)
+        resp.body = json.dumps(result, default=utils.json_serial)
@@ -1,7 +1,175 @@
+import io
+import os
+import zlib
+
+import falcon
+import six
+
 import sync
 
+from sync import (compression, exceptions, instrument, metrics, profiling,
+                  settings, storage)
+
+
+# Request header asking for a request to be profiled.
+_HEADER_PROFILE = 'X-Sync-Profile'
+
 
 class Sync(object):
 
     def process_response(self, req, resp, resource, req_succeeded):
         sync.close()
+
+
+def route_label(resource):
+    """Label a route by its resource's module and class name, such as
+    admin.RecordList, as resources in different modules share names.
+
+    """
+    if resource is None:
+        return ''
+    class_ = resource.__class__
+    return '{0}.{1}'.format(class_.__module__.rsplit('.', 1)[-1],
+                            class_.__name__)
+
+
+class Metrics(object):
+    """Record the latency of each request in sync.metrics.requests."""
+
+    def process_request(self, req, resp):
+        req.context['metrics_start'] = instrument.clock()
+
+    def process_response(self, req, resp, resource, req_succeeded):
+        start = req.context.get('metrics_start')
+        if start is None:
+            return
+        route = route_label(resource)
+        status = resp.status.split(' ', 1)[0]
+        metrics.requests((req.method, route, status),
+                         instrument.clock() - start)
+
+
+class QueryLog(object):
+    """Log the storage calls made by each request when
+    settings.STORAGE_QUERY_LOG is true.
+
+    """
+
+    def process_request(self, req, resp):
+        if settings.STORAGE_QUERY_LOG:
+            req.context['query_counter'] = storage.start_counting(
+                '{0} {1}'.format(req.method, req.path))
+
+    def process_response(self, req, resp, resource, req_succeeded):
+        counter = req.context.get('query_counter')
+        if counter is not None:
+            storage.stop_counting(counter, log=True)
+
+
+class Profile(object):
+    """Profile sampled requests and those sent with an X-Sync-Profile
+    header, see sync.profiling. The profile's file name is returned in
+    the same header.
+
+    """
+
+    def process_request(self, req, resp):
+        requested = req.get_header(_HEADER_PROFILE) is not None
+        if profiling.should_profile(requested):
+            req.context['profiler'] = profiling.start()
+
+    def process_response(self, req, resp, resource, req_succeeded):
+        profiler = req.context.get('profiler')
+        if profiler is None:
+            return
+        path = profiling.stop(profiler,
+                              '{0} {1}'.format(req.method, req.path))
+        resp.set_header(_HEADER_PROFILE, os.path.basename(path))
+
+
+class Compression(object):
+    """Decompress gzip or deflate encoded request bodies before they are
+    read by a resource and compress response bodies for clients that
+    accept it.
+
+    """
+
+    def __init__(self, minimum_size=None, level=None,
+                 maximum_request_size=None):
+        """Initialise the middleware.
+
+        :param minimum_size: Responses smaller than this number of bytes
+            are not compressed. Defaults to
+            settings.COMPRESSION_MINIMUM_SIZE.
+        :type minimum_size: int
+        :param level: zlib compression level. Defaults to
+            settings.COMPRESSION_LEVEL.
+        :type level: int
+        :param maximum_request_size: Request bodies that decompress to
+            more than this number of bytes are refused. Defaults to
+            settings.COMPRESSION_MAXIMUM_REQUEST_SIZE.
+        :type maximum_request_size: int
+
+        """
+        if minimum_size is None:
+            minimum_size = settings.COMPRESSION_MINIMUM_SIZE
+        if level is None:
+            level = settings.COMPRESSION_LEVEL
+        if maximum_request_size is None:
+            maximum_request_size = settings.COMPRESSION_MAXIMUM_REQUEST_SIZE
+        self.minimum_size = minimum_size
+        self.level = level
+        self.maximum_request_size = maximum_request_size
+
+    def process_request(self, req, resp):
+        encoding = req.get_header('Content-Encoding')
+        if encoding is None:
+            return
+
+        encoding = encoding.strip().lower()
+        if encoding == compression.Encoding.Identity:
+            return
+        if encoding not in compression.Encoding.All:
+            raise falcon.HTTPUnsupportedMediaType(
+                'Unsupported Content-Encoding: {0}'.format(encoding))
+
+        try:
+            data = compression.decompress(req.stream.read(), encoding,
+                                          self.maximum_request_size)
+        except exceptions.SizeExceededError:
+            raise falcon.HTTPRequestEntityTooLarge(
+                'Request body too large',
+                'Decompressed body is larger than {0} bytes'.format(
+                    self.maximum_request_size))
+        except zlib.error:
+            raise falcon.HTTPBadRequest(
+                'Invalid request body',
+                'Body could not be decoded as {0}'.format(encoding))
+
+        req.stream = io.BytesIO(data)
+
+    def process_response(self, req, resp, resource, req_succeeded):
+        if resp.body is None and resp.data is None:
+            return
+        if resp.get_header('Content-Encoding') is not None:
+            return
+
+        resp.append_header('Vary', 'Accept-Encoding')
+
+        encoding = compression.accepted_encoding(
+            req.get_header('Accept-Encoding'))
+        if encoding is None:
+            return
+
+        data = resp.data
+        if resp.body is not None:
+            data = resp.body
+            if isinstance(data, six.text_type):
+                data = data.encode('utf-8')
+
+        if len(data) < self.minimum_size:
+            return
+
+        resp.data = compression.compress(data, encoding, self.level)
+        resp.body = None
+        resp.set_header('Content-Encoding', encoding)
@@ -4,25 +4,41 @@ import jsonschema
 
 import sync
 
+from sync import logs
 from sync.http import admin, errors, middleware, messaging
 
 
+logs.configure()
+
 # Middleware.
 cors = CORS(allow_all_origins=True, allow_all_headers=True,
             allow_all_methods=True)
 
-api = falcon.API(middleware=[cors.middleware])
+api = falcon.API(middleware=[cors.middleware,
+                             middleware.Profile(),
+                             middleware.Metrics(),
+                             middleware.QueryLog(),
+                             middleware.Compression()])
 
 # Sync API.
 api.add_route('/messages', messaging.MessageList())
 api.add_route('/messages/pending', messaging.MessagePending())
 api.add_route('/messages/next', messaging.MessageNext())
+api.add_route('/messages/batch', messaging.MessageBatch())
 api.add_route('/messages/{message_id}', messaging.Message())
+api.add_route('/records', messaging.RecordList())
+api.add_route('/records/import', messaging.RecordImport())
 
 
 # Admin API.
+api.add_route('/admin/metrics', admin.Metrics())
 api.add_route('/admin/networks', admin.NetworkList())
 api.add_route('/admin/networks/{network_id}', admin.Network())
+api.add_route('/admin/networks/{network_id}/lag', admin.NetworkLag())
+api.add_route('/admin/networks/{network_id}/retention',
+              admin.NetworkRetention())
+api.add_route('/admin/networks/{network_id}/export', admin.NetworkExport())
+api.add_route('/admin/networks/{network_id}/records', admin.RecordList())
 api.add_route('/admin/networks/{network_id}/nodes', admin.NodeList())
 api.add_route('/admin/networks/{network_id}/nodes/{node_id}', admin.Node())
 api.add_route('/admin/networks/{network_id}/nodes/{node_id}/sync', admin.NodeSync())
@@ -1,3 +1,4 @@
+import datetime
 import falcon
 import json
 import mongomock
@@ -7,7 +8,7 @@ from falcon.testing.client import TestClient as tc
 
 import sync
 
-from sync import exceptions
+from sync import compression, exceptions, settings
 from sync.conftest import postgresql
 from sync import Backend
 from sync.http import errors, server, utils
@@ -382,6 +383,69 @@ class TestHttp():
                                             headers=self.node_2_headers)
         assert result.status_code == 200
 
+    def test_http_message_batch(self, request):
+        self.setup_network()
+        self.setup_nodes()
+
+        url = '/messages'
+        body = {
+            'method': 'create',
+            'payload': {
+                'firstName': 'test',
+                'lastName': 'test'
+            }
+        }
+        for remote_id in ['1', '2']:
+            body['remote_id'] = remote_id
+            result = self.client.simulate_post(url, body=json.dumps(body),
+                                               headers=self.node_1_headers)
+            assert result.status_code == 201
+
+        # POST 201, each message's result is reported.
+        body = [
+            {'method': 'create', 'payload': body['payload'],
+             'remote_id': '3'},
+            {'method': 'create', 'payload': {}},
+            {'method': 'update', 'payload': {'age': 1}, 'remote_id': '3'}
+        ]
+        result = self.client.simulate_post(url + '/batch',
+                                           body=json.dumps(body),
+                                           headers=self.node_1_headers)
+        assert result.status_code == 201
+        assert result.json[0]['state'] == sync.State.Acknowledged
+        assert 'error' in result.json[1]
+        assert result.json[2]['record_id'] == result.json[0]['record_id']
+
+        message_ids = []
+        for _ in range(2):
+            result = self.client.simulate_post('/messages/next',
+                                               headers=self.node_2_headers)
+            assert result.status_code == 200
+            message_ids.append(result.json['id'])
+
+        # PATCH 400 with an empty batch.
+        url = '/messages/batch'
+        result = self.client.simulate_patch(url, body=json.dumps([]),
+                                            headers=self.node_2_headers)
+        assert result.status_code == 400
+
+        # PATCH 200, each message's result is reported.
+        body = [
+            {'id': message_ids[0], 'success': True, 'remote_id': 'a'},
+            {'id': message_ids[1], 'success': False, 'reason': 'reason'},
+            {'id': message_ids[0], 'success': True},
+            {'id': 'invalid', 'success': True}
+        ]
+        result = self.client.simulate_patch(url, body=json.dumps(body),
+                                            headers=self.node_2_headers)
+        assert result.status_code == 200
+        assert result.json[0] == {'id': message_ids[0],
+                                  'state': sync.State.Acknowledged}
+        assert result.json[1] == {'id': message_ids[1],
+                                  'state': sync.State.Failed}
+        assert 'error' in result.json[2]
+        assert 'error' in result.json[3]
+
     def test_http_send_with_remote_ids(self, request):
         self.setup_network()
         self.setup_nodes()
@@ -403,6 +467,7 @@ class TestHttp():
 
         # Node 1: Update the record using the remote id.
         body['method'] = 'update'
+        body['payload']['lastName'] = 'updated'
         body_json = json.dumps(body)
         result = self.client.simulate_post(url, body=body_json,
                                            headers=self.node_1_headers)
@@ -462,6 +527,236 @@ class TestHttp():
         assert result.status_code == 200
         assert result.json['remote_id'] == 'abcd'
 
+    def test_http_admin_metrics(self, request):
+        self.setup_network()
+        self.setup_nodes()
+        body = json.dumps({
+            'method': 'create',
+            'payload': {
+                'firstName': 'Jim',
+                'lastName': 'Smith'
+            }
+        })
+        result = self.client.simulate_post('/messages', body=body,
+                                           headers=self.node_1_headers)
+        assert result.status_code == 201
+        # Resources of the same name are labelled apart.
+        self.client.simulate_get('/records', headers=self.node_1_headers)
+        self.client.simulate_get(
+            '/admin/networks/{0}/records'.format(self.network_id))
+
+        result = self.client.simulate_get(
+            '/admin/metrics', query_string='network_id=foo')
+        assert result.status_code == 200
+        assert result.headers['content-type'].startswith('text/plain')
+        text = result.text
+        node_1 = 'network="{0}",node="{1}"'.format(self.network_id,
+                                                    self.node_1['id'])
+        node_2 = 'network="{0}",node="{1}"'.format(self.network_id,
+                                                    self.node_2['id'])
+        assert 'sync_messages_total{' + node_1 + ',event="sent"} 1' in text
+        assert 'sync_pending_messages{' + node_2 + '} 1' in text
+        assert 'sync_oldest_pending_message_age_seconds{' + node_2 in text
+        assert 'sync_http_request_duration_seconds_count{method="POST",' \
+            'route="messaging.MessageList",status="201"}' in text
+        assert 'route="messaging.RecordList"' in text
+        assert 'route="admin.RecordList"' in text
+
+    def test_http_admin_lag(self, request):
+        self.setup_network()
+        self.setup_nodes()
+        body = json.dumps({
+            'method': 'create',
+            'payload': {
+                'firstName': 'Jim',
+                'lastName': 'Smith'
+            }
+        })
+        result = self.client.simulate_post('/messages', body=body,
+                                           headers=self.node_1_headers)
+        assert result.status_code == 201
+        result = self.client.simulate_post('/messages/next',
+                                           headers=self.node_2_headers)
+        body = json.dumps({'success': True})
+        url = '/messages/{0}'.format(result.json['id'])
+        result = self.client.simulate_patch(url, body=body,
+                                            headers=self.node_2_headers)
+        assert result.status_code == 200
+
+        url = '/admin/networks/{0}/lag'.format(self.network_id)
+        result = self.client.simulate_get(url, query_string='window=60')
+        assert result.status_code == 200
+        assert result.json['window'] == 60
+        lag = result.json['destinations'][self.node_2['id']]
+        assert lag['count'] == 1
+        assert lag['total']['p99'] >= lag['fetch']['p50']
+
+    def test_http_admin_retention(self, request):
+        self.setup_network()
+        url = '/admin/networks/{0}/retention'.format(self.network_id)
+        result = self.client.simulate_post(url, query_string='age=60')
+        assert result.status_code == 202
+        assert result.json['purge'] is False
+        assert result.json['before'] < \
+            datetime.datetime.utcnow().isoformat()
+
+        result = self.client.simulate_post(url, query_string='age=0')
+        assert result.status_code == 400
+
+    def test_http_records(self, request):
+        self.setup_network()
+        self.setup_nodes()
+        url = '/admin/networks/{0}'.format(self.network_id)
+        result = self.client.simulate_patch(
+            url, body=json.dumps({'indexes': ['lastName', 'age']}))
+        assert result.json['indexes'] == ['lastName', 'age']
+        for i in range(3):
+            body = {
+                'method': 'create',
+                'payload': {'firstName': 'a', 'lastName': 'b', 'age': i}
+            }
+            self.client.simulate_post('/messages', body=json.dumps(body),
+                                      headers=self.node_1_headers)
+
+        result = self.client.simulate_get(
+            '/records', query_string='lastName=b&age.gte=1&limit=1',
+            headers=self.node_2_headers)
+        assert result.status_code == 200
+        assert [r['head']['age'] for r in result.json['records']] == [1] or \
+            [r['head']['age'] for r in result.json['records']] == [2]
+        cursor = result.json['cursor']
+        assert cursor is not None
+
+        result = self.client.simulate_get(
+            url + '/records', query_string='lastName=b&age.gte=1&cursor=' +
+            str(cursor))
+        assert len(result.json['records']) == 1
+        assert result.json['cursor'] is None
+
+        result = self.client.simulate_get(
+            '/records', query_string='firstName=a',
+            headers=self.node_2_headers)
+        assert result.status_code == 400
+        result = self.client.simulate_get(
+            '/records', query_string='age.in=1',
+            headers=self.node_2_headers)
+        assert result.status_code == 400
+
+    def test_http_records_import(self, request):
+        self.setup_network()
+        self.setup_nodes()
+        headers = dict(self.node_1_headers, **{'Content-Type': 'text/csv'})
+        extract = ('remote_id,firstName,lastName,age\n'
+                   'a,Jo,Smith,30\n'
+                   'b,Al,Jones,\n')
+        result = self.client.simulate_post('/records/import', body=extract,
+                                           headers=headers)
+        assert result.status_code == 200
+        assert result.json['created'] == 2
+
+        headers['Content-Type'] = 'application/x-ndjson'
+        extract = '{"remote_id": "a", "firstName": "Jo", "lastName": "Ng"}\n'
+        result = self.client.simulate_post('/records/import', body=extract,
+                                           headers=headers,
+                                           query_string='delete=false')
+        assert result.json == {'created': 0, 'updated': 1, 'deleted': 0,
+                               'unchanged': 0, 'invalid': 0, 'failed': 0}
+        result = self.client.simulate_post('/records/import', body=extract,
+                                           headers=headers)
+        assert result.json['unchanged'] == 1
+        assert result.json['deleted'] == 1
+
+        headers['Content-Type'] = 'application/json'
+        result = self.client.simulate_post('/records/import', body=extract,
+                                           headers=headers)
+        assert result.status_code == 415
+
+    def test_http_network_export(self, request):
+        self.setup_network()
+        self.setup_nodes()
+        body = {
+            'method': 'create',
+            'payload': {'firstName': 'a', 'lastName': 'b'},
+            'remote_id': 'x'
+        }
+        self.client.simulate_post('/messages', body=json.dumps(body),
+                                  headers=self.node_1_headers)
+
+        url = '/admin/networks/{0}/export'.format(self.network_id)
+        result = self.client.simulate_get(url, query_string='nodes=true')
+        assert result.status_code == 200
+        assert result.headers['content-type'] == 'application/x-ndjson'
+        lines = [json.loads(line) for line in result.text.splitlines()]
+        assert 'schema' not in lines[0]['network']
+        assert [n['node']['name'] for n in lines[1:3]] == \
+            ['node 1', 'node 2'] or \
+            [n['node']['name'] for n in lines[1:3]] == ['node 2', 'node 1']
+        assert lines[3]['record']['head'] == body['payload']
+        assert lines[3]['remotes'][0]['remote_id'] == 'x'
+
+        result = self.client.simulate_get(url, query_string='schema=true')
+        lines = result.text.splitlines()
+        assert len(lines) == 2
+        assert json.loads(lines[0])['network']['schema']['title'] == \
+            'Example Schema'
+
+    def test_http_compression(self, request):
+        self.setup_network()
+        self.setup_nodes()
+
+        # POST 201 with a gzip encoded body.
+        url = '/messages'
+        body = {
+            'method': 'create',
+            'payload': {
+                'firstName': 'test' * 500,
+                'lastName': 'test'
+            }
+        }
+        body_gzip = compression.compress(json.dumps(body).encode('utf-8'))
+        headers = dict(self.node_1_headers)
+        headers['Content-Encoding'] = 'gzip'
+        result = self.client.simulate_post(url, body=body_gzip,
+                                           headers=headers)
+        assert result.status_code == 201
+
+        # POST 400 with a body that is not gzip encoded.
+        result = self.client.simulate_post(url, body=json.dumps(body),
+                                           headers=headers)
+        assert result.status_code == 400
+
+        # POST 415 with an unknown encoding.
+        headers['Content-Encoding'] = 'br'
+        result = self.client.simulate_post(url, body=json.dumps(body),
+                                           headers=headers)
+        assert result.status_code == 415
+
+        # POST 413 with a body that decompresses to more than the
+        # maximum request size.
+        headers['Content-Encoding'] = 'gzip'
+        size = settings.COMPRESSION_MAXIMUM_REQUEST_SIZE + 1
+        result = self.client.simulate_post(
+            url, body=compression.compress(b'0' * size), headers=headers)
+        assert result.status_code == 413
+
+        # POST 200 with a gzip encoded response.
+        url = '/messages/next'
+        headers = dict(self.node_2_headers)
+        headers['Accept-Encoding'] = 'gzip'
+        result = self.client.simulate_post(url, headers=headers)
+        assert result.status_code == 200
+        assert result.headers['content-encoding'] == 'gzip'
+        data = compression.decompress(result.content)
+        message = json.loads(data.decode('utf-8'))
+        assert message['payload'] == body['payload']
+
+        # GET 200 small responses are not compressed.
+        url = '/messages/pending'
+        result = self.client.simulate_get(url, headers=headers)
+        assert result.status_code == 200
+        assert 'content-encoding' not in result.headers
+        assert result.json == 0
+
 
 def test_utils_json_serial():
     node = sync.Node()
@@ -3,8 +3,11 @@ import falcon
 import json
 import jsonschema
 
+from six.moves.urllib.parse import parse_qsl
+
 import sync
 
+from sync import schema
 from sync.exceptions import InvalidJsonError
 
 
@@ -12,7 +15,7 @@ class PostData(object):
     pass
 
 
-def inflate(json_data, obj, schema):
+def load(json_data, schema):
     if isinstance(json_data, (bytes, bytearray)):
         json_data = json_data.decode("utf-8")
     try:
@@ -24,6 +27,11 @@ def inflate(json_data, obj, schema):
         except:
             raise InvalidJsonError(ex)
     jsonschema.validators.Draft4Validator(schema).validate(data)
+    return data
+
+
+def inflate(json_data, obj, schema):
+    data = load(json_data, schema)
     for key in data.keys():
         setattr(obj, key, data[key])
     return obj
@@ -47,3 +55,35 @@ def json_serial(obj):
 def obj_or_404(obj):
     if obj is None:
         raise falcon.HTTPNotFound()
+
+
+def find_records(req):
+    """Find records by the head fields filtered in a request's query
+    string, for example ?reference=abc&age.gte=18.
+
+    Parameters other than limit and cursor filter a field, field=value
+    for equality and field.<operator>=value to compare. Values are JSON
+    if they parse as JSON, otherwise strings.
+
+    """
+    limit = req.get_param_as_int('limit', min=1, max=1000) or 100
+    filter_ = {}
+    for name, value in parse_qsl(req.query_string):
+        if name in ('limit', 'cursor'):
+            continue
+        field, _, operator = name.partition('.')
+        try:
+            value = json.loads(value)
+        except ValueError:
+            pass
+        filter_.setdefault(field, {})[operator or sync.Operator.Equal] = \
+            value
+    records, cursor = sync.Record.find(filter_, limit,
+                                       req.get_param('cursor'))
+    result = {
+        'records': [r.as_dict(with_id=True) for r in records],
+        'cursor': cursor
+    }
+    jsonschema.validators.Draft4Validator(
+        schema.records_get).validate(result)
+    return result
@@ -0,0 +1,216 @@
+"""Time the stages of message processing and storage calls.
+
+Hooks are callables taking a stage name and a duration in seconds:
+
+    def hook(stage, duration):
+        ...
+
+    instrument.add_hook(hook)
+
+Stage names are listed in sync.constants.Stage. Each public storage
+method is timed as storage.<method name>, for generators each batch
+fetched is timed separately.
+
+When no hooks are registered a timed function only checks the hook
+list before calling through, so instrumentation costs next to nothing
+when it is not in use. The in-memory aggregator is registered when
+settings.INSTRUMENTATION is true.
+
+"""
+import bisect
+import functools
+import inspect
+import threading
+import time
+
+import six
+
+from sync import logs, settings
+
+
+# Setup a module level logger.
+logger = logs.get_logger(__name__)
+
+
+# Registered hooks, checked before timing anything.
+hooks = []
+
+
+# The most precise clock available.
+clock = getattr(time, 'perf_counter', time.time)
+
+
+#: Upper bounds in seconds of the aggregator's histogram buckets. A
+#: final bucket holds everything slower.
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25,
+           0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def add_hook(hook):
+    """Call a hook with the duration of every stage.
+
+    :param hook: Called with the stage name and duration in seconds.
+    :type hook: function
+
+    """
+    if hook not in hooks:
+        hooks.append(hook)
+
+
+def remove_hook(hook):
+    """Stop calling a hook.
+
+    :param hook: A hook previously passed to add_hook.
+    :type hook: function
+
+    """
+    if hook in hooks:
+        hooks.remove(hook)
+
+
+def emit(stage, duration):
+    """Pass the duration of a stage to every hook.
+
+    A failing hook is logged rather than interrupting the stage.
+
+    :param stage: The stage name.
+    :type stage: str
+    :param duration: Seconds taken.
+    :type duration: float
+
+    """
+    for hook in list(hooks):
+        try:
+            hook(stage, duration)
+        except Exception:
+            logger.error('Instrumentation hook failed', exc_info=True)
+
+
+class _Timer(object):
+
+    def __init__(self, stage):
+        self.stage = stage
+        self.start = None
+
+    def __enter__(self):
+        if hooks:
+            self.start = clock()
+        return self
+
+    def __exit__(self, *args):
+        if self.start is not None:
+            emit(self.stage, clock() - self.start)
+
+
+def timer(stage):
+    """Time a block of code.
+
+        with instrument.timer('my.stage'):
+            ...
+
+    :param stage: The stage name.
+    :type stage: str
+
+    """
+    return _Timer(stage)
+
+
+def timed(stage):
+    """Decorate a function to time each call as a stage.
+
+    :param stage: The stage name.
+    :type stage: str
+
+    """
+    def decorator(fun):
+        if inspect.isgeneratorfunction(fun):
+            @functools.wraps(fun)
+            def generator_wrapper(*args, **kwargs):
+                iterator = fun(*args, **kwargs)
+                while True:
+                    with timer(stage):
+                        try:
+                            value = next(iterator)
+                        except StopIteration:
+                            return
+                    yield value
+            return generator_wrapper
+
+        @functools.wraps(fun)
+        def wrapper(*args, **kwargs):
+            if not hooks:
+                return fun(*args, **kwargs)
+            start = clock()
+            try:
+                return fun(*args, **kwargs)
+            finally:
+                emit(stage, clock() - start)
+        return wrapper
+    return decorator
+
+
+class Aggregator(object):
+    """Count and build a histogram of the durations of each stage.
+
+    Register with add_hook. Safe to use from several threads.
+
+    """
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._stages = {}
+
+    def __call__(self, stage, duration):
+        index = bisect.bisect_left(self.buckets, duration)
+        with self._lock:
+            entry = self._stages.get(stage)
+            if entry is None:
+                entry = self._stages[stage] = {
+                    'count': 0,
+                    'total': 0.0,
+                    'counts': [0] * (len(self.buckets) + 1)
+                }
+            entry['count'] += 1
+            entry['total'] += duration
+            entry['counts'][index] += 1
+
+    def reset(self):
+        """Discard everything recorded so far."""
+        with self._lock:
+            self._stages = {}
+
+    def snapshot(self):
+        """The counts and histograms of every stage seen.
+
+        :returns: For each stage a dict holding the count, total seconds
+            and buckets, a list of (upper bound, cumulative count) pairs
+            ending with an upper bound of None.
+        :rtype: dict
+
+        """
+        with self._lock:
+            stages = dict((k, (v['count'], v['total'], list(v['counts'])))
+                          for k, v in six.iteritems(self._stages))
+
+        result = {}
+        for stage, (count, total, counts) in six.iteritems(stages):
+            buckets = []
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (None,), counts):
+                cumulative += bucket_count
+                buckets.append((bound, cumulative))
+            result[stage] = {
+                'count': count,
+                'total': total,
+                'buckets': buckets
+            }
+        return result
+
+
+#: aggregator (sync.instrument.Aggregator): The built-in aggregator,
+#: registered when settings.INSTRUMENTATION is true.
+aggregator = Aggregator()
+
+if settings.INSTRUMENTATION:
+    add_hook(aggregator)
@@ -0,0 +1,357 @@
+"""Generate load against the HTTP API with simulated nodes.
+
+A network and a number of nodes are created through the admin routes.
+Each node then runs on its own thread for a fixed duration. It picks
+operations at random from a weighted mix:
+
+create
+    POST /messages with a new record, identified by a remote_id.
+update
+    POST /messages updating one of the node's own records.
+next
+    POST /messages/next and, if a message was fetched, PATCH
+    /messages/{id} to acknowledge it.
+
+The report gives the throughput, latency percentiles and error rate of
+each route. It also gives the propagation lag: the time from a node's
+message being sent until another node fetches it.
+
+By default the in-process sync.http.server.api is used, with whichever
+storage backend STORAGE_CLASS selects. Give --url to target a running
+server, such as a local gunicorn:
+
+    gunicorn sync.http.server:api
+    python -m sync.loadgen --url http://127.0.0.1:8000/ --nodes 8 \\
+        --duration 30 --mix create=2,update=1,next=3 --rate 20
+
+"""
+import argparse
+import copy
+import json
+import random
+import sys
+import threading
+import time
+
+import six
+
+from sync import benchmark, logs, Method
+from sync.client import Client
+from sync.client.wsgi import WSGIAdapter
+
+
+DEFAULT_URL = 'http://sync.test/'
+
+DEFAULT_MIX = {
+    'create': 3,
+    'update': 2,
+    'next': 5
+}
+
+# Without a payload file, generated payloads of about this many bytes
+# are sent.
+DEFAULT_PAYLOAD_COUNT = 100
+DEFAULT_PAYLOAD_SIZE = 256
+
+
+class Route(object):
+    """Names used to report each route."""
+
+    Send = 'POST /messages'
+    Next = 'POST /messages/next'
+    Acknowledge = 'PATCH /messages/{message_id}'
+
+    All = [Send, Next, Acknowledge]
+
+
+def load_payloads(path):
+    """Load sample record payloads from a JSON file holding a list of
+    objects.
+
+    """
+    with open(path) as payload_file:
+        return json.load(payload_file)
+
+
+def scale_payload(payload, scale):
+    """Grow a payload by repeating every string value scale times, which
+    keeps its shape and so its validity against a schema.
+
+    """
+    if scale == 1:
+        return payload
+    if isinstance(payload, dict):
+        return dict((k, scale_payload(v, scale))
+                    for k, v in six.iteritems(payload))
+    if isinstance(payload, list):
+        return [scale_payload(v, scale) for v in payload]
+    if isinstance(payload, six.string_types):
+        return payload * scale
+    return payload
+
+
+class Stats(object):
+    """Thread safe collection of request durations and errors."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.durations = dict((route, []) for route in Route.All)
+        self.errors = dict((route, 0) for route in Route.All)
+        self.lag = []
+        self.sent = {}
+
+    def request(self, route, fun, *args):
+        start = time.time()
+        try:
+            return fun(*args)
+        except Exception:
+            with self.lock:
+                self.errors[route] += 1
+            return None
+        finally:
+            with self.lock:
+                self.durations[route].append(time.time() - start)
+
+    def message_sent(self, message_id):
+        with self.lock:
+            self.sent[message_id] = time.time()
+
+    def message_fetched(self, parent_id):
+        now = time.time()
+        with self.lock:
+            sent = self.sent.get(parent_id)
+            if sent is not None:
+                self.lag.append(now - sent)
+
+
+class SimulatedNode(object):
+    """Sends, fetches and acknowledges messages as one node."""
+
+    def __init__(self, client, stats, mix, payloads, rate=None):
+        self.client = client
+        self.stats = stats
+        self.operations = []
+        self.weights = []
+        for name, weight in sorted(mix.items()):
+            self.operations.append(getattr(self, name))
+            self.weights.append(weight)
+        self.payloads = payloads
+        self.rate = rate
+        self.remote_ids = []
+        self.random = random.Random()
+
+    def _choose(self):
+        value = self.random.uniform(0, sum(self.weights))
+        for operation, weight in zip(self.operations, self.weights):
+            value -= weight
+            if value <= 0:
+                return operation
+        return self.operations[-1]
+
+    def _send(self, method, payload, remote_id):
+        message = self.stats.request(Route.Send, self.client.send, method,
+                                     payload, None, remote_id)
+        if message is not None:
+            self.stats.message_sent(message.id)
+        return message
+
+    def create(self):
+        remote_id = '{0}-{1}'.format(self.client.node_id,
+                                     len(self.remote_ids))
+        payload = self.random.choice(self.payloads)
+        if self._send(Method.Create, payload, remote_id) is not None:
+            self.remote_ids.append(remote_id)
+
+    def update(self):
+        if not self.remote_ids:
+            return self.create()
+        remote_id = self.random.choice(self.remote_ids)
+        payload = self.random.choice(self.payloads)
+        self._send(Method.Update, payload, remote_id)
+
+    def next(self):
+        message = self.stats.request(Route.Next, self.client.fetch)
+        if message is None:
+            return
+        self.stats.message_fetched(message.parent_id)
+        self.stats.request(Route.Acknowledge, self.client.acknowledge,
+                           message.id)
+
+    def run(self, deadline):
+        interval = 1.0 / self.rate if self.rate else 0
+        next_start = time.time()
+        while time.time() < deadline:
+            if interval:
+                delay = next_start - time.time()
+                if delay > 0:
+                    time.sleep(delay)
+                next_start += interval
+            self._choose()()
+
+
+def create_client(base_url, app=None, network_id=None, node_id=None):
+    client = Client(base_url, network_id, node_id)
+    if app is not None:
+        client.session.mount(base_url, WSGIAdapter(app))
+    return client
+
+
+def run(base_url=DEFAULT_URL, app=None, nodes=4, duration=10.0, mix=None,
+        rate=None, payloads=None, payload_scale=1, schema=None,
+        fetch_before_send=False):
+    """Create a network and drive traffic through it.
+
+    :param base_url: The server's URL.
+    :type base_url: str
+    :param app: A WSGI application to call in process instead of making
+        network requests, such as sync.http.server.api.
+    :type app: function
+    :param nodes: Number of simulated nodes.
+    :type nodes: int
+    :param duration: Seconds to generate load for.
+    :type duration: float
+    :param mix: Relative weights of the create, update and next
+        operations.
+    :type mix: dict
+    :param rate: Operations per second for each node, None for as fast
+        as possible.
+    :type rate: float
+    :param payloads: Sample record payloads, defaults to
+        DEFAULT_PAYLOAD_COUNT generated payloads.
+    :type payloads: list
+    :param payload_scale: Multiplies the size of each payload.
+    :type payload_scale: int
+    :param schema: JSON schema for the network's records.
+    :type schema: dict
+    :param fetch_before_send: Network setting, nodes must fetch pending
+        messages before sending.
+    :type fetch_before_send: bool
+    :returns: The parameters and results.
+    :rtype: dict
+
+    """
+    if mix is None:
+        mix = DEFAULT_MIX
+    if payloads is None:
+        payloads = [benchmark.make_payload(i, DEFAULT_PAYLOAD_SIZE)
+                    for i in range(DEFAULT_PAYLOAD_COUNT)]
+    payloads = [scale_payload(p, payload_scale) for p in payloads]
+
+    admin = create_client(base_url, app)
+    network = admin.create_network('loadgen', schema or {},
+                                   fetch_before_send)
+    simulated = []
+    stats = Stats()
+    for i in range(nodes):
+        node = admin.create_node(network.id, 'node {0}'.format(i))
+        client = create_client(base_url, app, network.id, node.id)
+        simulated.append(SimulatedNode(client, stats, mix,
+                                       copy.deepcopy(payloads), rate))
+
+    start = time.time()
+    deadline = start + duration
+    threads = [threading.Thread(target=n.run, args=(deadline,))
+               for n in simulated]
+    for thread in threads:
+        thread.daemon = True
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.time() - start
+
+    routes = {}
+    for route in Route.All:
+        durations = stats.durations[route]
+        summary = benchmark.summarise(durations)
+        summary['throughput'] = round(len(durations) / elapsed, 3)
+        summary['errors'] = stats.errors[route]
+        summary['error_rate'] = \
+            round(float(stats.errors[route]) / len(durations), 4) \
+            if durations else 0.0
+        routes[route] = summary
+
+    return {
+        'parameters': {
+            'base_url': base_url,
+            'in_process': app is not None,
+            'nodes': nodes,
+            'duration': duration,
+            'mix': mix,
+            'rate': rate,
+            'payload_scale': payload_scale,
+            'fetch_before_send': fetch_before_send
+        },
+        'network_id': network.id,
+        'elapsed': round(elapsed, 3),
+        'routes': routes,
+        'propagation_lag': benchmark.summarise(stats.lag)
+    }
+
+
+def parse_mix(value):
+    """Parse a mix such as create=3,update=2,next=5."""
+    mix = {}
+    for item in value.split(','):
+        name, _, weight = item.partition('=')
+        name = name.strip()
+        if name not in DEFAULT_MIX:
+            raise argparse.ArgumentTypeError(
+                'Unknown operation: {0}'.format(name))
+        mix[name] = float(weight)
+    return mix
+
+
+def main(argv=None):
+    logs.configure()
+    parser = argparse.ArgumentParser(
+        description='Generate load against the sync HTTP API.')
+    parser.add_argument('--url', help='Server URL, defaults to calling '
+                        'sync.http.server.api in process.')
+    parser.add_argument('--nodes', type=int, default=4)
+    parser.add_argument('--duration', type=float, default=10.0)
+    parser.add_argument('--mix', type=parse_mix,
+                        help='Operation weights, e.g. '
+                        'create=3,update=2,next=5.')
+    parser.add_argument('--rate', type=float,
+                        help='Operations per second per node.')
+    parser.add_argument('--payload-file',
+                        help='JSON file with a list of sample payloads, '
+                        'defaults to generated payloads.')
+    parser.add_argument('--payload-scale', type=int, default=1)
+    parser.add_argument('--schema-file',
+                        help='JSON schema for the network\'s records.')
+    parser.add_argument('--fetch-before-send', action='store_true')
+    parser.add_argument('--output', help='File to write JSON results to, '
+                        'defaults to stdout.')
+    args = parser.parse_args(argv)
+
+    app = None
+    base_url = args.url
+    if base_url is None:
+        from sync.http import server
+        app = server.api
+        base_url = DEFAULT_URL
+
+    schema = None
+    if args.schema_file:
+        with open(args.schema_file) as schema_file:
+            schema = json.load(schema_file)
+
+    payloads = None
+    if args.payload_file:
+        payloads = load_payloads(args.payload_file)
+
+    results = run(base_url, app, args.nodes, args.duration, args.mix,
+                  args.rate, payloads,
+                  args.payload_scale, schema, args.fetch_before_send)
+
+    output = json.dumps(results, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output)
+    else:
+        sys.stdout.write(output + '\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,31 +1,278 @@
+"""Logging configuration.
+
+Logging is configured by calling configure, which the HTTP server,
+tasks and command line tools do, rather than on import.
+
+Records are written by a background thread, fed through a bounded
+queue, so a burst of errors doesn't stall request threads on writes to
+stdout. While the queue is full records are dropped rather than
+waiting. The handler and listener are written here, rather than taken
+from logging.handlers, as Python 2 has neither.
+
+Before a record is queued it may be dropped by:
+
+RateLimitFilter
+    Repeats of the same message, from the same logger at the same
+    level, beyond settings.LOG_RATE_LIMIT in each
+    settings.LOG_RATE_LIMIT_INTERVAL. The next record written carries a
+    count of those dropped.
+SampleFilter
+    A fraction of the records below ERROR from the loggers in
+    settings.LOG_SAMPLE.
+
+"""
+import atexit
+import datetime
+import json
 import logging
-import logging.config
-
-logging.config.dictConfig({
-    'version': 1,
-    'disable_existing_loggers': False,
-    'formatters': {
-        'standard': {
-            'format': '[%(asctime)s] [%(process)s] [%(levelname)s] %(name)s: %(message)s',  # noqa
-            'datefmt': '%Y-%m-%d %H:%M:%S %z'
-        },
-    },
-    'handlers': {
-        "console": {
-            "class": "logging.StreamHandler",
-            "level": "INFO",
-            "formatter": "standard",
-            "stream": "ext://sys.stdout"
-        },
-    },
-    'loggers': {
-        '': {
-            'handlers': ['console'],
-            'level': 'INFO',
-            'propagate': True
+import os
+import random
+import sys
+import threading
+import time
+
+from six.moves import queue
+
+from sync import settings
+
+
+FORMAT = '[%(asctime)s] [%(process)s] [%(levelname)s] %(name)s: %(message)s'  # noqa
+DATE_FORMAT = '%Y-%m-%d %H:%M:%S %z'
+
+
+# The process configure last ran in, forked processes configure again.
+_configured = None
+
+# The handler added to the root logger and the listener draining its
+# queue, if any.
+_handler = None
+_listener = None
+
+
+class RateLimitFilter(logging.Filter):
+    """Drop repeats of a message beyond a limit in each interval.
+
+    :param limit: Records of the same message allowed in an interval.
+    :type limit: int
+    :param interval: Length of an interval in seconds.
+    :type interval: float
+
+    """
+
+    def __init__(self, limit, interval):
+        logging.Filter.__init__(self)
+        self.limit = limit
+        self.interval = interval
+        self.clock = time.time
+        self._lock = threading.Lock()
+        self._windows = {}
+
+    def filter(self, record):
+        key = (record.name, record.levelno, repr(record.msg))
+        now = self.clock()
+        with self._lock:
+            start, count, suppressed = self._windows.get(key, (now, 0, 0))
+            if now - start >= self.interval:
+                start, count = now, 0
+            if count >= self.limit:
+                self._windows[key] = (start, count, suppressed + 1)
+                return False
+            self._windows[key] = (start, count + 1, 0)
+        if suppressed:
+            record.suppressed = suppressed
+        return True
+
+
+class SampleFilter(logging.Filter):
+    """Keep a fraction of the records below ERROR from some loggers.
+
+    :param rates: For each logger name, the fraction of its records and
+        its children's records kept.
+    :type rates: dict
+
+    """
+
+    def __init__(self, rates):
+        logging.Filter.__init__(self)
+        self.rates = rates
+
+    def rate(self, name):
+        while name:
+            if name in self.rates:
+                return self.rates[name]
+            name = name.rpartition('.')[0]
+        return 1.0
+
+    def filter(self, record):
+        if record.levelno >= logging.ERROR:
+            return True
+        rate = self.rate(record.name)
+        return rate >= 1 or random.random() < rate
+
+
+class TextFormatter(logging.Formatter):
+    """A line per record, noting repeats dropped by RateLimitFilter."""
+
+    def format(self, record):
+        suppressed = getattr(record, 'suppressed', 0)
+        if suppressed:
+            record = logging.makeLogRecord(record.__dict__)
+            record.msg = '%s (%d repeats suppressed)' % (
+                record.getMessage(), suppressed)
+            record.args = None
+        return logging.Formatter.format(self, record)
+
+
+class JSONFormatter(logging.Formatter):
+    """A JSON object per record."""
+
+    def format(self, record):
+        entry = {
+            'timestamp': datetime.datetime.utcfromtimestamp(
+                record.created).isoformat() + 'Z',
+            'level': record.levelname,
+            'logger': record.name,
+            'process': record.process,
+            'thread': record.threadName,
+            'message': record.getMessage()
         }
-    }
-})
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exception'] = record.exc_text
+        suppressed = getattr(record, 'suppressed', 0)
+        if suppressed:
+            entry['suppressed'] = suppressed
+        return json.dumps(entry, sort_keys=True, default=str)
+
+
+class QueueHandler(logging.Handler):
+    """Put records on a queue without waiting, dropping them while the
+    queue is full.
+
+    :param records: The queue a QueueListener drains.
+    :type records: queue.Queue
+
+    """
+
+    def __init__(self, records):
+        logging.Handler.__init__(self)
+        self.queue = records
+
+    def prepare(self, record):
+        # Render the message and traceback in the calling thread, the
+        # arguments may change before the listener formats them.
+        record = logging.makeLogRecord(record.__dict__)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(
+                record.exc_info)
+            record.exc_info = None
+        return record
+
+    def emit(self, record):
+        try:
+            self.queue.put_nowait(self.prepare(record))
+        except queue.Full:
+            pass
+        except Exception:
+            self.handleError(record)
+
+
+class QueueListener(object):
+    """Pass the records on a queue to handlers from a daemon thread.
+
+    :param records: The queue QueueHandler puts records on.
+    :type records: queue.Queue
+    :param handlers: The handlers writing the records.
+    :type handlers: logging.Handler
+
+    """
+
+    # Put on the queue to stop the thread, once the records before it
+    # are written.
+    _stop = None
+
+    def __init__(self, records, *handlers):
+        self.queue = records
+        self.handlers = handlers
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run,
+                                        name='sync.logs')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            record = self.queue.get()
+            if record is self._stop:
+                return
+            for handler in self.handlers:
+                if record.levelno >= handler.level:
+                    handler.handle(record)
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self.queue.put(self._stop)
+        self._thread.join()
+        self._thread = None
+
+
+def configure():
+    """Configure logging to the console, once per process, using
+    settings.LOG_LEVEL, LOG_FORMAT, LOG_QUEUE_SIZE, LOG_RATE_LIMIT,
+    LOG_RATE_LIMIT_INTERVAL and LOG_SAMPLE.
+
+    """
+    global _configured, _handler, _listener
+    if _configured == os.getpid():
+        return
+    # The listener thread of a parent process isn't running after a
+    # fork, replace the handler feeding it.
+    shutdown()
+    _configured = os.getpid()
+
+    if settings.LOG_FORMAT == 'json':
+        formatter = JSONFormatter()
+    else:
+        formatter = TextFormatter(FORMAT, DATE_FORMAT)
+    console = logging.StreamHandler(sys.stdout)
+    console.setFormatter(formatter)
+
+    if settings.LOG_QUEUE_SIZE > 0:
+        records = queue.Queue(settings.LOG_QUEUE_SIZE)
+        _handler = QueueHandler(records)
+        _listener = QueueListener(records, console)
+        _listener.start()
+        atexit.register(shutdown)
+    else:
+        _handler = console
+
+    if settings.LOG_RATE_LIMIT > 0:
+        _handler.addFilter(RateLimitFilter(settings.LOG_RATE_LIMIT,
+                                           settings.LOG_RATE_LIMIT_INTERVAL))
+    if settings.LOG_SAMPLE:
+        _handler.addFilter(SampleFilter(settings.LOG_SAMPLE))
+
+    root = logging.getLogger()
+    root.addHandler(_handler)
+    root.setLevel(settings.LOG_LEVEL)
+
+
+def shutdown():
+    """Write any queued records and remove the handler configure added.
+
+    """
+    global _configured, _handler, _listener
+    if _listener is not None and _configured == os.getpid():
+        _listener.stop()
+    if _handler is not None:
+        logging.getLogger().removeHandler(_handler)
+    _configured = _handler = _listener = None
 
 
 def get_logger(name):
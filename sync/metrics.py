@@ -0,0 +1,246 @@
+"""Process wide metrics in the Prometheus text format.
+
+Served by GET /admin/metrics:
+
+sync_http_request_duration_seconds
+    Histogram of request latency by method, route and status, recorded
+    by sync.http.middleware.Metrics. The route is the resource's module
+    and class name, such as messaging.MessageList.
+sync_stage_duration_seconds
+    Histogram of each sync.instrument stage, when INSTRUMENTATION is
+    set.
+sync_messages_total
+    Messages sent, fetched, acknowledged and failed by each node.
+sync_pending_messages
+    Pending messages waiting for each node.
+sync_oldest_pending_message_age_seconds
+    Age of the oldest pending message waiting for each node.
+
+Counters are kept in memory by each process, so with several server
+processes each must be scraped.
+
+The pending message gauges are reported for the networks this process
+has counted messages for, see networks, and those named by network_id
+query parameters, e.g. /admin/metrics?network_id=a&network_id=b. Name
+every network to watch one that may be idle since the process started.
+
+"""
+import datetime
+import math
+import threading
+
+import six
+
+from sync import instrument
+
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+class Event(object):
+    """Message events counted for each node."""
+
+    Sent = 'sent'
+    Fetched = 'fetched'
+    Acknowledged = 'acknowledged'
+    Failed = 'failed'
+
+
+class Counter(object):
+    """Thread safe counts keyed by a tuple of label values."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def increment(self, labels, value=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + value
+
+    def reset(self):
+        with self._lock:
+            self._values = {}
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self._values)
+
+
+#: requests (sync.instrument.Aggregator): Request durations keyed by
+#: (method, route, status).
+requests = instrument.Aggregator()
+
+#: messages (sync.metrics.Counter): Message events keyed by
+#: (network_id, node_id, event).
+messages = Counter()
+
+
+def message_event(network_id, node_id, event):
+    """Count a message event for a node.
+
+    :param network_id: The network's id.
+    :type network_id: str
+    :param node_id: The node's id.
+    :type node_id: str
+    :param event: What happened to the message.
+    :type event: sync.metrics.Event
+
+    """
+    messages.increment((network_id, node_id, event))
+
+
+def networks():
+    """Ids of the networks this process has counted messages for.
+
+    Networks with no messages sent or fetched through this process since
+    it started aren't included.
+
+    """
+    return set(labels[0] for labels in messages.snapshot())
+
+
+def percentile(values, percent):
+    """Return the value below which a percentage of values fall, using
+    the nearest rank.
+
+    :param values: Sorted values.
+    :type values: list
+    :param percent: Between 0 and 100.
+    :type percent: float
+    :returns: The value or None if there are no values.
+    :rtype: float
+
+    """
+    if not values:
+        return None
+    rank = int(math.ceil(percent / 100.0 * len(values)))
+    return values[min(max(rank, 1), len(values)) - 1]
+
+
+def propagation_lag(latencies):
+    """Summarise propagation latencies by destination node.
+
+    :param latencies: Latency objects.
+    :type latencies: list
+    :returns: For each destination id, the count and the p50, p90, p99
+        and max in seconds of each interval.
+    :rtype: dict
+
+    """
+    by_destination = {}
+    for latency in latencies:
+        by_destination.setdefault(latency.destination_id, []).append(latency)
+
+    result = {}
+    for destination_id, items in six.iteritems(by_destination):
+        summary = {'count': len(items)}
+        for interval in ('fan_out', 'fetch', 'acknowledge', 'total'):
+            values = sorted(getattr(i, interval) for i in items)
+            summary[interval] = {
+                'p50': percentile(values, 50),
+                'p90': percentile(values, 90),
+                'p99': percentile(values, 99),
+                'max': values[-1]
+            }
+        result[destination_id] = summary
+    return result
+
+
+def _escape(value):
+    return six.text_type(value).replace('\\', '\\\\') \
+        .replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values):
+    if not names:
+        return ''
+    pairs = ['{0}="{1}"'.format(n, _escape(v))
+             for n, v in zip(names, values)]
+    return '{' + ','.join(pairs) + '}'
+
+
+def _number(value):
+    if isinstance(value, float):
+        return repr(value)
+    return str(value)
+
+
+def _header(lines, name, help_text, type_):
+    lines.append('# HELP {0} {1}'.format(name, help_text))
+    lines.append('# TYPE {0} {1}'.format(name, type_))
+
+
+def _histogram(lines, name, help_text, names, snapshot):
+    _header(lines, name, help_text, 'histogram')
+    for key in sorted(snapshot):
+        entry = snapshot[key]
+        for bound, count in entry['buckets']:
+            le = '+Inf' if bound is None else _number(bound)
+            lines.append('{0}_bucket{1} {2}'.format(
+                name, _labels(names + ('le',), key + (le,)), count))
+        labels = _labels(names, key)
+        lines.append('{0}_sum{1} {2}'.format(name, labels,
+                                             _number(entry['total'])))
+        lines.append('{0}_count{1} {2}'.format(name, labels,
+                                               entry['count']))
+
+
+def render(pending=None, now=None):
+    """Render every metric.
+
+    :param pending: For each network id, the result of the storage's
+        get_pending_summary.
+    :type pending: dict
+    :param now: The current UTC time, used to age pending messages.
+    :type now: datetime.datetime
+    :returns: The metrics in the Prometheus text format.
+    :rtype: str
+
+    """
+    if pending is None:
+        pending = {}
+    if now is None:
+        now = datetime.datetime.utcnow()
+
+    lines = []
+    _histogram(lines, 'sync_http_request_duration_seconds',
+               'HTTP request latency by route.',
+               ('method', 'route', 'status'), requests.snapshot())
+
+    stages = dict(((stage,), entry) for stage, entry in
+                  six.iteritems(instrument.aggregator.snapshot()))
+    _histogram(lines, 'sync_stage_duration_seconds',
+               'Duration of message processing stages and storage calls.',
+               ('stage',), stages)
+
+    _header(lines, 'sync_messages_total',
+            'Messages sent, fetched, acknowledged and failed by each node.',
+            'counter')
+    names = ('network', 'node', 'event')
+    counts = messages.snapshot()
+    for key in sorted(counts):
+        lines.append('sync_messages_total{0} {1}'.format(
+            _labels(names, key), counts[key]))
+
+    _header(lines, 'sync_pending_messages',
+            'Pending messages waiting for each node.', 'gauge')
+    names = ('network', 'node')
+    for network_id in sorted(pending):
+        summary = pending[network_id]
+        for node_id in sorted(summary):
+            lines.append('sync_pending_messages{0} {1}'.format(
+                _labels(names, (network_id, node_id)),
+                summary[node_id]['count']))
+
+    _header(lines, 'sync_oldest_pending_message_age_seconds',
+            'Age of the oldest pending message waiting for each node.',
+            'gauge')
+    for network_id in sorted(pending):
+        summary = pending[network_id]
+        for node_id in sorted(summary):
+            age = (now - summary[node_id]['oldest']).total_seconds()
+            lines.append('sync_oldest_pending_message_age_seconds{0} {1}'
+                         .format(_labels(names, (network_id, node_id)),
+                                 _number(max(age, 0.0))))
+
+    return '\n'.join(lines) + '\n'
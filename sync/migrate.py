@@ -0,0 +1,52 @@
+"""Bring the storage of existing networks up to date.
+
+Web and task processes assume a network's tables and indexes are
+current, they only create them for new networks. After deploying a
+version that adds columns or indexes, run once for each network:
+
+    python -m sync.migrate NETWORK_ID [NETWORK_ID ...]
+
+Running it again, or for several networks at once, is safe.
+
+"""
+import argparse
+
+import sync
+
+from sync import logs
+from sync.storage import init_storage
+
+
+# Setup a module level logger.
+logger = logs.get_logger(__name__)
+
+
+def migrate(network_id):
+    """Bring the storage of a network up to date.
+
+    :param network_id: The network's id.
+    :type network_id: str
+    :raises: sync.exceptions.DatabaseNotFoundError
+
+    """
+    init_storage(network_id)
+    try:
+        sync.current_storage().migrate()
+    finally:
+        sync.close()
+    logger.info('Migrated network %s', network_id)
+
+
+def main(argv=None):
+    logs.configure()
+    parser = argparse.ArgumentParser(
+        description='Bring the storage of sync networks up to date.')
+    parser.add_argument('network_ids', nargs='+', metavar='network_id')
+    args = parser.parse_args(argv)
+
+    for network_id in args.network_ids:
+        migrate(network_id)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,139 @@
+"""Profile requests and tasks with cProfile.
+
+Profiling is off unless settings.PROFILE_DIR is set. Then a fraction
+of requests and tasks, settings.PROFILE_SAMPLE_RATE, are profiled, as
+is any request sent with an X-Sync-Profile header.
+
+Each profile is written to PROFILE_DIR in pstats format, readable with
+python -m pstats, next to a .txt summary of the PROFILE_TOP functions
+by cumulative time.
+
+"""
+import contextlib
+import datetime
+import functools
+import itertools
+import os
+import random
+import re
+import threading
+
+import six
+
+from sync import logs, settings
+
+
+# Setup a module level logger.
+logger = logs.get_logger(__name__)
+
+
+# Only one profiler may run on a thread at a time.
+_local = threading.local()
+
+# Numbers the profiles a process writes, so file names stay unique
+# however close together profiles finish.
+_sequence = itertools.count(1)
+
+
+def should_profile(requested=False):
+    """Decide whether to profile a request or task.
+
+    :param requested: The caller asked for a profile.
+    :type requested: bool
+    :rtype: bool
+
+    """
+    if settings.PROFILE_DIR is None or getattr(_local, 'active', False):
+        return False
+    if requested:
+        return True
+    rate = settings.PROFILE_SAMPLE_RATE
+    return rate > 0 and random.random() < rate
+
+
+def start():
+    """Start profiling the current thread.
+
+    :returns: The running profiler.
+    :rtype: cProfile.Profile
+
+    """
+    import cProfile
+
+    _local.active = True
+    profiler = cProfile.Profile()
+    profiler.enable()
+    return profiler
+
+
+def stop(profiler, name):
+    """Stop a profiler returned by start and write its results.
+
+    :param profiler: The running profiler.
+    :type profiler: cProfile.Profile
+    :param name: Describes what was profiled, used in the file name.
+    :type name: str
+    :returns: The path of the pstats file.
+    :rtype: str
+
+    """
+    import pstats
+
+    profiler.disable()
+    _local.active = False
+
+    directory = settings.PROFILE_DIR
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    filename = '{0}-{1}-{2}-{3}'.format(
+        datetime.datetime.now().strftime('%Y%m%d%H%M%S%f'), os.getpid(),
+        next(_sequence), re.sub(r'[^A-Za-z0-9_.-]+', '_', name).strip('_'))
+    path = os.path.join(directory, filename + '.prof')
+    profiler.dump_stats(path)
+
+    stream = six.StringIO()
+    stats = pstats.Stats(path, stream=stream)
+    stats.sort_stats('cumulative').print_stats(settings.PROFILE_TOP)
+    with open(os.path.join(directory, filename + '.txt'), 'w') as summary:
+        summary.write(name + '\n')
+        summary.write(stream.getvalue())
+
+    logger.info('Profile of %s written to %s', name, path)
+    return path
+
+
+@contextlib.contextmanager
+def profile(name, requested=False):
+    """Profile a block if should_profile decides to.
+
+    :param name: Describes what is profiled.
+    :type name: str
+    :param requested: The caller asked for a profile.
+    :type requested: bool
+
+    """
+    if not should_profile(requested):
+        yield
+        return
+    profiler = start()
+    try:
+        yield
+    finally:
+        stop(profiler, name)
+
+
+def profiled(name):
+    """Decorate a function, such as a task, so sampled calls are
+    profiled.
+
+    :param name: Describes the function in profile file names.
+    :type name: str
+
+    """
+    def decorator(fun):
+        @functools.wraps(fun)
+        def wrapper(*args, **kwargs):
+            with profile(name):
+                return fun(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -169,6 +169,25 @@ json_schema = {
 #
 # Network schema
 
+# Top level head fields records can be found by. Only word characters
+# are allowed as each name is used in index definitions, as
+# sync.storage.base.INDEX_FIELD also requires.
+_indexes = {
+    "type": "array",
+    "items": {
+        "type": "string",
+        "pattern": "^[A-Za-z_][A-Za-z0-9_]{0,39}$"
+    },
+    "uniqueItems": True
+}
+
+# The format of the ids generated for new objects, the values of
+# sync.constants.IdFormat.
+_id_format = {
+    "type": "string",
+    "enum": ["uuid4", "uuid7"]
+}
+
 network_create = {
     "$schema": "http://json-schema.org/draft-04/schema#network_create",
     "type": "object",
@@ -179,6 +198,11 @@ network_create = {
         "fetch_before_send": {
             "type": "boolean"
         },
+        "coalesce": {
+            "type": "boolean"
+        },
+        "indexes": _indexes,
+        "id_format": _id_format,
         "schema": json_schema
     },
     "required": [
@@ -201,6 +225,11 @@ network_get = {
         "fetch_before_send": {
             "type": "boolean"
         },
+        "coalesce": {
+            "type": "boolean"
+        },
+        "indexes": _indexes,
+        "id_format": _id_format,
         "schema": json_schema
     },
     "required": [
@@ -222,10 +251,66 @@ network_update = {
         "fetch_before_send": {
             "type": "boolean"
         },
+        "coalesce": {
+            "type": "boolean"
+        },
+        "indexes": _indexes,
+        "id_format": _id_format,
         "schema": json_schema
     }
 }
 
+_lag_interval = {
+    "type": "object",
+    "properties": {
+        "p50": {"type": "number"},
+        "p90": {"type": "number"},
+        "p99": {"type": "number"},
+        "max": {"type": "number"}
+    },
+    "required": ["p50", "p90", "p99", "max"]
+}
+
+network_lag_get = {
+    "$schema": "http://json-schema.org/draft-04/schema#network_lag_get",
+    "type": "object",
+    "properties": {
+        "window": {
+            "type": "integer"
+        },
+        "destinations": {
+            "type": "object",
+            "additionalProperties": {
+                "type": "object",
+                "properties": {
+                    "count": {"type": "integer"},
+                    "fan_out": _lag_interval,
+                    "fetch": _lag_interval,
+                    "acknowledge": _lag_interval,
+                    "total": _lag_interval
+                },
+                "required": ["count", "fan_out", "fetch", "acknowledge",
+                             "total"]
+            }
+        }
+    },
+    "required": ["window", "destinations"]
+}
+
+network_retention_post = {
+    "$schema": "http://json-schema.org/draft-04/schema#network_retention_post",  # noqa
+    "type": "object",
+    "properties": {
+        "before": {
+            "type": "string"
+        },
+        "purge": {
+            "type": "boolean"
+        }
+    },
+    "required": ["before", "purge"]
+}
+
 #
 # Node schema
 
@@ -404,6 +489,9 @@ message_get = {
         "record_id": {
             "type": "string"
         },
+        "record_hash": {
+            "type": ["string", "null"]
+        },
         "payload": {
             "type": "object"
         },
@@ -450,7 +538,163 @@ message_update = {
     ]
 }
 
+message_batch_create = {
+    "$schema": "http://json-schema.org/draft-04/schema#message_batch_create",
+    "type": "array",
+    "minItems": 1,
+    "items": message_create
+}
+
+message_batch_create_get = {
+    "$schema": "http://json-schema.org/draft-04/schema#message_batch_create_get",  # noqa
+    "type": "array",
+    "items": {
+        "oneOf": [
+            message_get,
+            {
+                "type": "object",
+                "properties": {
+                    "error": {
+                        "type": "string"
+                    },
+                },
+                "required": [
+                    "error"
+                ],
+                "additionalProperties": False
+            }
+        ]
+    }
+}
+
+message_batch_update = {
+    "$schema": "http://json-schema.org/draft-04/schema#message_batch_update",
+    "type": "array",
+    "minItems": 1,
+    "items": {
+        "type": "object",
+        "properties": {
+            "id": {
+                "type": "string"
+            },
+            "success": {
+                "type": "boolean"
+            },
+            "remote_id": {
+                "type": "string"
+            },
+            "reason": {
+                "type": "string"
+            },
+        },
+        "required": [
+            "id",
+            "success"
+        ]
+    }
+}
+
+message_batch_get = {
+    "$schema": "http://json-schema.org/draft-04/schema#message_batch_get",
+    "type": "array",
+    "items": {
+        "type": "object",
+        "properties": {
+            "id": {
+                "type": "string"
+            },
+            "state": {
+                "type": "string"
+            },
+            "error": {
+                "type": "string"
+            },
+        },
+        "required": [
+            "id"
+        ],
+        "additionalProperties": False
+    }
+}
+
 message_pending_get = {
     "$schema": "http://json-schema.org/draft-04/schema#message_pending_get",
     "type": "integer"
 }
+
+#
+# Record schema
+
+records_get = {
+    "$schema": "http://json-schema.org/draft-04/schema#records_get",
+    "type": "object",
+    "properties": {
+        "records": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "id": {
+                        "type": "string"
+                    },
+                    "deleted": {
+                        "type": "boolean"
+                    },
+                    "head": {
+                        "type": ["object", "null"]
+                    },
+                    "hash": {
+                        "type": ["string", "null"]
+                    },
+                    # Not typed, see message_get's timestamp.
+                    "last_updated": { }
+                },
+                "required": [
+                    "id",
+                    "deleted",
+                    "head",
+                    "last_updated"
+                ],
+                "additionalProperties": False
+            }
+        },
+        "cursor": {
+            "type": ["string", "null"]
+        }
+    },
+    "required": ["records", "cursor"]
+}
+
+records_import_get = {
+    "$schema": "http://json-schema.org/draft-04/schema#records_import_get",
+    "type": "object",
+    "properties": {
+        "created": {
+            "type": "integer"
+        },
+        "updated": {
+            "type": "integer"
+        },
+        "deleted": {
+            "type": "integer"
+        },
+        "unchanged": {
+            "type": "integer"
+        },
+        "invalid": {
+            "type": "integer"
+        },
+        "failed": {
+            "type": "integer"
+        }
+    },
+    "required": [
+        "created",
+        "updated",
+        "deleted",
+        "unchanged",
+        "invalid",
+        "failed"
+    ],
+    "additionalProperties": False
+}
@@ -34,3 +34,223 @@ E.g. mongodb://localhost:27017/
 MONGO_CONNECTION = os.environ.get('MONGO_CONNECTION', None)
 if MONGO_CONNECTION is None:
     MONGO_CONNECTION = 'mongodb://localhost:27017/'
+
+"""COMPRESSION_MINIMUM_SIZE: HTTP bodies smaller than this number of
+bytes are sent uncompressed as the saving does not cover the cost.
+
+"""
+COMPRESSION_MINIMUM_SIZE = os.environ.get('COMPRESSION_MINIMUM_SIZE', None)
+if COMPRESSION_MINIMUM_SIZE is None:
+    COMPRESSION_MINIMUM_SIZE = 1024
+COMPRESSION_MINIMUM_SIZE = int(COMPRESSION_MINIMUM_SIZE)
+
+"""COMPRESSION_LEVEL: zlib compression level used for HTTP bodies, from
+1 (fastest) to 9 (smallest).
+
+"""
+COMPRESSION_LEVEL = os.environ.get('COMPRESSION_LEVEL', None)
+if COMPRESSION_LEVEL is None:
+    COMPRESSION_LEVEL = 6
+COMPRESSION_LEVEL = int(COMPRESSION_LEVEL)
+
+"""COMPRESSION_MAXIMUM_REQUEST_SIZE: compressed HTTP request bodies that
+expand to more than this number of bytes are refused.
+
+"""
+COMPRESSION_MAXIMUM_REQUEST_SIZE = os.environ.get(
+    'COMPRESSION_MAXIMUM_REQUEST_SIZE', None)
+if COMPRESSION_MAXIMUM_REQUEST_SIZE is None:
+    COMPRESSION_MAXIMUM_REQUEST_SIZE = 10485760
+COMPRESSION_MAXIMUM_REQUEST_SIZE = int(COMPRESSION_MAXIMUM_REQUEST_SIZE)
+
+"""TASKS_INLINE: run background tasks, such as propagating a message to
+other nodes, in the calling process using the current storage object
+rather than in a separate process. Used by benchmarks and tools that
+need to measure or wait for the whole of a request.
+
+"""
+TASKS_INLINE = os.environ.get('TASKS_INLINE', None)
+if TASKS_INLINE is None:
+    TASKS_INLINE = 'false'
+TASKS_INLINE = TASKS_INLINE.lower() in ('1', 'true', 'yes')
+
+"""INSTRUMENTATION: record the duration of each stage of message
+processing and each storage call in the in-memory aggregator,
+sync.instrument.aggregator.
+
+"""
+INSTRUMENTATION = os.environ.get('INSTRUMENTATION', None)
+if INSTRUMENTATION is None:
+    INSTRUMENTATION = 'false'
+INSTRUMENTATION = INSTRUMENTATION.lower() in ('1', 'true', 'yes')
+
+"""STORAGE_SLOW_QUERY_TIME: storage calls taking at least this number
+of seconds are logged as warnings. Unset to disable.
+
+"""
+STORAGE_SLOW_QUERY_TIME = os.environ.get('STORAGE_SLOW_QUERY_TIME', None)
+if STORAGE_SLOW_QUERY_TIME is not None:
+    STORAGE_SLOW_QUERY_TIME = float(STORAGE_SLOW_QUERY_TIME)
+
+"""STORAGE_QUERY_LOG: log the number of calls made to each storage
+method, and the time they took, at the end of every HTTP request and
+task.
+
+"""
+STORAGE_QUERY_LOG = os.environ.get('STORAGE_QUERY_LOG', None)
+if STORAGE_QUERY_LOG is None:
+    STORAGE_QUERY_LOG = 'false'
+STORAGE_QUERY_LOG = STORAGE_QUERY_LOG.lower() in ('1', 'true', 'yes')
+
+"""PROFILE_DIR: directory profiles are written to. Requests and tasks
+are only profiled when this is set.
+
+"""
+PROFILE_DIR = os.environ.get('PROFILE_DIR', None)
+
+"""PROFILE_SAMPLE_RATE: fraction of requests and tasks profiled, from 0
+to 1. A request can also ask to be profiled with the X-Sync-Profile
+header.
+
+"""
+PROFILE_SAMPLE_RATE = os.environ.get('PROFILE_SAMPLE_RATE', None)
+if PROFILE_SAMPLE_RATE is None:
+    PROFILE_SAMPLE_RATE = 0
+PROFILE_SAMPLE_RATE = float(PROFILE_SAMPLE_RATE)
+
+"""PROFILE_TOP: number of functions listed in each profile's summary,
+by cumulative time.
+
+"""
+PROFILE_TOP = os.environ.get('PROFILE_TOP', None)
+if PROFILE_TOP is None:
+    PROFILE_TOP = 30
+PROFILE_TOP = int(PROFILE_TOP)
+
+"""LOG_LEVEL: the lowest level of log message written.
+
+"""
+LOG_LEVEL = os.environ.get('LOG_LEVEL', None)
+if LOG_LEVEL is None:
+    LOG_LEVEL = 'INFO'
+LOG_LEVEL = LOG_LEVEL.upper()
+
+"""LOG_FORMAT: text for a line per message or json for a JSON object
+per line.
+
+"""
+LOG_FORMAT = os.environ.get('LOG_FORMAT', None)
+if LOG_FORMAT is None:
+    LOG_FORMAT = 'text'
+LOG_FORMAT = LOG_FORMAT.lower()
+
+"""LOG_QUEUE_SIZE: log messages are handed to a background thread
+through a queue of this size so writing them never blocks the caller.
+Messages are dropped while the queue is full. 0 writes messages in the
+calling thread instead.
+
+"""
+LOG_QUEUE_SIZE = os.environ.get('LOG_QUEUE_SIZE', None)
+if LOG_QUEUE_SIZE is None:
+    LOG_QUEUE_SIZE = 10000
+LOG_QUEUE_SIZE = int(LOG_QUEUE_SIZE)
+
+"""LOG_RATE_LIMIT: the number of times the same message, from the same
+logger at the same level, is written within LOG_RATE_LIMIT_INTERVAL
+seconds. Further repeats are dropped and counted. 0 disables the limit.
+
+"""
+LOG_RATE_LIMIT = os.environ.get('LOG_RATE_LIMIT', None)
+if LOG_RATE_LIMIT is None:
+    LOG_RATE_LIMIT = 10
+LOG_RATE_LIMIT = int(LOG_RATE_LIMIT)
+
+LOG_RATE_LIMIT_INTERVAL = os.environ.get('LOG_RATE_LIMIT_INTERVAL', None)
+if LOG_RATE_LIMIT_INTERVAL is None:
+    LOG_RATE_LIMIT_INTERVAL = 60
+LOG_RATE_LIMIT_INTERVAL = float(LOG_RATE_LIMIT_INTERVAL)
+
+"""LOG_SAMPLE: fractions of messages below ERROR kept for each logger
+and its children, e.g. sync.storage=0.1,sync.http=0.5.
+
+"""
+LOG_SAMPLE = {}
+for _item in os.environ.get('LOG_SAMPLE', '').split(','):
+    _name, _, _rate = _item.partition('=')
+    if _name.strip():
+        LOG_SAMPLE[_name.strip()] = float(_rate)
+
+"""RETENTION_AGE: acknowledged, failed and superseded messages older
+than this many seconds are archived, with their changes, when the
+retention task runs.
+
+"""
+RETENTION_AGE = os.environ.get('RETENTION_AGE', None)
+if RETENTION_AGE is None:
+    RETENTION_AGE = 30 * 24 * 60 * 60
+RETENTION_AGE = int(RETENTION_AGE)
+
+"""RETENTION_PURGE: delete old messages rather than moving them to the
+archive tables or collections.
+
+"""
+RETENTION_PURGE = os.environ.get('RETENTION_PURGE', None)
+if RETENTION_PURGE is None:
+    RETENTION_PURGE = 'false'
+RETENTION_PURGE = RETENTION_PURGE.lower() in ('1', 'true', 'yes')
+
+"""RETENTION_BATCH_SIZE and RETENTION_PAUSE: the retention task moves
+this many messages per transaction and sleeps for RETENTION_PAUSE
+seconds between batches, limiting its load on the database.
+
+"""
+RETENTION_BATCH_SIZE = os.environ.get('RETENTION_BATCH_SIZE', None)
+if RETENTION_BATCH_SIZE is None:
+    RETENTION_BATCH_SIZE = 1000
+RETENTION_BATCH_SIZE = int(RETENTION_BATCH_SIZE)
+
+RETENTION_PAUSE = os.environ.get('RETENTION_PAUSE', None)
+if RETENTION_PAUSE is None:
+    RETENTION_PAUSE = 0.5
+RETENTION_PAUSE = float(RETENTION_PAUSE)
+
+"""PAYLOAD_REFERENCE_SIZE: message payloads whose JSON is at least this
+many characters are stored once, keyed by a hash of their content, and
+shared by every message carrying them. 0 keeps each payload on its
+message.
+
+"""
+PAYLOAD_REFERENCE_SIZE = os.environ.get('PAYLOAD_REFERENCE_SIZE', None)
+if PAYLOAD_REFERENCE_SIZE is None:
+    PAYLOAD_REFERENCE_SIZE = 1024
+PAYLOAD_REFERENCE_SIZE = int(PAYLOAD_REFERENCE_SIZE)
+
+"""STORAGE_COMPRESSION_SIZE: record heads and message payloads whose
+JSON is at least this many characters are stored zlib compressed by the
+Postgres and Mongo backends, and decompressed when first used after
+being read. 0 stores them uncompressed.
+
+"""
+STORAGE_COMPRESSION_SIZE = os.environ.get('STORAGE_COMPRESSION_SIZE', None)
+if STORAGE_COMPRESSION_SIZE is None:
+    STORAGE_COMPRESSION_SIZE = 0
+STORAGE_COMPRESSION_SIZE = int(STORAGE_COMPRESSION_SIZE)
+
+"""STORAGE_COMPRESSION_LEVEL: zlib compression level used for stored
+record heads and message payloads, from 1 (fastest) to 9 (smallest).
+
+"""
+STORAGE_COMPRESSION_LEVEL = os.environ.get('STORAGE_COMPRESSION_LEVEL',
+                                           None)
+if STORAGE_COMPRESSION_LEVEL is None:
+    STORAGE_COMPRESSION_LEVEL = 6
+STORAGE_COMPRESSION_LEVEL = int(STORAGE_COMPRESSION_LEVEL)
+
+"""BULK_BATCH_SIZE: rows of an imported extract compared with the
+stored records at a time, see sync.bulk.
+
+"""
+BULK_BATCH_SIZE = os.environ.get('BULK_BATCH_SIZE', None)
+if BULK_BATCH_SIZE is None:
+    BULK_BATCH_SIZE = 500
+BULK_BATCH_SIZE = int(BULK_BATCH_SIZE)
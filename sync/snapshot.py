@@ -0,0 +1,252 @@
+"""Export a network as NDJSON and restore an export into a new network.
+
+An export holds a JSON object per line:
+
+{"network": {...}}
+    The network's settings, always first, with its schema if asked
+    for.
+{"node": {...}}
+    Each node, if asked for.
+{"record": {...}, "remotes": [...]}
+    Each record that isn't deleted, with the remotes linking it to the
+    nodes' own ids.
+
+Records are read with Storage.get_records a batch at a time, so memory
+use doesn't grow with the network. Messages aren't exported, a network
+restored from an export has none pending.
+
+A restore loads settings.BULK_BATCH_SIZE objects at a time with
+Storage.bulk_insert, which Postgres runs as COPY, rather than replaying
+messages. Remotes of nodes missing from the export are left out.
+
+Run from the command line:
+
+    python -m sync.snapshot export NETWORK_ID --nodes --schema \\
+        --output network.ndjson
+    python -m sync.snapshot restore network.ndjson
+
+"""
+import argparse
+import datetime
+import json
+import sys
+
+import six
+
+import sync
+
+from sync import exceptions, logs, settings, Text
+from sync.storage import init_storage
+
+
+# Setup a module level logger.
+logger = logs.get_logger(__name__)
+
+
+def _serial(obj):
+    if isinstance(obj, datetime.datetime):
+        return obj.isoformat()
+    raise TypeError("Type not serializable: " + str(type(obj)))
+
+
+def _line(value):
+    return json.dumps(value, default=_serial) + '\n'
+
+
+def _parse_datetime(value):
+    for format_ in ('%Y-%m-%dT%H:%M:%S.%f', '%Y-%m-%dT%H:%M:%S'):
+        try:
+            return datetime.datetime.strptime(value, format_)
+        except ValueError:
+            pass
+    raise ValueError(value)
+
+
+def _inflate(class_, values):
+    obj = class_()
+    for key, value in six.iteritems(values):
+        setattr(obj, key, value)
+    return obj
+
+
+def export(storage, nodes=False, schema=False):
+    """Export a network a line at a time.
+
+    :param storage: The network's connected storage.
+    :type storage: sync.storage.Storage
+    :param nodes: Include the network's nodes.
+    :type nodes: bool
+    :param schema: Include the network's schema.
+    :type schema: bool
+    :returns: Lines of JSON, each ending with a new line.
+    :rtype: generator
+
+    """
+    network = storage.get_network().as_dict()
+    if not schema:
+        del network['schema']
+    yield _line({'network': network})
+
+    if nodes:
+        for node in storage.get_nodes():
+            yield _line({'node': node.as_dict(with_id=True)})
+
+    for batch in storage.get_records():
+        for record in batch:
+            yield _line({
+                'record': record.as_dict(with_id=True),
+                'remotes': [r.as_dict(with_id=True)
+                            for r in record._remotes]
+            })
+
+
+def _flush(storage, pending):
+    # Records are inserted before the remotes referring to them.
+    storage.start_transaction()
+    try:
+        for class_ in (sync.Node, sync.Record, sync.Remote):
+            storage.bulk_insert(pending[class_])
+            pending[class_] = []
+        storage.commit()
+    except Exception:
+        storage.rollback()
+        raise
+
+
+def restore(lines, network_id=None, batch_size=None):
+    """Restore an export into a new network.
+
+    :param lines: The lines of an export.
+    :type lines: iterable
+    :param network_id: The new network's id, generated if None.
+    :type network_id: str
+    :param batch_size: Objects inserted at a time, defaults to
+        settings.BULK_BATCH_SIZE.
+    :type batch_size: int
+    :returns: The new network's id and the number of nodes, records
+        and remotes restored.
+    :rtype: dict
+    :raises: sync.exceptions.InvalidOperationError
+
+    """
+    if network_id is None:
+        network_id = sync.generate_id()
+    if batch_size is None:
+        batch_size = settings.BULK_BATCH_SIZE
+    init_storage(network_id, create_db=True)
+    storage = sync.current_storage()
+    if storage.get_network() is not None:
+        raise exceptions.InvalidOperationError(
+            Text.SnapshotNetworkExists.format(network_id))
+
+    result = {
+        'network_id': network_id,
+        'nodes': 0,
+        'records': 0,
+        'remotes': 0
+    }
+    node_ids = set()
+    pending = {sync.Node: [], sync.Record: [], sync.Remote: []}
+    network = None
+    for number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            data = json.loads(line)
+        except ValueError:
+            data = None
+        if not isinstance(data, dict):
+            raise exceptions.InvalidOperationError(
+                Text.SnapshotLineInvalid.format(number,
+                                                'expected a JSON object'))
+
+        if 'network' in data:
+            network = _inflate(sync.Network, data['network'])
+            network.id = None
+            if network.schema is None:
+                network.schema = {}
+            network.save()
+            continue
+        if network is None:
+            raise exceptions.InvalidOperationError(
+                Text.SnapshotLineInvalid.format(number,
+                                                'expected the network'))
+
+        if 'node' in data:
+            node = _inflate(sync.Node, data['node'])
+            node_ids.add(node.id)
+            pending[sync.Node].append(node)
+            result['nodes'] += 1
+        elif 'record' in data:
+            record = _inflate(sync.Record, data['record'])
+            record.last_updated = _parse_datetime(record.last_updated)
+            pending[sync.Record].append(record)
+            result['records'] += 1
+            for values in data.get('remotes') or []:
+                if values.get('node_id') in node_ids:
+                    pending[sync.Remote].append(
+                        _inflate(sync.Remote, values))
+                    result['remotes'] += 1
+        else:
+            raise exceptions.InvalidOperationError(
+                Text.SnapshotLineInvalid.format(number,
+                                                'unknown object'))
+
+        if sum(len(objects) for objects in pending.values()) >= \
+           batch_size:
+            _flush(storage, pending)
+    _flush(storage, pending)
+
+    logger.info('Restored network %s with %d nodes, %d records and %d '
+                'remotes', network_id, result['nodes'], result['records'],
+                result['remotes'])
+    return result
+
+
+def main(argv=None):
+    logs.configure()
+    parser = argparse.ArgumentParser(
+        description='Export a sync network or restore an export.')
+    commands = parser.add_subparsers(dest='command')
+    export_parser = commands.add_parser(
+        'export', help='Write a network as NDJSON.')
+    export_parser.add_argument('network_id')
+    export_parser.add_argument('--nodes', action='store_true',
+                               help='Include the nodes.')
+    export_parser.add_argument('--schema', action='store_true',
+                               help='Include the network schema.')
+    export_parser.add_argument('--output', help='File to write to, '
+                               'defaults to stdout.')
+    restore_parser = commands.add_parser(
+        'restore', help='Load an export into a new network.')
+    restore_parser.add_argument('input', help='File to read, - for stdin.')
+    restore_parser.add_argument('--network-id', help='Id of the new '
+                                'network, generated by default.')
+    args = parser.parse_args(argv)
+
+    try:
+        if args.command == 'export':
+            init_storage(args.network_id)
+            lines = export(sync.current_storage(), args.nodes, args.schema)
+            output = open(args.output, 'w') if args.output else sys.stdout
+            try:
+                output.writelines(lines)
+            finally:
+                if args.output:
+                    output.close()
+        elif args.command == 'restore':
+            input_ = open(args.input) if args.input != '-' else sys.stdin
+            try:
+                result = restore(input_, args.network_id)
+            finally:
+                if args.input != '-':
+                    input_.close()
+            sys.stdout.write(json.dumps(result, sort_keys=True) + '\n')
+        else:
+            parser.error('a command is required')
+    finally:
+        sync.close()
+
+
+if __name__ == '__main__':
+    main()
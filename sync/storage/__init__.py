@@ -1,24 +1,76 @@
+"""Storage backends.
+
+Backend modules, and the database drivers they depend on, are imported
+when first used rather than with this package, so a process only loads
+the backend settings.STORAGE_CLASS selects. Python versions before 3.7
+can not load module attributes on demand, there every backend is
+imported up front.
+
+"""
+import importlib
 import sys
 
 import sync
 
-from sync import settings
-from sync.storage.base import Storage
-from sync.storage.mongo import MongoStorage
-from sync.storage.mock import MockStorage
-from sync.storage.postgres import PostgresStorage
+from sync import exceptions, settings, Backend, Text
+from sync.storage.base import (assert_max_queries, count_queries,
+                               log_queries, start_counting, stop_counting,
+                               QueryCounter, Storage)
+
+
+# The module defining each storage class.
+_MODULES = {
+    Backend.Mock: 'sync.storage.mock',
+    Backend.Mongo: 'sync.storage.mongo',
+    Backend.Postgres: 'sync.storage.postgres'
+}
+
+
+def get_storage_class(name=None):
+    """Import a storage class.
+
+    :param name: The class name, defaults to settings.STORAGE_CLASS.
+    :type name: sync.constants.Backend
+    :returns: The storage class.
+    :rtype: type
+    :raises: sync.exceptions.SyncError
+
+    """
+    if name is None:
+        name = settings.STORAGE_CLASS
+    if name not in _MODULES:
+        raise exceptions.SyncError(Text.UnknownStorage.format(name))
+    module = importlib.import_module(_MODULES[name])
+    return getattr(module, name)
 
 
 def init_storage(network_id, create_db=False):
     """Instantiate the storage object and pass init the sync network.
 
     """
-    current_module = sys.modules[__name__]
-    storage_class = getattr(current_module, settings.STORAGE_CLASS)
+    storage_class = get_storage_class()
     storage = storage_class(network_id)
     storage.connect(create_db=create_db)
     sync.init(storage)
 
 
-__all__ = ["init_storage", "MockStorage", "MongoStorage",
-           "PostgresStorage", "Storage"]
+def __getattr__(name):
+    if name in _MODULES:
+        return get_storage_class(name)
+    module = 'sync.storage.' + name
+    if module in _MODULES.values():
+        return importlib.import_module(module)
+    raise AttributeError(
+        "module '{0}' has no attribute '{1}'".format(__name__, name))
+
+
+if sys.version_info < (3, 7):
+    from sync.storage.mongo import MongoStorage  # noqa
+    from sync.storage.mock import MockStorage  # noqa
+    from sync.storage.postgres import PostgresStorage  # noqa
+
+
+__all__ = ["assert_max_queries", "count_queries", "get_storage_class",
+           "init_storage", "log_queries", "start_counting", "stop_counting",
+           "MockStorage", "MongoStorage", "PostgresStorage", "QueryCounter",
+           "Storage"]
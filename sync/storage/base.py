@@ -1,11 +1,359 @@
+import contextlib
+import hashlib
+import inspect
+import json
+import re
+import threading
+import types
+
+import six
+
 import sync
 
+from sync import (compression, exceptions, instrument, logs, settings,
+                  IdFormat, Stage, Text)
+
+
+# Setup a module level logger.
+logger = logs.get_logger(__name__)
+
+
+# Query counters active on the current thread.
+_local = threading.local()
+
+# Head fields a network may index. Names are used in index definitions
+# and names, so only word characters are allowed, as the network schemas
+# in sync.schema also require.
+INDEX_FIELD = re.compile(r'^[A-Za-z_][A-Za-z0-9_]{0,39}$')
+
+# The id format of each network, as this process last read or saved
+# it. A change made by another process is seen when the network is next
+# read, which sending a message does.
+_id_formats = {}
+
+
+class QueryCounter(object):
+    """The number of calls and total seconds spent in each storage
+    method within a scope.
+
+    """
+
+    def __init__(self, name=None):
+        #: name (str): Describes the scope, such as a route or task.
+        self.name = name
+        #: calls (dict): Number of calls keyed by method name.
+        self.calls = {}
+        #: durations (dict): Seconds spent keyed by method name.
+        self.durations = {}
+
+    @property
+    def total(self):
+        """The number of storage calls made."""
+        return sum(self.calls.values())
+
+    @property
+    def duration(self):
+        """Seconds spent in storage calls."""
+        return sum(self.durations.values())
+
+    def add(self, method, duration):
+        self.calls[method] = self.calls.get(method, 0) + 1
+        self.durations[method] = self.durations.get(method, 0.0) + duration
+
+    def summary(self):
+        """Describe the calls made, busiest method first."""
+        methods = sorted(self.calls, key=lambda m: (-self.calls[m], m))
+        return '{0} storage calls in {1:.1f}ms ({2})'.format(
+            self.total, self.duration * 1000,
+            ', '.join('{0}={1}'.format(m, self.calls[m]) for m in methods))
+
+
+def _counters():
+    counters = getattr(_local, 'counters', None)
+    if counters is None:
+        counters = _local.counters = []
+    return counters
+
+
+def start_counting(name=None):
+    """Count storage calls made by the current thread until
+    stop_counting is called. Scopes may be nested.
+
+    :param name: Describes the scope.
+    :type name: str
+    :returns: The new counter.
+    :rtype: sync.storage.QueryCounter
+
+    """
+    counter = QueryCounter(name)
+    _counters().append(counter)
+    return counter
+
+
+def stop_counting(counter, log=False):
+    """Stop a counter returned by start_counting.
+
+    :param counter: The counter to stop.
+    :type counter: sync.storage.QueryCounter
+    :param log: Log the counter's summary.
+    :type log: bool
+
+    """
+    counters = _counters()
+    if counter in counters:
+        counters.remove(counter)
+    if log:
+        logger.info('%s: %s', counter.name, counter.summary())
+
+
+@contextlib.contextmanager
+def count_queries(name=None):
+    """Count the storage calls made by the current thread within a block.
+
+        with count_queries('node sync') as counter:
+            ...
+        counter.total
+
+    :param name: Describes the scope.
+    :type name: str
+
+    """
+    counter = start_counting(name)
+    try:
+        yield counter
+    finally:
+        stop_counting(counter)
+
+
+@contextlib.contextmanager
+def log_queries(name):
+    """Log the storage calls made by the current thread within a block
+    when settings.STORAGE_QUERY_LOG is true.
+
+    :param name: Describes the scope.
+    :type name: str
+
+    """
+    if not settings.STORAGE_QUERY_LOG:
+        yield None
+        return
+    counter = start_counting(name)
+    try:
+        yield counter
+    finally:
+        stop_counting(counter, log=True)
+
+
+@contextlib.contextmanager
+def assert_max_queries(maximum):
+    """Fail if a block makes more than maximum storage calls. Used by
+    tests to guard hot paths against extra queries.
+
+    :param maximum: The most calls allowed.
+    :type maximum: int
+    :raises: AssertionError
+
+    """
+    with count_queries() as counter:
+        yield counter
+    if counter.total > maximum:
+        raise AssertionError('Expected at most {0}, made {1}'.format(
+            maximum, counter.summary()))
+
+
+def hash_payload(payload):
+    """Hash a message payload that should be stored by reference.
+
+    :param payload: The message payload.
+    :type payload: dict
+    :returns: The SHA-256 hex digest of the payload's JSON, with sorted
+        keys, or None if the payload is kept on the message because it
+        is None or smaller than settings.PAYLOAD_REFERENCE_SIZE.
+    :rtype: str
+
+    """
+    if payload is None or settings.PAYLOAD_REFERENCE_SIZE <= 0:
+        return None
+    data = json.dumps(payload, sort_keys=True, separators=(',', ':'))
+    if len(data) < settings.PAYLOAD_REFERENCE_SIZE:
+        return None
+    return hashlib.sha256(data.encode('utf-8')).hexdigest()
+
+
+def json_type(value):
+    """The JSON type of a value, named as Postgres' jsonb_typeof does.
+
+    :param value: A value decoded from JSON.
+    :returns: The type, or None for null, objects and arrays.
+    :rtype: str
+
+    """
+    if isinstance(value, bool):
+        return 'boolean'
+    if isinstance(value, (float,) + six.integer_types):
+        return 'number'
+    if isinstance(value, six.string_types):
+        return 'string'
+    return None
+
+
+def compress_property(obj, name):
+    """Compress a property of a model object for storage.
+
+    :param obj: The object being saved.
+    :type obj: sync.Base
+    :param name: The property's name.
+    :type name: str
+    :returns: The compressed JSON, or None if the value is stored
+        uncompressed because it is None or smaller than
+        settings.STORAGE_COMPRESSION_SIZE.
+    :rtype: bytes
+
+    """
+    compressed = obj.__dict__.get('_compressed') or {}
+    if name in compressed:
+        # Unchanged since it was read, store the same bytes.
+        return compressed[name]
+    value = getattr(obj, name)
+    if value is None or settings.STORAGE_COMPRESSION_SIZE <= 0:
+        return None
+    data = json.dumps(value, separators=(',', ':'))
+    if len(data) < settings.STORAGE_COMPRESSION_SIZE:
+        return None
+    return compression.compress(data.encode('utf-8'),
+                                compression.Encoding.Deflate,
+                                settings.STORAGE_COMPRESSION_LEVEL)
+
+
+def defer_decompression(obj):
+    """Move properties read compressed, from a <name>_compressed column
+    or field, to obj._compressed so each is decompressed when first
+    accessed.
+
+    :param obj: An object read from storage.
+    :type obj: sync.Base
+    :returns: The object.
+    :rtype: sync.Base
+
+    """
+    keys = [k for k in obj.__dict__
+            if k.endswith('_compressed') and k != '_compressed']
+    for key in keys:
+        data = obj.__dict__.pop(key)
+        if data is None:
+            continue
+        name = key[:-len('_compressed')]
+        obj.__dict__.pop(name, None)
+        obj.__dict__.setdefault('_compressed', {})[name] = bytes(data)
+    return obj
+
+
+def _record(method, duration):
+    if instrument.hooks:
+        instrument.emit(Stage.Storage.format(method), duration)
+    for counter in _counters():
+        counter.add(method, duration)
+    slow = settings.STORAGE_SLOW_QUERY_TIME
+    if slow is not None and duration >= slow:
+        logger.warning('Slow storage call %s took %.1fms', method,
+                       duration * 1000)
+
+
+def _active():
+    return bool(instrument.hooks or getattr(_local, 'counters', None) or
+                settings.STORAGE_SLOW_QUERY_TIME is not None)
+
+
+def _instrument(method, fun):
+    """Wrap a storage method so calls are timed, counted and checked
+    against the slow call threshold. Nothing is measured unless
+    something is listening.
+
+    """
+    if inspect.isgeneratorfunction(fun):
+        # Time fetching each batch.
+        def generator_wrapper(*args, **kwargs):
+            iterator = fun(*args, **kwargs)
+            while True:
+                active = _active()
+                start = instrument.clock() if active else None
+                try:
+                    value = next(iterator)
+                except StopIteration:
+                    return
+                finally:
+                    if active:
+                        _record(method, instrument.clock() - start)
+                yield value
+        return six.wraps(fun)(generator_wrapper)
+
+    def wrapper(*args, **kwargs):
+        if not _active():
+            return fun(*args, **kwargs)
+        start = instrument.clock()
+        try:
+            return fun(*args, **kwargs)
+        finally:
+            _record(method, instrument.clock() - start)
+    return six.wraps(fun)(wrapper)
+
+
+class _Instrumented(type):
+    """Instrument every public method of a storage class."""
+
+    def __new__(mcs, name, bases, attrs):
+        for key, value in list(attrs.items()):
+            if not key.startswith('_') and \
+               isinstance(value, types.FunctionType):
+                attrs[key] = _instrument(key, value)
+        return super(_Instrumented, mcs).__new__(mcs, name, bases, attrs)
+
+
+@six.add_metaclass(_Instrumented)
 class Storage(object):
     """Abstract class that defines a public interface for all storage
     implementations.
 
+    Public methods of subclasses are timed by sync.instrument and
+    counted by count_queries.
+
     """
 
+    def _network_read(self, network):
+        """Note the id format of a network read or saved, backends call
+        this from get_network and save_network.
+
+        :returns: The network.
+        :rtype: sync.Network
+
+        """
+        if network is not None:
+            _id_formats[self.id] = network.id_format or IdFormat.UUID4
+        return network
+
+    def _check_index_fields(self, fields):
+        """Backends call this before saving a network, as its index
+        fields are used in index definitions.
+
+        :raises: sync.exceptions.InvalidOperationError
+
+        """
+        for field in fields or []:
+            if not isinstance(field, six.string_types) or \
+               not INDEX_FIELD.match(field):
+                raise exceptions.InvalidOperationError(
+                    Text.IndexFieldInvalid.format(field))
+
+    def _generate_id(self):
+        """Generate the id of a new object in the network's id format.
+
+        :rtype: str
+
+        """
+        if self.id not in _id_formats:
+            self.get_network()
+        return sync.generate_id(_id_formats.get(self.id, IdFormat.UUID4))
+
     def connect(self):
         """Setup a connection to the storage backend if needed."""
         raise NotImplementedError
@@ -18,6 +366,17 @@ class Storage(object):
         """Delete all data for the current sync network."""
         raise NotImplementedError
 
+    def migrate(self):
+        """Bring the tables, columns, indexes and functions, or the
+        collection indexes, of an existing network up to date.
+
+        Run when deploying, by sync.migrate, as changing the schema of a
+        large network may lock it for some time. connect only does so
+        when it creates a network. Safe to run more than once.
+
+        """
+        raise NotImplementedError
+
     def start_transaction(self):
         """If the backend supports transactions start a new transaction."""
         raise NotImplementedError
@@ -39,6 +398,9 @@ class Storage(object):
     def save_network(self, network):
         """Save a network object to the storage backend.
 
+        Backends index the record head fields in network.indexes, for
+        find_records, and drop indexes of fields since removed.
+
         :param network: Network object to save
         :type network: sync.Network
         """
@@ -55,6 +417,9 @@ class Storage(object):
     def save_message(self, message):
         """Save a message object to the storage backend.
 
+        Backends that can share payloads store those hash_payload
+        returns a hash for once, messages are read back with them.
+
         :param message: Message object to save
         :type message: sync.Message
         """
@@ -84,6 +449,21 @@ class Storage(object):
         """
         raise NotImplementedError
 
+    def patch_record(self, record, patch):
+        """Save a record object whose head has had a merge patch
+        applied.
+
+        Backends that can apply the patch to the stored head override
+        this, so only the patch is written, by default the whole record
+        is saved.
+
+        :param record: Record object to save, its head already patched
+        :type record: sync.Record
+        :param patch: The merge patch applied to the head
+        :type patch: dict
+        """
+        self.save_record(record)
+
     def save_remote(self, remote):
         """Save a remote object to the storage backend.
 
@@ -92,6 +472,24 @@ class Storage(object):
         """
         raise NotImplementedError
 
+    def bulk_insert(self, objects):
+        """Insert new nodes, records or remotes keeping their ids, as
+        when restoring a snapshot. Faster than saving each in turn.
+
+        :param objects: Objects all of the same class.
+        :type objects: list
+
+        """
+        raise NotImplementedError
+
+    def save_latency(self, latency):
+        """Save a latency object to the storage backend.
+
+        :param latency: Latency object to save
+        :type latency: sync.Latency
+        """
+        raise NotImplementedError
+
     def get_network(self):
         """Fetch the current sync network.
 
@@ -133,10 +531,36 @@ class Storage(object):
         """
         raise NotImplementedError
 
+    def get_node_remotes(self, node_id, remote_ids):
+        """Fetch a node's remotes by their remote ids.
+
+        :param node_id: The node id of the remotes to fetch.
+        :param remote_ids: The remote ids of the remotes to fetch.
+        :type remote_ids: list
+        :returns: The remotes found, in no particular order.
+        :rtype: list
+
+        """
+        raise NotImplementedError
+
+    def get_all_node_remotes(self, node_id):
+        """Fetch all of a node's remotes that have a remote id using a
+        generator.
+
+        :param node_id: The node id of the remotes to fetch.
+        :returns: Batches of remotes, in no particular order.
+        :rtype: generator
+
+        """
+        raise NotImplementedError
+
     def get_message(self, message_id=None, destination_id=None,
                     state=sync.State.Pending,
                     with_for_update=False):
-        """Fetch a message object based on the keyword args.
+        """Fetch a message object based on the keyword args. Of the
+        messages for a destination the one with the earliest timestamp,
+        then id, is returned, UUID7 ids break ties in the order the
+        messages were sent.
 
         :param message_id: The id of the message.
         :param destination_id: The destination node id of the message.
@@ -149,6 +573,50 @@ class Storage(object):
         """
         raise NotImplementedError
 
+    def get_pending_messages(self, destination_id, record_id,
+                             with_for_update=False):
+        """Fetch the pending messages for a record and destination.
+
+        :param destination_id: The destination node id of the messages.
+        :param record_id: The record id of the messages.
+        :param with_for_update: True if the storage backend should
+            lock the rows.
+        :returns: An array of messages, ordered by timestamp then id.
+        :rtype: array
+
+        """
+        raise NotImplementedError
+
+    def archive_messages(self, before, limit, purge=False):
+        """Move messages in a final state, and their changes, to archive
+        tables or collections.
+
+        Messages that other messages name as their parent are left
+        until those messages have been moved. Latencies recorded for the
+        messages are deleted.
+
+        :param before: Only messages with an earlier timestamp are moved.
+        :param limit: The most messages to move, oldest first.
+        :param purge: Delete the messages rather than archiving them.
+        :returns: The number of messages moved.
+        :rtype: integer
+
+        """
+        raise NotImplementedError
+
+    def purge_payloads(self, before, limit):
+        """Delete stored payloads that no message or archived message
+        refers to.
+
+        :param before: Only payloads last saved before this time are
+            deleted.
+        :param limit: The most payloads to delete.
+        :returns: The number of payloads deleted.
+        :rtype: integer
+
+        """
+        raise NotImplementedError
+
     def get_message_count(self, destination_id=None, state=sync.State.Pending):
         """Fetch a count of messages.
 
@@ -160,6 +628,18 @@ class Storage(object):
         """
         raise NotImplementedError
 
+    def get_pending_summary(self):
+        """Count the pending messages for each destination node using an
+        aggregate query.
+
+        :returns: The count and the timestamp of the oldest pending
+            message keyed by destination node id, nodes without pending
+            messages are left out.
+        :rtype: dict
+
+        """
+        raise NotImplementedError
+
     def get_nodes(self):
         """Fetch all node objects in the network.
 
@@ -169,6 +649,17 @@ class Storage(object):
         """
         raise NotImplementedError
 
+    def get_records_by_id(self, record_ids):
+        """Fetch records, including deleted records, by their ids.
+
+        :param record_ids: The ids of the records to fetch.
+        :type record_ids: list
+        :returns: The records found, in no particular order.
+        :rtype: list
+
+        """
+        raise NotImplementedError
+
     def get_records(self):
         """Fetch all records in the network.
 
@@ -178,6 +669,24 @@ class Storage(object):
         """
         raise NotImplementedError
 
+    def find_records(self, filters, limit, cursor=None):
+        """Find records that are not deleted by the values of top level
+        head fields, which save_network has indexed.
+
+        :param filters: (field, operator, value) tuples the records
+            must all match, operator is a sync.constants.Operator. A
+            range only matches values of the value's JSON type.
+        :type filters: list
+        :param limit: The most records to return.
+        :type limit: int
+        :param cursor: Only records with a greater id are returned.
+        :type cursor: str
+        :returns: Records ordered by id.
+        :rtype: list
+
+        """
+        raise NotImplementedError
+
     def get_errors(self, message_id):
         """Fetch errors for a particular message.
 
@@ -198,6 +707,17 @@ class Storage(object):
         """
         raise NotImplementedError
 
+    def get_latencies(self, since=None):
+        """Fetch latencies recorded at or after a time.
+
+        :param since: The earliest timestamp, all latencies when None.
+        :type since: datetime.datetime
+        :returns: An array of latencies.
+        :rtype: array
+
+        """
+        raise NotImplementedError
+
     def update_messages(self, node_id, record_id, remote_id):
         """Update the remote id of all messages with a matching node id and
         record id.
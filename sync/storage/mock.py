@@ -1,15 +1,35 @@
 import copy
+import operator
 
 import sync
 
 from sync import settings
-from sync import Text
+from sync import Operator, Text
 from sync.exceptions import DatabaseNotFoundError
-from sync.storage.base import Storage
+from sync.storage.base import json_type, Storage
 
 
 mock_storage_objects = {}
 
+_COMPARISONS = {
+    Operator.Equal: operator.eq,
+    Operator.GreaterThan: operator.gt,
+    Operator.GreaterThanOrEqual: operator.ge,
+    Operator.LessThan: operator.lt,
+    Operator.LessThanOrEqual: operator.le
+}
+
+
+def _matches(head, filters):
+    for field, op, value in filters:
+        if not isinstance(head, dict) or field not in head:
+            return False
+        # Like the other backends only values of the same type match.
+        if json_type(head[field]) != json_type(value) or \
+           not _COMPARISONS[op](head[field], value):
+            return False
+    return True
+
 
 class MockStorage(Storage):
     """Store data in-memory."""
@@ -24,10 +44,13 @@ class MockStorage(Storage):
         self.changes = {}
         self.records = {}
         self.remotes = {}
+        self.latencies = {}
+        self.messages_archive = {}
+        self.changes_archive = {}
 
     def _save(self, obj, dict_):
         if obj.id is None:
-            obj.id = sync.generate_id()
+            obj.id = self._generate_id()
 
         dict_[obj.id] = copy.deepcopy(obj)
 
@@ -44,6 +67,9 @@ class MockStorage(Storage):
             self.changes = obj.changes
             self.records = obj.records
             self.remotes = obj.remotes
+            self.latencies = obj.latencies
+            self.messages_archive = obj.messages_archive
+            self.changes_archive = obj.changes_archive
 
         mock_storage_objects[self.id] = self
 
@@ -53,6 +79,9 @@ class MockStorage(Storage):
     def drop(self):
         pass
 
+    def migrate(self):
+        pass
+
     def start_transaction(self):
         pass
 
@@ -63,9 +92,11 @@ class MockStorage(Storage):
         pass
 
     def save_network(self, network):
+        self._check_index_fields(network.indexes)
         if network.id is None:
             network.id = self.id
         self.network = copy.deepcopy(network)
+        self._network_read(network)
 
     def save_node(self, node):
         self._save(node, self.nodes)
@@ -82,8 +113,20 @@ class MockStorage(Storage):
     def save_remote(self, remote):
         self._save(remote, self.remotes)
 
+    def bulk_insert(self, objects):
+        tables = {
+            sync.Node: self.nodes,
+            sync.Record: self.records,
+            sync.Remote: self.remotes
+        }
+        for obj in objects:
+            self._save(obj, tables[obj.__class__])
+
+    def save_latency(self, latency):
+        self._save(latency, self.latencies)
+
     def get_network(self):
-        return self.network
+        return self._network_read(copy.deepcopy(self.network))
 
     def get_node(self, node_id):
         return self.nodes.get(node_id, None)
@@ -112,19 +155,67 @@ class MockStorage(Storage):
                 results.append(r)
         return results
 
+    def get_node_remotes(self, node_id, remote_ids):
+        remote_ids = set(remote_ids)
+        results = []
+        for r in self.remotes.values():
+            if r.node_id == node_id and r.remote_id in remote_ids:
+                results.append(r)
+        return results
+
+    def get_all_node_remotes(self, node_id):
+        yield [r for r in self.remotes.values()
+               if r.node_id == node_id and r.remote_id is not None]
+
     def get_message(self, message_id=None, destination_id=None,
                     state=sync.State.Pending, with_for_update=False):
         if message_id is not None:
             return self.messages.get(message_id, None)
 
         if destination_id is not None:
-            for message in self.messages.values():
-                if message.state == state and \
-                   message.destination_id == destination_id:
-                    return message
+            messages = [m for m in self.messages.values()
+                        if m.state == state and
+                        m.destination_id == destination_id]
+            if messages:
+                return min(messages, key=lambda m: (m.timestamp, m.id))
 
         return None
 
+    def get_pending_messages(self, destination_id, record_id,
+                             with_for_update=False):
+        messages = [m for m in self.messages.values()
+                    if m.state == sync.State.Pending and
+                    m.destination_id == destination_id and
+                    m.record_id == record_id]
+        return sorted(messages, key=lambda m: (m.timestamp, m.id))
+
+    def archive_messages(self, before, limit, purge=False):
+        parents = set(m.parent_id for m in self.messages.values())
+        messages = sorted([m for m in self.messages.values()
+                           if m.state in sync.State.Final and
+                           m.timestamp < before and m.id not in parents],
+                          key=lambda m: (m.timestamp, m.id))[:limit]
+        ids = set(m.id for m in messages)
+
+        for change in list(self.changes.values()):
+            if change.message_id in ids:
+                del self.changes[change.id]
+                if not purge:
+                    self.changes_archive[change.id] = change
+        for latency in list(self.latencies.values()):
+            if latency.message_id in ids or latency.parent_id in ids:
+                del self.latencies[latency.id]
+        for message in messages:
+            del self.messages[message.id]
+            if not purge:
+                self.messages_archive[message.id] = message
+
+        return len(messages)
+
+    def purge_payloads(self, before, limit):
+        # Payloads are kept on the messages in memory.
+        return 0
+
     def get_message_count(self, destination_id=None, state=sync.State.Pending):
         result = 0
         for message in self.messages.values():
@@ -134,9 +225,31 @@ class MockStorage(Storage):
 
         return result
 
+    def get_pending_summary(self):
+        result = {}
+        for message in self.messages.values():
+            if message.state != sync.State.Pending or \
+               message.destination_id is None:
+                continue
+            summary = result.setdefault(message.destination_id, {
+                'count': 0,
+                'oldest': message.timestamp
+            })
+            summary['count'] += 1
+            summary['oldest'] = min(summary['oldest'], message.timestamp)
+
+        return result
+
     def get_nodes(self):
         return list(self.nodes.values())
 
+    def get_records_by_id(self, record_ids):
+        results = []
+        for record_id in record_ids:
+            if record_id in self.records:
+                results.append(self.records[record_id])
+        return results
+
     def get_records(self):
         records = []
         for r in self.records.values():
@@ -148,11 +261,24 @@ class MockStorage(Storage):
             results[record.id] = record
 
         remotes = self.get_remotes(results.keys())
+        for record in records:
+            record._remotes = []
         for remote in remotes:
             results[remote.record_id]._remotes.append(remote)
 
         return [results.values()]
 
+    def find_records(self, filters, limit, cursor=None):
+        results = []
+        for record in sorted(self.records.values(), key=lambda r: r.id):
+            if record.deleted or (cursor is not None and record.id <= cursor):
+                continue
+            if _matches(record.head, filters):
+                results.append(record)
+                if len(results) == limit:
+                    break
+        return results
+
     def get_changes(self, message_id):
         results = []
         for c in self.changes.values():
@@ -160,6 +286,10 @@ class MockStorage(Storage):
                 results.append(c)
         return results
 
+    def get_latencies(self, since=None):
+        return [latency for latency in self.latencies.values()
+                if since is None or latency.timestamp >= since]
+
     def update_messages(self, node_id, record_id, remote_id):
         for message in self.messages.values():
             if message.state == sync.State.Pending \
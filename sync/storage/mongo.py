@@ -1,5 +1,6 @@
 import six
 
+from bson.binary import Binary
 from pymongo import MongoClient
 
 import sync
@@ -7,13 +8,24 @@ import sync
 from sync import settings
 from sync import Text
 from sync.exceptions import DatabaseNotFoundError
-from sync.storage.base import Storage
+from sync.storage.base import (compress_property, defer_decompression,
+                               hash_payload, Storage)
 
 
 # Used to store a mock Mongodb client.
 test_mongo_client = None
 
 
+# Records get_records, and remotes get_all_node_remotes, read at a
+# time.
+_RECORD_BATCH_SIZE = 1000
+
+# Indexes since replaced, dropped by migrate.
+_REPLACED_INDEXES = {
+    'messages': ['destination_id_1_state_1_timestamp_1']
+}
+
+
 class MongoStorage(Storage):
     """Store data in a Mongo database."""
 
@@ -34,10 +46,10 @@ class MongoStorage(Storage):
             if table == 'networks':
                 obj.schema = self._decode_dollar_prefix(obj.schema)
 
-        return obj
+        return defer_decompression(obj)
 
-    def _get_many(self, table, filter_, class_):
-        rows = self.session[table].find(filter_)
+    def _get_many(self, table, filter_, class_, sort=None, limit=0):
+        rows = self.session[table].find(filter_, sort=sort, limit=limit)
 
         results = []
         for row in rows:
@@ -45,7 +57,7 @@ class MongoStorage(Storage):
             for key in row.keys():
                 if not key == '_id':
                     setattr(obj, key, row[key])
-            results.append(obj)
+            results.append(defer_decompression(obj))
 
         return results
 
@@ -83,14 +95,15 @@ class MongoStorage(Storage):
                 dict_value[key] = self._decode_dollar_prefix(value)
         return dict_value
 
-    def _save(self, table, obj, override_id=False):
+    def _save(self, table, obj, override_id=False, replace=None):
         values = obj.as_dict(False)
+        values.update(replace or {})
 
         if table == 'networks':
             values['schema'] = self._encode_dollar_prefix(values['schema'])
 
         if not hasattr(obj, 'id') or obj.id is None:
-            obj.id = override_id or sync.generate_id()
+            obj.id = override_id or self._generate_id()
             values['id'] = obj.id
             self.session[table].insert_one(values)
         else:
@@ -115,6 +128,36 @@ class MongoStorage(Storage):
 
         self.session = self.client[self.id]
 
+        # Indexes of an existing database are assumed to be current,
+        # migrate is run when deploying rather than by each process.
+        if create_db:
+            self.migrate()
+
+    def migrate(self):
+        # Serves fetching the next message and pending counts.
+        self.session['messages'].create_index(
+            [('destination_id', 1), ('state', 1), ('timestamp', 1),
+             ('id', 1)])
+        self.session['changes'].create_index('message_id')
+        self.session['latencies'].create_index('timestamp')
+        # Serves finding messages to archive and their children.
+        self.session['messages'].create_index(
+            [('state', 1), ('timestamp', 1)])
+        self.session['messages'].create_index('parent_id')
+        self.session['messages'].create_index('payload_hash')
+        self.session['messages_archive'].create_index('payload_hash')
+        self.session['payloads'].create_index('used')
+        # Serves finding a node's records by their remote ids.
+        self.session['remotes'].create_index(
+            [('node_id', 1), ('remote_id', 1)])
+        # Serves reading the remotes of a batch of records.
+        self.session['remotes'].create_index('record_id')
+        for table, names in six.iteritems(_REPLACED_INDEXES):
+            existing = self.session[table].index_information()
+            for name in names:
+                if name in existing:
+                    self.session[table].drop_index(name)
+
     def disconnect(self):
         self.client.close()
 
@@ -130,26 +173,134 @@ class MongoStorage(Storage):
     def rollback(self):
         pass
 
+    def _index_head_fields(self, fields):
+        """Index records by each head field, with the id to order
+        pages, and drop the indexes of other fields.
+
+        """
+        prefix = 'ix_records_head_'
+        records = self.session['records']
+        existing = set(n for n in records.index_information()
+                       if n.startswith(prefix))
+        wanted = dict((prefix + f, f) for f in fields)
+        for name in existing - set(wanted):
+            records.drop_index(name)
+        for name, field in six.iteritems(wanted):
+            if name not in existing:
+                records.create_index([('head.' + field, 1), ('id', 1)],
+                                     name=name)
+
     def save_network(self, network):
+        self._check_index_fields(network.indexes)
         self._save('networks', network, self.id)
+        self._index_head_fields(network.indexes or [])
+        self._network_read(network)
 
     def save_node(self, node):
         self._save('nodes', node)
 
+    def _hydrate(self, messages):
+        """Set the payloads of messages stored by reference."""
+        hashes = [getattr(m, 'payload_hash', None) for m in messages]
+        hashes = set(h for h in hashes if h is not None)
+        payloads = {}
+        if hashes:
+            for row in self.session['payloads'].find(
+                    {'_id': {'$in': list(hashes)}}):
+                payloads[row['_id']] = row
+        for message in messages:
+            payload_hash = message.__dict__.pop('payload_hash', None)
+            if payload_hash is None:
+                continue
+            message._payload_hash = payload_hash
+            message.payload = payloads[payload_hash].get('payload')
+            message.payload_compressed = \
+                payloads[payload_hash].get('payload_compressed')
+            defer_decompression(message)
+        return messages
+
+    def _save_payload(self, payload_hash, message):
+        """Store a message's payload in the payloads collection, or mark
+        the stored copy used. Marking it stops purge_payloads deleting
+        it before the message is saved.
+
+        """
+        payloads = self.session['payloads']
+        used = sync.core.generate_datetime()
+        result = payloads.update_one({'_id': payload_hash},
+                                     {'$set': {'used': used}})
+        if result.matched_count:
+            return
+
+        compressed = compress_property(message, 'payload')
+        if compressed is None:
+            values = {'payload': message.payload}
+        else:
+            values = {'payload_compressed': Binary(compressed)}
+        payloads.update_one({'_id': payload_hash},
+                            {'$set': {'used': used}, '$setOnInsert': values},
+                            upsert=True)
+
     def save_message(self, message):
-        self._save('messages', message)
+        if 'payload' in (message.__dict__.get('_compressed') or {}):
+            # Unchanged since it was read, it needn't be hashed again.
+            payload_hash = getattr(message, '_payload_hash', None)
+        else:
+            payload_hash = hash_payload(message.payload)
+        compressed = None
+        if payload_hash is not None:
+            self._save_payload(payload_hash, message)
+        else:
+            compressed = compress_property(message, 'payload')
+        replace = {
+            'payload_hash': payload_hash,
+            'payload_compressed': None
+        }
+        if compressed is not None:
+            replace['payload_compressed'] = Binary(compressed)
+        if payload_hash is not None or compressed is not None:
+            replace['payload'] = None
+        self._save('messages', message, replace=replace)
 
     def save_change(self, change):
         self._save('changes', change)
 
     def save_record(self, record):
-        self._save('records', record)
+        compressed = compress_property(record, 'head')
+        replace = {'head_compressed': None}
+        if compressed is not None:
+            replace = {'head': None, 'head_compressed': Binary(compressed)}
+        self._save('records', record, replace=replace)
 
     def save_remote(self, remote):
         self._save('remotes', remote)
 
+    def bulk_insert(self, objects):
+        if not objects:
+            return
+        table = {
+            sync.Node: 'nodes',
+            sync.Record: 'records',
+            sync.Remote: 'remotes'
+        }[objects[0].__class__]
+        documents = []
+        for obj in objects:
+            values = obj.as_dict(True)
+            if table == 'records':
+                compressed = compress_property(obj, 'head')
+                values['head_compressed'] = None
+                if compressed is not None:
+                    values['head'] = None
+                    values['head_compressed'] = Binary(compressed)
+            documents.append(values)
+        self.session[table].insert_many(documents)
+
+    def save_latency(self, latency):
+        self._save('latencies', latency)
+
     def get_network(self):
-        return self._get_one('networks', {}, sync.Network)
+        return self._network_read(
+            self._get_one('networks', {}, sync.Network))
 
     def get_node(self, node_id):
         filter_ = {
@@ -168,9 +319,74 @@ class MongoStorage(Storage):
             filter_['state'] = state
             filter_['destination_id'] = destination_id
 
-        sort = [('timestamp', 1)]
+        sort = [('timestamp', 1), ('id', 1)]
 
-        return self._get_one('messages', filter_, sync.Message, sort)
+        message = self._get_one('messages', filter_, sync.Message, sort)
+        if message is None:
+            return None
+        return self._hydrate([message])[0]
+
+    def get_pending_messages(self, destination_id, record_id,
+                             with_for_update=False):
+        filter_ = {
+            'state': sync.State.Pending,
+            'destination_id': destination_id,
+            'record_id': record_id
+        }
+        sort = [('timestamp', 1), ('id', 1)]
+        return self._hydrate(
+            self._get_many('messages', filter_, sync.Message, sort))
+
+    def archive_messages(self, before, limit, purge=False):
+        messages = self.session['messages']
+        changes = self.session['changes']
+        filter_ = {
+            'state': {'$in': sync.State.Final},
+            'timestamp': {'$lt': before}
+        }
+        cursor = messages.find(filter_, sort=[('timestamp', 1), ('id', 1)])
+
+        # Skip messages that are still the parent of other messages.
+        batch = []
+        for row in cursor:
+            if messages.find_one({'parent_id': row['id']}) is None:
+                batch.append(row)
+                if len(batch) == limit:
+                    break
+        if not batch:
+            return 0
+
+        ids = [row['id'] for row in batch]
+        if not purge:
+            rows = list(changes.find({'message_id': {'$in': ids}}))
+            if rows:
+                self.session['changes_archive'].insert_many(rows)
+            self.session['messages_archive'].insert_many(batch)
+        self.session['latencies'].delete_many({'$or': [
+            {'message_id': {'$in': ids}},
+            {'parent_id': {'$in': ids}}
+        ]})
+        changes.delete_many({'message_id': {'$in': ids}})
+        messages.delete_many({'id': {'$in': ids}})
+        return len(batch)
+
+    def purge_payloads(self, before, limit):
+        payloads = self.session['payloads']
+        unused = []
+        for row in payloads.find({'used': {'$lt': before}}, ['_id']):
+            filter_ = {'payload_hash': row['_id']}
+            if self.session['messages'].find_one(filter_) is None and \
+               self.session['messages_archive'].find_one(filter_) is None:
+                unused.append(row['_id'])
+                if len(unused) == limit:
+                    break
+        if not unused:
+            return 0
+        # The time is checked again, a payload saved since it was found
+        # is kept.
+        result = payloads.delete_many({'_id': {'$in': unused},
+                                       'used': {'$lt': before}})
+        return result.deleted_count
 
     def get_message_count(self, destination_id=None, state=sync.State.Pending):
         filter_ = {}
@@ -179,6 +395,36 @@ class MongoStorage(Storage):
         count = self.session['messages'].find(filter_).count()
         return count
 
+    def get_pending_summary(self):
+        # Grouped by destination in one query, rather than a query for
+        # each destination.
+        rows = self.session['messages'].aggregate([
+            {'$match': {
+                'state': sync.State.Pending,
+                'destination_id': {'$ne': None}
+            }},
+            {'$sort': {'timestamp': 1}},
+            # Messages are counted by summing a field set to 1, rather
+            # than with {'$sum': 1} or $literal, which mongomock lacks.
+            {'$project': {
+                'destination_id': 1,
+                'timestamp': 1,
+                'one': {'$abs': 1}
+            }},
+            {'$group': {
+                '_id': '$destination_id',
+                'count': {'$sum': '$one'},
+                'oldest': {'$first': '$timestamp'}
+            }}
+        ])
+        result = {}
+        for row in rows:
+            result[row['_id']] = {
+                'count': row['count'],
+                'oldest': row['oldest']
+            }
+        return result
+
     def get_record(self, record_id):
         filter_ = {
             'id': record_id
@@ -216,19 +462,63 @@ class MongoStorage(Storage):
         }
         return self._get_many('remotes', filter_, sync.Remote)
 
+    def get_node_remotes(self, node_id, remote_ids):
+        filter_ = {
+            'node_id': node_id,
+            'remote_id': {
+                '$in': list(remote_ids)
+            }
+        }
+        return self._get_many('remotes', filter_, sync.Remote)
+
+    def get_all_node_remotes(self, node_id):
+        filter_ = {
+            'node_id': node_id,
+            'remote_id': {
+                '$ne': None
+            }
+        }
+        rows = self.session['remotes'].find(
+            filter_, batch_size=_RECORD_BATCH_SIZE)
+
+        chunk = []
+        for row in rows:
+            obj = sync.Remote()
+            for key in row.keys():
+                if not key == '_id':
+                    setattr(obj, key, row[key])
+            chunk.append(obj)
+            if len(chunk) == _RECORD_BATCH_SIZE:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
     def get_nodes(self):
         return self._get_many('nodes', {}, sync.Node)
 
+    def get_records_by_id(self, record_ids):
+        filter_ = {
+            'id': {
+                '$in': list(record_ids)
+            }
+        }
+        return self._get_many('records', filter_, sync.Record)
+
     def get_records(self):
         """Fetch all records using a generator.
+
+        Batches are read in _id order, each query starting after the
+        previous batch, so reading every record takes one query per
+        batch however many records there are.
+
         :returns: Batches of records.
         :rtype: generator
+
         """
         filter_ = {
             'deleted': False
         }
-        skip = 0
-        limit = 1
 
         while True:
             # Use a dictionary so that the associated remote objects
@@ -236,20 +526,23 @@ class MongoStorage(Storage):
             # 'record.remotes' object cache.
             results = {}
 
-            # Fetch a batch of records.
-            rows = self.session['records'].find(filter_, skip=skip,
-                                                limit=limit)
-            skip = skip + limit
+            # Fetch a batch of records, continuing after the last _id
+            # of the previous batch rather than skipping the records
+            # already read.
+            rows = self.session['records'].find(
+                filter_, sort=[('_id', 1)], limit=_RECORD_BATCH_SIZE)
             chunk = []
             for row in rows:
+                last_id = row['_id']
                 obj = sync.Record()
                 for key in row.keys():
                     if not key == '_id':
                         setattr(obj, key, row[key])
-                chunk.append(obj)
+                chunk.append(defer_decompression(obj))
 
             if len(chunk) == 0:
                 break
+            filter_['_id'] = {'$gt': last_id}
 
             for obj in chunk:
                 results[obj.id] = obj
@@ -265,12 +558,31 @@ class MongoStorage(Storage):
 
             yield results.values()
 
+    def find_records(self, filters, limit, cursor=None):
+        filter_ = {
+            'deleted': False
+        }
+        for field, op, value in filters:
+            # Like Postgres, Mongo only compares values of the same
+            # type. Unlike it, an array containing a match matches.
+            filter_.setdefault('head.' + field, {})['$' + op] = value
+        if cursor is not None:
+            filter_['id'] = {'$gt': cursor}
+        return self._get_many('records', filter_, sync.Record,
+                              sort=[('id', 1)], limit=limit)
+
     def get_changes(self, message_id):
         filter_ = {
             'message_id': message_id
         }
         return self._get_many('changes', filter_, sync.Change)
 
+    def get_latencies(self, since=None):
+        filter_ = {}
+        if since is not None:
+            filter_['timestamp'] = {'$gte': since}
+        return self._get_many('latencies', filter_, sync.Latency)
+
     def update_messages(self, node_id, record_id, remote_id):
         filter_ = {
             'destination_id': node_id,
@@ -1,15 +1,88 @@
+import binascii
+import datetime
+import io
+import json
+import operator
+
+import six
 import sqlalchemy as sqla
 
 from sqlalchemy.dialects import postgresql
 from sqlalchemy.exc import OperationalError
-from sqlalchemy_utils import create_database, drop_database
 
 import sync
 
 from sync import settings
-from sync import Text
+from sync import Operator, Text
 from sync.exceptions import DatabaseNotFoundError
-from sync.storage.base import Storage
+from sync.storage.base import (compress_property, defer_decompression,
+                               hash_payload, json_type, Storage)
+
+
+# Indexes since replaced, dropped when a network is migrated.
+_REPLACED_INDEXES = ['ix_messages_destination_state_timestamp']
+
+# The advisory lock migrate holds, so migrations of the same network
+# database run one at a time.
+_MIGRATE_LOCK = 7261
+
+_COMPARISONS = {
+    Operator.Equal: operator.eq,
+    Operator.GreaterThan: operator.gt,
+    Operator.GreaterThanOrEqual: operator.ge,
+    Operator.LessThan: operator.lt,
+    Operator.LessThanOrEqual: operator.le
+}
+
+# Applies a JSON merge patch (RFC 7396) to a JSONB value, as
+# sync.core.merge_patch does, so records can be patched in place.
+MERGE_PATCH_FUNCTION = """
+CREATE OR REPLACE FUNCTION sync_merge_patch(target jsonb, patch jsonb)
+RETURNS jsonb AS $$
+DECLARE
+    result jsonb;
+    item record;
+BEGIN
+    IF jsonb_typeof(patch) IS DISTINCT FROM 'object' THEN
+        RETURN patch;
+    END IF;
+    IF jsonb_typeof(target) IS DISTINCT FROM 'object' THEN
+        result := '{}'::jsonb;
+    ELSE
+        result := target;
+    END IF;
+    FOR item IN SELECT key, value FROM jsonb_each(patch) LOOP
+        IF jsonb_typeof(item.value) = 'null' THEN
+            result := result - item.key;
+        ELSE
+            result := result || jsonb_build_object(
+                item.key, sync_merge_patch(result -> item.key, item.value));
+        END IF;
+    END LOOP;
+    RETURN result;
+END;
+$$ LANGUAGE plpgsql IMMUTABLE
+"""
+
+
+def _copy_value(column, value):
+    """Format a value in COPY's text format."""
+    if value is None:
+        return '\\N'
+    if isinstance(column.type, sqla.LargeBinary):
+        value = '\\x' + binascii.hexlify(value).decode('ascii')
+    elif isinstance(column.type, postgresql.JSON):
+        value = json.dumps(value)
+    elif isinstance(value, bool):
+        value = 't' if value else 'f'
+    elif isinstance(value, datetime.datetime):
+        value = value.isoformat()
+    elif isinstance(value, bytes):
+        value = value.decode('utf-8')
+    else:
+        value = six.text_type(value)
+    return (value.replace('\\', '\\\\').replace('\t', '\\t')
+            .replace('\n', '\\n').replace('\r', '\\r'))
 
 
 class PostgresStorage(Storage):
@@ -36,7 +109,7 @@ class PostgresStorage(Storage):
         for key in record.keys():
             setattr(obj, key, record[key])
 
-        return obj
+        return defer_decompression(obj)
 
     def _get_many(self, query, class_):
         rows = self.connection.execute(query)
@@ -47,20 +120,21 @@ class PostgresStorage(Storage):
             obj = class_()
             for key in row.keys():
                 setattr(obj, key, row[key])
-            results.append(obj)
+            results.append(defer_decompression(obj))
 
         return results
 
-    def _save(self, table, obj, override_id=False):
+    def _save(self, table, obj, override_id=False, replace=None):
         values = obj.as_dict(False)
         keep = {}
         for key in values.keys():
             if key in table.columns.keys():
                 keep[key] = values[key]
         values = keep
+        values.update(replace or {})
 
         if not hasattr(obj, 'id') or obj.id is None:
-            obj.id = override_id or sync.generate_id()
+            obj.id = override_id or self._generate_id()
             values['id'] = obj.id
             op = sqla.insert(table)
             op = op.values(values)
@@ -71,6 +145,75 @@ class PostgresStorage(Storage):
 
         self.connection.execute(op)
 
+    def migrate(self):
+        self.start_transaction()
+        try:
+            self.connection.execute(
+                sqla.text('SELECT pg_advisory_xact_lock(:key)'),
+                key=_MIGRATE_LOCK)
+            self._migrate()
+            self.commit()
+        except Exception:
+            self.rollback()
+            raise
+
+    def _migrate(self):
+        """Create tables, columns, indexes and functions added since the
+        network's database was created, drop indexes since replaced,
+        convert JSON columns since changed to JSONB and allow nulls in
+        columns since made nullable.
+
+        """
+        self.metadata.create_all(bind=self.connection)
+        existing = dict(((row[0], row[1]), (row[2], row[3]))
+                        for row in self.connection.execute(
+            'SELECT table_name, column_name, data_type, is_nullable '
+            'FROM information_schema.columns '
+            'WHERE table_schema = current_schema()'))
+        dialect = self.engine.dialect
+        for table in self.metadata.sorted_tables:
+            for column in table.columns:
+                data_type, is_nullable = existing.get(
+                    (table.name, column.name), (None, None))
+                if data_type == 'json' and \
+                   isinstance(column.type, postgresql.JSONB):
+                    self.connection.execute(
+                        'ALTER TABLE {0} ALTER COLUMN {1} TYPE jsonb '
+                        'USING {1}::jsonb'.format(table.name, column.name))
+                if is_nullable == 'NO' and column.nullable and \
+                   not column.primary_key:
+                    self.connection.execute(
+                        'ALTER TABLE {0} ALTER COLUMN {1} '
+                        'DROP NOT NULL'.format(table.name, column.name))
+                if data_type is not None:
+                    continue
+                definition = column.type.compile(dialect=dialect)
+                if column.server_default is not None:
+                    definition += ' NOT NULL DEFAULT {0}'.format(
+                        column.server_default.arg.compile(dialect=dialect))
+                self.connection.execute(
+                    'ALTER TABLE {0} ADD COLUMN {1} {2}'.format(
+                        table.name, dialect.identifier_preparer.quote(
+                            column.name), definition))
+            for index in table.indexes:
+                columns = ', '.join(c.name for c in index.columns)
+                self.connection.execute(
+                    'CREATE INDEX IF NOT EXISTS {0} ON {1} ({2})'.format(
+                        index.name, table.name, columns))
+        for name in _REPLACED_INDEXES:
+            self.connection.execute('DROP INDEX IF EXISTS {0}'.format(name))
+        self.connection.execute(MERGE_PATCH_FUNCTION)
+
+    def _archive_table(self, name, table, *args):
+        """Define a table with the columns of another, without foreign
+        keys, to archive its rows.
+
+        """
+        columns = [sqla.Column(c.name, c.type, primary_key=c.primary_key,
+                               nullable=c.nullable)
+                   for c in table.columns]
+        return sqla.Table(name, self.metadata, *(columns + list(args)))
+
     def _connect(self):
         self.connection = self.engine.connect()
         self.metadata = sqla.MetaData(bind=self.engine)
@@ -91,9 +234,28 @@ class PostgresStorage(Storage):
                 sqla.types.Boolean,
                 default=True,
                 nullable=False),
+            sqla.Column(
+                "coalesce",
+                sqla.types.Boolean,
+                default=False,
+                server_default=sqla.false(),
+                nullable=False),
             sqla.Column(
                 "schema",
                 postgresql.JSON,
+                nullable=False),
+            sqla.Column(
+                "indexes",
+                postgresql.ARRAY(sqla.types.String),
+                default=[],
+                server_default=sqla.text("'{}'"),
+                nullable=False),
+            sqla.Column(
+                "id_format",
+                sqla.types.String,
+                default=sync.IdFormat.UUID4,
+                server_default=sqla.text(
+                    "'{0}'".format(sync.IdFormat.UUID4)),
                 nullable=False))
 
         self.node_table = sqla.Table(
@@ -158,7 +320,7 @@ class PostgresStorage(Storage):
                 nullable=False),
             sqla.Column(
                 "payload",
-                postgresql.JSON,
+                postgresql.JSONB,
                 nullable=True),
             sqla.Column(
                 "remote_id",
@@ -171,7 +333,51 @@ class PostgresStorage(Storage):
             sqla.Column(
                 "state",
                 sqla.types.String,
-                nullable=False))
+                nullable=False),
+            # Set when the payload is in the payloads table.
+            sqla.Column(
+                "payload_hash",
+                sqla.types.String,
+                nullable=True),
+            # Set, instead of payload, when the payload is compressed.
+            sqla.Column(
+                "payload_compressed",
+                sqla.LargeBinary,
+                nullable=True),
+            sqla.Column(
+                "record_hash",
+                sqla.types.String,
+                nullable=True),
+            # Serves fetching the next message and pending counts.
+            sqla.Index(
+                "ix_messages_destination_state_timestamp_id",
+                "destination_id", "state", "timestamp", "id"),
+            # Serve finding messages to archive and their children.
+            sqla.Index(
+                "ix_messages_state_timestamp",
+                "state", "timestamp"),
+            sqla.Index("ix_messages_parent_id", "parent_id"),
+            sqla.Index("ix_messages_payload_hash", "payload_hash"))
+
+        self.payload_table = sqla.Table(
+            "payloads", self.metadata,
+            sqla.Column(
+                "hash",
+                sqla.types.String,
+                primary_key=True),
+            sqla.Column(
+                "payload",
+                postgresql.JSONB,
+                nullable=True),
+            sqla.Column(
+                "payload_compressed",
+                sqla.LargeBinary,
+                nullable=True),
+            sqla.Column(
+                "used",
+                sqla.DateTime,
+                nullable=False),
+            sqla.Index("ix_payloads_used", "used"))
 
         self.change_table = sqla.Table(
             "changes", self.metadata,
@@ -195,7 +401,15 @@ class PostgresStorage(Storage):
             sqla.Column(
                 "note",
                 sqla.Text,
-                nullable=True))
+                nullable=True),
+            sqla.Index("ix_changes_message_id", "message_id"))
+
+        self.message_archive_table = self._archive_table(
+            "messages_archive", self.message_table,
+            sqla.Index("ix_messages_archive_payload_hash", "payload_hash"))
+        self.change_archive_table = self._archive_table(
+            "changes_archive", self.change_table,
+            sqla.Index("ix_changes_archive_message_id", "message_id"))
 
         self.record_table = sqla.Table(
             "records", self.metadata,
@@ -214,7 +428,16 @@ class PostgresStorage(Storage):
                 nullable=False),
             sqla.Column(
                 "head",
-                postgresql.JSON,
+                postgresql.JSONB,
+                nullable=True),
+            # Set, instead of head, when the head is compressed.
+            sqla.Column(
+                "head_compressed",
+                sqla.LargeBinary,
+                nullable=True),
+            sqla.Column(
+                "hash",
+                sqla.types.String,
                 nullable=True))
 
         self.remote_table = sqla.Table(
@@ -228,18 +451,74 @@ class PostgresStorage(Storage):
                 postgresql.UUID,
                 sqla.ForeignKey("nodes.id"),
                 nullable=True),
+            # Null when the remote only records the version delivered.
             sqla.Column(
                 "remote_id",
                 sqla.types.String,
-                nullable=False),
+                nullable=True),
             sqla.Column(
                 "record_id",
                 postgresql.UUID,
                 sqla.ForeignKey("records.id"),
-                nullable=True))
+                nullable=True),
+            sqla.Column(
+                "hash",
+                sqla.types.String,
+                nullable=True),
+            # Serves finding a node's records by their remote ids.
+            sqla.Index("ix_remotes_node_id_remote_id",
+                       "node_id", "remote_id"),
+            # Serves reading the remotes of a batch of records.
+            sqla.Index("ix_remotes_record_id", "record_id"))
+
+        self.latency_table = sqla.Table(
+            "latencies", self.metadata,
+            sqla.Column(
+                "id",
+                postgresql.UUID,
+                primary_key=True),
+            sqla.Column(
+                "message_id",
+                postgresql.UUID,
+                sqla.ForeignKey("messages.id"),
+                nullable=False),
+            sqla.Column(
+                "parent_id",
+                postgresql.UUID,
+                sqla.ForeignKey("messages.id"),
+                nullable=False),
+            sqla.Column(
+                "destination_id",
+                postgresql.UUID,
+                sqla.ForeignKey("nodes.id"),
+                nullable=False),
+            sqla.Column(
+                "timestamp",
+                sqla.DateTime,
+                nullable=False),
+            sqla.Column(
+                "fan_out",
+                sqla.Float,
+                nullable=False),
+            sqla.Column(
+                "fetch",
+                sqla.Float,
+                nullable=False),
+            sqla.Column(
+                "acknowledge",
+                sqla.Float,
+                nullable=False),
+            sqla.Column(
+                "total",
+                sqla.Float,
+                nullable=False),
+            # Serves reports over a recent window.
+            sqla.Index("ix_latencies_timestamp", "timestamp"))
 
+        # The schema of an existing database is assumed to be current,
+        # migrate is run when deploying rather than by each process.
         if create_db:
-            self.metadata.create_all()
+            self.migrate()
 
     def connect(self, create_db=False):
         self.base_url = settings.POSTGRES_CONNECTION
@@ -260,6 +539,8 @@ class PostgresStorage(Storage):
             if not create_db:
                 raise DatabaseNotFoundError()
 
+            # Imported here as it is slow to load and rarely needed.
+            from sqlalchemy_utils import create_database
             create_database(self.engine.url)
 
             self._connect()
@@ -270,6 +551,7 @@ class PostgresStorage(Storage):
         self.connection.close()
 
     def drop(self):
+        from sqlalchemy_utils import drop_database
         drop_database(self.engine.url)
 
     def start_transaction(self):
@@ -284,28 +566,168 @@ class PostgresStorage(Storage):
         tran = self.trans.pop(-1)
         tran.rollback()
 
+    def _index_head_fields(self, fields):
+        """Create an expression index on records for each head field,
+        with the id to order pages, and drop those of other fields.
+
+        """
+        prefix = 'ix_records_head_'
+        existing = set(row[0] for row in self.connection.execute(
+            sqla.text("SELECT indexname FROM pg_indexes "
+                      "WHERE schemaname = current_schema() "
+                      "AND tablename = 'records'")))
+        existing = set(n for n in existing if n.startswith(prefix))
+        wanted = dict((prefix + f, f) for f in fields)
+        quote = self.engine.dialect.identifier_preparer.quote
+        for name in existing - set(wanted):
+            self.connection.execute('DROP INDEX {0}'.format(quote(name)))
+        for name, field in six.iteritems(wanted):
+            if name in existing:
+                continue
+            # The field name is a literal in the index expression,
+            # save_network only allows word characters in it.
+            self.connection.execute(
+                "CREATE INDEX {0} ON records ((head -> '{1}'), id)".format(
+                    quote(name), field))
+
     def save_network(self, network):
+        self._check_index_fields(network.indexes)
         self._save(self.network_table, network, self.id)
+        self._index_head_fields(network.indexes or [])
+        self._network_read(network)
 
     def save_node(self, node):
         self._save(self.node_table, node)
 
+    def _message_select(self):
+        """Select messages with payloads stored by reference joined in."""
+        messages = self.message_table
+        payloads = self.payload_table
+        columns = [c for c in messages.columns if c.name not in
+                   ('payload', 'payload_hash', 'payload_compressed')]
+        columns.append(sqla.func.coalesce(
+            messages.c.payload, payloads.c.payload).label('payload'))
+        columns.append(sqla.func.coalesce(
+            messages.c.payload_compressed,
+            payloads.c.payload_compressed).label('payload_compressed'))
+        columns.append(messages.c.payload_hash.label('_payload_hash'))
+        return sqla.select(columns).select_from(messages.outerjoin(
+            payloads, messages.c.payload_hash == payloads.c.hash))
+
+    def _save_payload(self, payload_hash, message):
+        """Store a message's payload in the payloads table, or mark the
+        stored copy used. Marking it stops purge_payloads deleting it
+        before the message is committed.
+
+        """
+        table = self.payload_table
+        used = sync.core.generate_datetime()
+        op = table.update().values(used=used)
+        op = op.where(table.c.hash == payload_hash)
+        if self.connection.execute(op).rowcount:
+            return
+
+        compressed = compress_property(message, 'payload')
+        self.connection.execute(sqla.text(
+            'INSERT INTO payloads (hash, payload, payload_compressed, used) '
+            'VALUES (:hash, :payload, :payload_compressed, :used) '
+            'ON CONFLICT (hash) DO UPDATE SET used = excluded.used'
+        ).bindparams(sqla.bindparam('payload', type_=postgresql.JSONB),
+                     sqla.bindparam('payload_compressed',
+                                    type_=sqla.LargeBinary)),
+            hash=payload_hash, used=used, payload_compressed=compressed,
+            payload=message.payload if compressed is None else None)
+
     def save_message(self, message):
-        self._save(self.message_table, message)
+        if 'payload' in (message.__dict__.get('_compressed') or {}):
+            # Unchanged since it was read, it needn't be hashed again.
+            payload_hash = getattr(message, '_payload_hash', None)
+        else:
+            payload_hash = hash_payload(message.payload)
+        compressed = None
+        if payload_hash is not None:
+            self._save_payload(payload_hash, message)
+        else:
+            compressed = compress_property(message, 'payload')
+        replace = {
+            'payload_hash': payload_hash,
+            'payload_compressed': compressed
+        }
+        if payload_hash is not None or compressed is not None:
+            # A SQL NULL rather than JSON null, so it is coalesced.
+            replace['payload'] = sqla.null()
+        self._save(self.message_table, message, replace=replace)
 
     def save_change(self, change):
         self._save(self.change_table, change)
 
     def save_record(self, record):
-        self._save(self.record_table, record)
+        replace = {'head_compressed': compress_property(record, 'head')}
+        if replace['head_compressed'] is not None:
+            replace['head'] = None
+        self._save(self.record_table, record, replace=replace)
+
+    def patch_record(self, record, patch):
+        if record.id is None or \
+           compress_property(record, 'head') is not None:
+            return self.save_record(record)
+        table = self.record_table
+        head = sqla.func.sync_merge_patch(
+            table.c.head, sqla.bindparam('patch', patch,
+                                         type_=postgresql.JSONB),
+            type_=postgresql.JSONB)
+        op = table.update().values(head=head, hash=record.hash,
+                                   last_updated=record.last_updated)
+        # A head stored compressed is patched in Python instead.
+        op = op.where(sqla.and_(table.c.id == record.id,
+                                table.c.head_compressed.is_(None)))
+        if not self.connection.execute(op).rowcount:
+            self.save_record(record)
 
     def save_remote(self, remote):
         self._save(self.remote_table, remote)
 
+    def bulk_insert(self, objects):
+        if not objects:
+            return
+        table = {
+            sync.Node: self.node_table,
+            sync.Record: self.record_table,
+            sync.Remote: self.remote_table
+        }[objects[0].__class__]
+        columns = list(table.columns)
+
+        # Loaded with COPY, through the connection's current
+        # transaction.
+        data = io.BytesIO()
+        for obj in objects:
+            values = obj.as_dict(True)
+            if table is self.record_table:
+                compressed = compress_property(obj, 'head')
+                values['head_compressed'] = compressed
+                if compressed is not None:
+                    values['head'] = None
+            line = '\t'.join(_copy_value(c, values.get(c.name))
+                              for c in columns)
+            data.write((line + '\n').encode('utf-8'))
+        data.seek(0)
+
+        quote = self.engine.dialect.identifier_preparer.quote
+        cursor = self.connection.connection.cursor()
+        try:
+            cursor.copy_expert('COPY {0} ({1}) FROM STDIN'.format(
+                table.name, ', '.join(quote(c.name) for c in columns)),
+                data)
+        finally:
+            cursor.close()
+
+    def save_latency(self, latency):
+        self._save(self.latency_table, latency)
+
     def get_network(self):
         query = sqla.select([self.network_table])
 
-        return self._get_one(query, sync.Network)
+        return self._network_read(self._get_one(query, sync.Network))
 
     def get_node(self, node_id):
         table = self.node_table
@@ -318,7 +740,7 @@ class PostgresStorage(Storage):
                     state=sync.State.Pending,
                     with_for_update=False):
         table = self.message_table
-        query = table.select()
+        query = self._message_select()
 
         if message_id is not None:
             query = query.where(table.c.id == message_id)
@@ -327,20 +749,106 @@ class PostgresStorage(Storage):
                 table.c.state == state,
                 table.c.destination_id == destination_id))
 
-        query = query.order_by(table.c.timestamp)
+        query = query.order_by(table.c.timestamp, table.c.id)
+        if with_for_update:
+            query = query.with_for_update(of=table)
+
+        return self._get_one(query, sync.Message)
 
-        return self._get_one(query, sync.Message, with_for_update)
+    def get_pending_messages(self, destination_id, record_id,
+                             with_for_update=False):
+        table = self.message_table
+        query = self._message_select()
+        query = query.where(sqla.and_(
+            table.c.state == sync.State.Pending,
+            table.c.destination_id == destination_id,
+            table.c.record_id == record_id))
+        query = query.order_by(table.c.timestamp, table.c.id)
+        if with_for_update:
+            query = query.with_for_update(of=table)
+
+        return self._get_many(query, sync.Message)
+
+    def archive_messages(self, before, limit, purge=False):
+        messages = self.message_table
+        changes = self.change_table
+        children = messages.alias('children')
+
+        query = sqla.select([messages.c.id])
+        query = query.where(sqla.and_(
+            messages.c.state.in_(sync.State.Final),
+            messages.c.timestamp < before,
+            ~sqla.exists().where(children.c.parent_id == messages.c.id)))
+        query = query.order_by(messages.c.timestamp, messages.c.id)
+        query = query.limit(limit)
+        ids = [row[0] for row in self.connection.execute(query)]
+        if not ids:
+            return 0
+
+        if not purge:
+            self.connection.execute(
+                self.change_archive_table.insert().from_select(
+                    [c.name for c in changes.columns],
+                    changes.select().where(changes.c.message_id.in_(ids))))
+            self.connection.execute(
+                self.message_archive_table.insert().from_select(
+                    [c.name for c in messages.columns],
+                    messages.select().where(messages.c.id.in_(ids))))
+        latencies = self.latency_table
+        self.connection.execute(latencies.delete().where(sqla.or_(
+            latencies.c.message_id.in_(ids),
+            latencies.c.parent_id.in_(ids))))
+        self.connection.execute(
+            changes.delete().where(changes.c.message_id.in_(ids)))
+        self.connection.execute(
+            messages.delete().where(messages.c.id.in_(ids)))
+        return len(ids)
+
+    def purge_payloads(self, before, limit):
+        payloads = self.payload_table
+        used = sqla.and_(
+            payloads.c.used < before,
+            ~sqla.exists().where(
+                self.message_table.c.payload_hash == payloads.c.hash),
+            ~sqla.exists().where(
+                self.message_archive_table.c.payload_hash == payloads.c.hash))
+        query = sqla.select([payloads.c.hash]).where(used).limit(limit)
+        # The time is checked again by the delete, a payload saved while
+        # the batch was selected is kept.
+        op = payloads.delete().where(sqla.and_(
+            payloads.c.hash.in_(query),
+            payloads.c.used < before))
+        return self.connection.execute(op).rowcount
 
     def get_message_count(self, destination_id=None, state=sync.State.Pending):
         table = self.message_table
-        query = table.select()
+        query = sqla.select([sqla.func.count()]).select_from(table)
 
         query = query.where(sqla.and_(
             table.c.state == state,
             table.c.destination_id == destination_id))
 
-        rows = self.connection.execute(query)
-        return rows.rowcount
+        return self.connection.execute(query).scalar()
+
+    def get_pending_summary(self):
+        table = self.message_table
+        query = sqla.select([
+            table.c.destination_id,
+            sqla.func.count().label('count'),
+            sqla.func.min(table.c.timestamp).label('oldest')])
+
+        query = query.where(sqla.and_(
+            table.c.state == sync.State.Pending,
+            table.c.destination_id.isnot(None)))
+        query = query.group_by(table.c.destination_id)
+
+        result = {}
+        for row in self.connection.execute(query):
+            result[row['destination_id']] = {
+                'count': row['count'],
+                'oldest': row['oldest']
+            }
+        return result
 
     def get_record(self, record_id):
         table = self.record_table
@@ -379,12 +887,58 @@ class PostgresStorage(Storage):
 
         return self._get_many(query, sync.Remote)
 
+    def get_node_remotes(self, node_id, remote_ids):
+        table = self.remote_table
+        query = table.select()
+        query = query.where(sqla.and_(table.c.node_id == node_id,
+                                      table.c.remote_id.in_(remote_ids)))
+
+        return self._get_many(query, sync.Remote)
+
+    def get_all_node_remotes(self, node_id):
+        connection = None
+        try:
+            # As in get_records, stream the remotes over a second
+            # connection.
+            engine = sqla.create_engine(self.engine.url)
+            connection = engine.connect()
+
+            table = self.remote_table
+            query = table.select()
+            query = query.where(sqla.and_(table.c.node_id == node_id,
+                                          table.c.remote_id.isnot(None)))
+            result = (connection.execution_options(stream_results=True)
+                      .execute(query))
+
+            while True:
+                chunk = result.fetchmany(1000)
+                if not chunk:
+                    break
+
+                remotes = []
+                for row in chunk:
+                    obj = sync.Remote()
+                    for key in row.keys():
+                        setattr(obj, key, row[key])
+                    remotes.append(obj)
+                yield remotes
+        finally:
+            if connection is not None:
+                connection.close()
+
     def get_nodes(self):
         table = self.node_table
         query = table.select()
 
         return self._get_many(query, sync.Node)
 
+    def get_records_by_id(self, record_ids):
+        table = self.record_table
+        query = table.select()
+        query = query.where(table.c.id.in_(record_ids))
+
+        return self._get_many(query, sync.Record)
+
     def get_records(self):
         """Fetch all records using a generator.
 
@@ -428,7 +982,7 @@ class PostgresStorage(Storage):
                     obj = sync.Record()
                     for key in row.keys():
                         setattr(obj, key, row[key])
-                    results[obj.id] = obj
+                    results[obj.id] = defer_decompression(obj)
 
                 # Efficiently fetch the associated remote objects for
                 # this batch of records.
@@ -444,6 +998,23 @@ class PostgresStorage(Storage):
             if connection is not None:
                 connection.close()
 
+    def find_records(self, filters, limit, cursor=None):
+        table = self.record_table
+        query = table.select()
+        query = query.where(table.c.deleted == False)  # noqa
+        for field, op, value in filters:
+            # Matches the expression _index_head_fields indexes.
+            column = table.c.head[field]
+            query = query.where(_COMPARISONS[op](
+                column, sqla.literal(value, postgresql.JSONB)))
+            if op != Operator.Equal:
+                query = query.where(
+                    sqla.func.jsonb_typeof(column) == json_type(value))
+        if cursor is not None:
+            query = query.where(table.c.id > cursor)
+        query = query.order_by(table.c.id).limit(limit)
+        return self._get_many(query, sync.Record)
+
     def get_changes(self, message_id):
         table = self.change_table
         query = table.select()
@@ -451,6 +1022,14 @@ class PostgresStorage(Storage):
 
         return self._get_many(query, sync.Change)
 
+    def get_latencies(self, since=None):
+        table = self.latency_table
+        query = table.select()
+        if since is not None:
+            query = query.where(table.c.timestamp >= since)
+
+        return self._get_many(query, sync.Latency)
+
     def update_messages(self, node_id, record_id, remote_id):
         table = self.message_table
         op = sqla.update(table)
@@ -1,9 +1,15 @@
+import time
+
 from multiprocessing import Process
 
 import sync
 
-from sync import settings
-from sync.storage import init_storage
+from sync import instrument, logs, profiling, settings, Stage
+from sync.storage import init_storage, log_queries
+
+
+# Setup a module level logger.
+logger = logs.get_logger(__name__)
 
 
 def run(fun, args):
@@ -15,7 +21,7 @@ def run(fun, args):
     :type args: tuple
 
     """
-    if settings.STORAGE_CLASS == 'MockStorage':
+    if settings.STORAGE_CLASS == 'MockStorage' or settings.TASKS_INLINE:
         # In memory storage can not be shared between processes.
         fun(*args)
         return
@@ -28,15 +34,29 @@ def _call_close():
     this is mocked.
 
     """
-    if settings.STORAGE_CLASS == 'MockStorage':
+    if settings.STORAGE_CLASS == 'MockStorage' or settings.TASKS_INLINE:
         # Do not need to close as a new process was not spawned during
         # run.
         return
     sync.close()
 
 
+def _init_storage(network_id):
+    """Connect to the network's storage unless running inline, in which
+    case the caller's storage object is already in use.
+
+    """
+    if settings.TASKS_INLINE:
+        return
+    logs.configure()
+    init_storage(network_id, False)
+
+
+@instrument.timed(Stage.TaskNodeSync)
+@profiling.profiled('node_sync')
 def node_sync(network_id, node_id):
-    """Resend all records to a node.
+    """Resend records to a node, skipping those it acknowledged the
+    current version of.
 
     :param network_id: Unique identifier of the network.
     :type network_id: str
@@ -44,24 +64,36 @@ def node_sync(network_id, node_id):
     :type node_id: str
     """
     try:
-        init_storage(network_id, False)
-
-        node = sync.Node.get(node_id)
-        for batch in sync.Record.get_all():
-            for record in batch:
-                remote = record.remote(node.id)
-                remote_id = None
-                if remote is not None:
-                    remote_id = getattr(remote, 'remote_id', None)
-                sync.Message.send(None, sync.Method.Create,
-                                  record.head, parent_id=None,
-                                  destination_id=node.id,
-                                  record_id=record.id,
-                                  remote_id=remote_id)
+        _init_storage(network_id)
+
+        with log_queries('node_sync'):
+            node = sync.Node.get(node_id)
+            sent = skipped = 0
+            for batch in sync.Record.get_all():
+                for record in batch:
+                    remote = record.remote(node.id)
+                    remote_id = None
+                    if remote is not None:
+                        if record.hash is not None and \
+                           getattr(remote, 'hash', None) == record.hash:
+                            skipped += 1
+                            continue
+                        remote_id = getattr(remote, 'remote_id', None)
+                    sync.Message.send(None, sync.Method.Create,
+                                      record.head, parent_id=None,
+                                      destination_id=node.id,
+                                      record_id=record.id,
+                                      remote_id=remote_id,
+                                      record_hash=record.hash)
+                    sent += 1
+            logger.info('Sync of node %s sent %d records, skipped %d '
+                        'already delivered', node_id, sent, skipped)
     finally:
         _call_close()
 
 
+@instrument.timed(Stage.TaskMessagePropagate)
+@profiling.profiled('message_propagate')
 def message_propagate(network_id, message):
     """Propagate a message to all the other nodes in the network.
 
@@ -72,16 +104,66 @@ def message_propagate(network_id, message):
 
     """
     try:
-        init_storage(network_id, False)
+        _init_storage(network_id)
+
+        with log_queries('message_propagate'):
+            nodes = sync.Node.get()
 
-        nodes = sync.Node.get()
+            for node in [n for n in nodes
+                         if n.id != message.origin_id and n.read]:
+                remote = sync.Remote.get(node.id,
+                                         record_id=message.record_id)
+                remote_id = remote.remote_id if remote else None
+
+                sync.Message.send(None, message.method, message.payload,
+                                  message.id, node.id, message.record_id,
+                                  remote_id, message.record_hash)
+    finally:
+        _call_close()
 
-        for node in [n for n in nodes if n.id != message.origin_id and n.read]:
-            remote = sync.Remote.get(node.id, record_id=message.record_id)
-            remote_id = remote.remote_id if remote else None
 
-            sync.Message.send(None, message.method, message.payload,
-                              message.id, node.id, message.record_id,
-                              remote_id)
+@instrument.timed(Stage.TaskRetention)
+@profiling.profiled('retention')
+def retention(network_id, before):
+    """Archive, or purge, messages in a final state sent before a time,
+    then delete the stored payloads they no longer need. Both are done
+    in batches of settings.RETENTION_BATCH_SIZE with a pause of
+    settings.RETENTION_PAUSE between them.
+
+    :param network_id: Unique identifier of the network.
+    :type network_id: str
+    :param before: Only messages sent before this time are moved.
+    :type before: datetime.datetime
+
+    """
+    try:
+        _init_storage(network_id)
+
+        with log_queries('retention'):
+            total = 0
+            while True:
+                count = sync.Message.archive(before,
+                                             settings.RETENTION_BATCH_SIZE,
+                                             settings.RETENTION_PURGE)
+                total += count
+                # Parents are moved in a batch after their children.
+                if not count:
+                    break
+                time.sleep(settings.RETENTION_PAUSE)
+
+            logger.info('%s %d messages sent before %s',
+                        'Purged' if settings.RETENTION_PURGE else 'Archived',
+                        total, before.isoformat())
+
+            total = 0
+            while True:
+                count = sync.Message.purge_payloads(
+                    before, settings.RETENTION_BATCH_SIZE)
+                total += count
+                if count < settings.RETENTION_BATCH_SIZE:
+                    break
+                time.sleep(settings.RETENTION_PAUSE)
+
+            logger.info('Purged %d unused payloads', total)
     finally:
         _call_close()
@@ -0,0 +1,57 @@
+import json
+import mongomock
+import pytest
+
+import sync
+
+from sync import benchmark, settings, Backend
+from sync.conftest import postgresql
+
+
+def test_benchmark_percentile():
+    values = list(range(1, 101))
+    assert benchmark.percentile([], 50) is None
+    assert benchmark.percentile(values, 50) == 50
+    assert benchmark.percentile(values, 99) == 99
+    assert benchmark.percentile(values, 100) == 100
+    assert benchmark.percentile([5], 99) == 5
+
+
+def test_benchmark_summarise():
+    summary = benchmark.summarise([0.002, 0.001, 0.003], items=6)
+    assert summary['count'] == 3
+    assert summary['throughput'] == 1000
+    assert summary['p50'] == 2
+    assert summary['max'] == 3
+
+
+@pytest.mark.parametrize('backend', Backend.All)
+def test_benchmark_run(session_setup, backend):
+    kwargs = {
+        'messages': 5,
+        'nodes': 3,
+        'payload_size': 100,
+        'postgres_url': postgresql.url()
+    }
+    if backend == Backend.Mongo:
+        sync.storage.mongo.test_mongo_client = mongomock.MongoClient()
+    tasks_inline = settings.TASKS_INLINE
+
+    result = benchmark.run_all([backend], **kwargs)
+
+    assert settings.TASKS_INLINE == tasks_inline
+    assert sync.current_storage() is None
+    assert 'postgres_url' not in result['parameters']
+    results = result['results'][backend]
+    assert results['send']['count'] == 5
+    assert results['propagate']['count'] == 5
+    assert results['fetch']['count'] == 12
+    assert results['acknowledge']['count'] == 10
+    assert results['node_sync']['items'] == 5
+    json.dumps(result)
+
+
+def test_benchmark_import_times():
+    results = benchmark.import_times(1, {'json': 'import json'})
+    assert results['json']['count'] == 1
+    assert results['json']['p50'] >= 0
@@ -0,0 +1,34 @@
+import io
+
+import pytest
+
+from sync import bulk, exceptions
+
+
+def test_bulk_read_csv():
+    extract = io.BytesIO(
+        b'remote_id,name,age,tags\n'
+        b'007,"Smith, J",42,"[""a""]"\n'
+        b'\n'
+        b'008,\xc3\xa9,,true\n'
+        b'009,missing cells\n')
+    rows = list(bulk.read(extract, bulk.Format.CSV))
+    assert rows == [
+        {'remote_id': '007', 'name': 'Smith, J', 'age': 42, 'tags': ['a']},
+        {'remote_id': '008', 'name': u'\xe9', 'tags': True},
+        None
+    ]
+    assert list(bulk.read_csv(io.BytesIO(b''))) == []
+
+
+def test_bulk_read_ndjson():
+    extract = io.StringIO(
+        u'{"remote_id": "1", "name": "\\u00e9"}\n'
+        u'\n'
+        u'[1]\n'
+        u'{invalid\n')
+    rows = list(bulk.read(extract, bulk.Format.NDJSON))
+    assert rows == [{'remote_id': '1', 'name': u'\xe9'}, None, None]
+
+    with pytest.raises(exceptions.InvalidOperationError):
+        bulk.read(extract, 'text/plain')
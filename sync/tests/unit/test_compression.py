@@ -0,0 +1,54 @@
+import json
+import pytest
+import zlib
+
+from sync import compression, exceptions
+
+
+def test_compression_accepted_encoding():
+    assert compression.accepted_encoding(None) is None
+    assert compression.accepted_encoding('') is None
+    assert compression.accepted_encoding('br') is None
+    assert compression.accepted_encoding('gzip') == 'gzip'
+    assert compression.accepted_encoding('deflate, gzip') == 'gzip'
+    assert compression.accepted_encoding('gzip;q=0, deflate') == 'deflate'
+    assert compression.accepted_encoding('gzip;q=0, deflate;q=0') is None
+    assert compression.accepted_encoding('*') == 'gzip'
+    assert compression.accepted_encoding('gzip;q=foo') is None
+
+
+def test_compression_deflate():
+    data = b'test' * 100
+    compressed = compression.compress(data, 'deflate')
+    assert compression.decompress(compressed, 'deflate') == data
+
+    # Raw deflate streams are accepted.
+    compressor = zlib.compressobj(6, zlib.DEFLATED, -zlib.MAX_WBITS)
+    compressed = compressor.compress(data) + compressor.flush()
+    assert compression.decompress(compressed, 'deflate') == data
+
+
+def test_compression_maximum_size():
+    data = b'test' * 100
+    for encoding in compression.Encoding.All:
+        compressed = compression.compress(data, encoding)
+        result = compression.decompress(compressed, encoding, len(data))
+        assert result == data
+        with pytest.raises(exceptions.SizeExceededError):
+            compression.decompress(compressed, encoding, len(data) - 1)
+
+
+def test_compression_incomplete():
+    compressed = compression.compress(b'test' * 100)
+    with pytest.raises(zlib.error):
+        compression.decompress(compressed[:-10])
+    with pytest.raises(zlib.error):
+        compression.decompress(compressed[:-10], maximum_size=1000)
+
+
+def test_compression_decompress_json():
+    value = {'name': u'caf\xe9', 'items': [1, 2]}
+    data = json.dumps(value).encode('utf-8')
+    compressed = compression.compress(data, 'deflate')
+    assert compression.decompress_json(compressed) == value
+    assert compression.decompress_json(bytearray(compressed)) == value
@@ -0,0 +1,150 @@
+import logging
+import pytest
+
+import sync
+
+from sync import instrument, settings, storage, Method, Stage
+
+
+@pytest.fixture
+def aggregator():
+    aggregator = instrument.Aggregator()
+    instrument.add_hook(aggregator)
+    yield aggregator
+    instrument.remove_hook(aggregator)
+
+
+def test_instrument_disabled():
+    calls = []
+
+    @instrument.timed('test.stage')
+    def fun(value):
+        calls.append(value)
+        return value
+
+    assert fun(1) == 1
+    with instrument.timer('test.block'):
+        pass
+    assert calls == [1]
+
+
+def test_instrument_timed(aggregator):
+    @instrument.timed('test.stage')
+    def fun():
+        raise ValueError()
+
+    @instrument.timed('test.generator')
+    def generator():
+        yield 1
+        yield 2
+
+    with pytest.raises(ValueError):
+        fun()
+    assert list(generator()) == [1, 2]
+    with instrument.timer('test.block'):
+        pass
+
+    snapshot = aggregator.snapshot()
+    assert snapshot['test.stage']['count'] == 1
+    # One for each value and one to find the generator is exhausted.
+    assert snapshot['test.generator']['count'] == 3
+    assert snapshot['test.block']['count'] == 1
+
+
+def test_instrument_hook_error(aggregator):
+    def broken(stage, duration):
+        raise ValueError()
+
+    instrument.add_hook(broken)
+    try:
+        with instrument.timer('test.block'):
+            pass
+    finally:
+        instrument.remove_hook(broken)
+    assert aggregator.snapshot()['test.block']['count'] == 1
+
+
+def test_instrument_aggregator():
+    aggregator = instrument.Aggregator(buckets=(0.1, 1.0))
+    aggregator('stage', 0.05)
+    aggregator('stage', 0.5)
+    aggregator('stage', 2.0)
+
+    snapshot = aggregator.snapshot()['stage']
+    assert snapshot['count'] == 3
+    assert snapshot['total'] == pytest.approx(2.55)
+    assert snapshot['buckets'] == [(0.1, 1), (1.0, 2), (None, 3)]
+
+    aggregator.reset()
+    assert aggregator.snapshot() == {}
+
+
+def test_instrument_message_send(aggregator):
+    mock_storage = storage.MockStorage(sync.generate_id())
+    mock_storage.connect(create_db=True)
+    sync.init(mock_storage)
+    try:
+        sync.Network.init('test', {}, fetch_before_send=False)
+        sender = sync.Node.create('sender', create=True)
+        receiver = sync.Node.create('receiver', read=True)
+        sender.send(Method.Create, {'a': 1})
+        message = receiver.fetch()
+        receiver.acknowledge(message.id)
+    finally:
+        sync.close()
+
+    snapshot = aggregator.snapshot()
+    assert snapshot[Stage.MessageSend]['count'] == 2
+    for stage in (Stage.MessageInflate, Stage.MessageValidate,
+                  Stage.MessageExecute, Stage.MessagePropagate,
+                  Stage.RecordValidate, Stage.TaskMessagePropagate,
+                  Stage.MessageFetch, Stage.MessageAcknowledge):
+        assert snapshot[stage]['count'] >= 1
+    assert snapshot[Stage.Storage.format('commit')]['count'] > 0
+    assert snapshot[Stage.Storage.format('get_message')]['count'] > 0
+
+
+def test_storage_count_queries():
+    mock_storage = storage.MockStorage(sync.generate_id())
+    with storage.count_queries('outer') as outer:
+        mock_storage.connect(create_db=True)
+        with storage.count_queries() as inner:
+            mock_storage.get_nodes()
+            mock_storage.get_nodes()
+    mock_storage.get_nodes()
+
+    assert outer.calls == {'connect': 1, 'get_nodes': 2}
+    assert inner.calls == {'get_nodes': 2}
+    assert outer.total == 3
+    assert outer.duration >= 0
+    assert outer.summary().startswith('3 storage calls in ')
+    assert outer.summary().endswith('(get_nodes=2, connect=1)')
+
+    with pytest.raises(AssertionError):
+        with storage.assert_max_queries(1):
+            mock_storage.get_nodes()
+            mock_storage.get_nodes()
+
+
+def test_storage_slow_query_log(monkeypatch):
+    messages = []
+
+    class Handler(logging.Handler):
+        def emit(self, record):
+            messages.append(record.getMessage())
+
+    handler = Handler()
+    logger = logging.getLogger('sync.storage.base')
+    logger.addHandler(handler)
+    try:
+        mock_storage = storage.MockStorage(sync.generate_id())
+        mock_storage.connect(create_db=True)
+        monkeypatch.setattr(settings, 'STORAGE_SLOW_QUERY_TIME', 0)
+        monkeypatch.setattr(settings, 'STORAGE_QUERY_LOG', True)
+        with storage.log_queries('task'):
+            mock_storage.get_nodes()
+    finally:
+        logger.removeHandler(handler)
+
+    assert messages[0].startswith('Slow storage call get_nodes took ')
+    assert messages[1].startswith('task: 1 storage calls in ')
@@ -0,0 +1,38 @@
+import json
+import os.path
+
+from sync import loadgen, settings, Backend
+from sync.http import server
+
+
+def test_loadgen_scale_payload():
+    payload = {'a': 'xy', 'b': [{'c': 'z'}], 'd': 1, 'e': None}
+    assert loadgen.scale_payload(payload, 1) is payload
+    assert loadgen.scale_payload(payload, 3) == {
+        'a': 'xyxyxy', 'b': [{'c': 'zzz'}], 'd': 1, 'e': None}
+
+
+def test_loadgen_parse_mix():
+    assert loadgen.parse_mix('create=1,next=2.5') == {'create': 1,
+                                                      'next': 2.5}
+
+
+def test_loadgen_load_payloads():
+    payloads = loadgen.load_payloads(
+        os.path.join(os.path.dirname(__file__), 'test_data.json'))
+    assert payloads
+    assert all(isinstance(p, dict) for p in payloads)
+
+
+def test_loadgen_run(monkeypatch):
+    monkeypatch.setattr(settings, 'STORAGE_CLASS', Backend.Mock)
+    # Generated payloads are sent without a payload file.
+    result = loadgen.run(app=server.api, nodes=3, duration=0.5,
+                         payload_scale=2)
+
+    routes = result['routes']
+    for route in loadgen.Route.All:
+        assert routes[route]['count'] > 0
+        assert routes[route]['errors'] == 0
+    assert result['propagation_lag']['count'] > 0
+    json.dumps(result)
@@ -0,0 +1,109 @@
+import json
+import logging
+import sys
+
+import six
+
+from six.moves import queue
+
+from sync import logs, settings
+
+
+def record(name='sync.test', level=logging.INFO, msg='message %s',
+           args=('a',), exc_info=None):
+    return logging.LogRecord(name, level, __file__, 1, msg, args, exc_info)
+
+
+def test_logs_rate_limit():
+    log_filter = logs.RateLimitFilter(2, 10)
+    now = [0]
+    log_filter.clock = lambda: now[0]
+
+    assert [log_filter.filter(record()) for i in range(4)] == \
+        [True, True, False, False]
+    # Other messages and levels are counted separately.
+    assert log_filter.filter(record(msg='other'))
+    assert log_filter.filter(record(level=logging.ERROR))
+
+    now[0] = 10
+    allowed = record()
+    assert log_filter.filter(allowed)
+    assert allowed.suppressed == 2
+    assert not hasattr(record(), 'suppressed')
+
+
+def test_logs_sample(monkeypatch):
+    log_filter = logs.SampleFilter({'sync.storage': 0, 'sync.http': 1})
+    assert not log_filter.filter(record(name='sync.storage.base'))
+    assert log_filter.filter(record(name='sync.storage.base',
+                                    level=logging.ERROR))
+    assert log_filter.filter(record(name='sync.http'))
+    assert log_filter.filter(record(name='sync.core'))
+
+    log_filter.rates['sync'] = 0.5
+    monkeypatch.setattr('random.random', lambda: 0.4)
+    assert log_filter.filter(record(name='sync.core'))
+    monkeypatch.setattr('random.random', lambda: 0.6)
+    assert not log_filter.filter(record(name='sync.core'))
+
+
+def test_logs_formatters():
+    try:
+        raise ValueError('broken')
+    except ValueError:
+        failed = record(level=logging.ERROR, exc_info=sys.exc_info())
+    failed.suppressed = 3
+
+    entry = json.loads(logs.JSONFormatter().format(failed))
+    assert entry['level'] == 'ERROR'
+    assert entry['logger'] == 'sync.test'
+    assert entry['message'] == 'message a'
+    assert entry['suppressed'] == 3
+    assert entry['exception'].endswith('ValueError: broken')
+    assert entry['timestamp'].endswith('Z')
+
+    text = logs.TextFormatter(logs.FORMAT).format(failed)
+    assert '[ERROR] sync.test: message a (3 repeats suppressed)' in text
+    assert text.endswith('ValueError: broken')
+
+
+def test_logs_queue_handler():
+    records = queue.Queue(1)
+    handler = logs.QueueHandler(records)
+    values = ['a']
+    handler.handle(record(args=(values,)))
+    # Dropped as the queue is full.
+    handler.handle(record())
+    values.append('b')
+
+    queued = records.get_nowait()
+    assert records.empty()
+    assert queued.getMessage() == "message ['a']"
+
+
+def test_logs_configure(monkeypatch):
+    stream = six.StringIO()
+    monkeypatch.setattr(sys, 'stdout', stream)
+    monkeypatch.setattr(settings, 'LOG_FORMAT', 'json')
+    monkeypatch.setattr(settings, 'LOG_QUEUE_SIZE', 10)
+    monkeypatch.setattr(settings, 'LOG_RATE_LIMIT', 1)
+    monkeypatch.setattr(settings, 'LOG_SAMPLE', {})
+    level = logging.getLogger().level
+    logs.shutdown()
+    try:
+        logs.configure()
+        logger = logs.get_logger('sync.test')
+        values = ['a']
+        logger.info('value %s', values)
+        # Messages are rendered before they are queued.
+        values.append('b')
+        logger.info('value %s', values)
+        logger.debug('debug')
+    finally:
+        logs.shutdown()
+        logging.getLogger().setLevel(level)
+
+    lines = stream.getvalue().splitlines()
+    # The repeat is dropped by the rate limit.
+    assert len(lines) == 1
+    assert json.loads(lines[0])['message'] == "value ['a']"
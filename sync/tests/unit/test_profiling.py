@@ -0,0 +1,64 @@
+import os
+
+from falcon.testing.client import TestClient
+
+from sync import profiling, settings
+from sync.http import server
+
+
+def work():
+    return sum(range(1000))
+
+
+def test_profiling_disabled(monkeypatch, tmpdir):
+    monkeypatch.setattr(settings, 'PROFILE_DIR', None)
+    monkeypatch.setattr(settings, 'PROFILE_SAMPLE_RATE', 1)
+    assert not profiling.should_profile(requested=True)
+
+    monkeypatch.setattr(settings, 'PROFILE_DIR', str(tmpdir))
+    monkeypatch.setattr(settings, 'PROFILE_SAMPLE_RATE', 0)
+    with profiling.profile('work'):
+        work()
+    assert tmpdir.listdir() == []
+
+
+def test_profiling_profile(monkeypatch, tmpdir):
+    monkeypatch.setattr(settings, 'PROFILE_DIR', str(tmpdir.join('out')))
+    monkeypatch.setattr(settings, 'PROFILE_SAMPLE_RATE', 1)
+    monkeypatch.setattr(settings, 'PROFILE_TOP', 5)
+
+    @profiling.profiled('task name')
+    def task():
+        # Nested profiles are ignored, one profiler runs at a time.
+        with profiling.profile('nested', requested=True):
+            return work()
+
+    assert task() == work()
+    names = sorted(os.listdir(str(tmpdir.join('out'))))
+    assert len(names) == 2
+    assert names[0].endswith('-task_name.prof')
+    assert names[1].endswith('-task_name.txt')
+    summary = tmpdir.join('out', names[1]).read()
+    assert summary.startswith('task name\n')
+    assert 'cumulative' in summary
+
+    # Profiles finishing together are written to separate files.
+    for _ in range(3):
+        task()
+    assert len(os.listdir(str(tmpdir.join('out')))) == 8
+
+
+def test_profiling_middleware(monkeypatch, tmpdir):
+    monkeypatch.setattr(settings, 'PROFILE_DIR', str(tmpdir))
+    monkeypatch.setattr(settings, 'PROFILE_SAMPLE_RATE', 0)
+    client = TestClient(server.api)
+
+    result = client.simulate_get('/admin/networks/foo')
+    assert 'x-sync-profile' not in result.headers
+    assert tmpdir.listdir() == []
+
+    result = client.simulate_get('/admin/networks/foo',
+                                 headers={'X-Sync-Profile': '1'})
+    name = result.headers['x-sync-profile']
+    assert name.endswith('-GET_admin_networks_foo.prof')
+    assert tmpdir.join(name).check()